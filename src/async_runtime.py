@@ -0,0 +1,405 @@
+"""
+Module containing the asyncio runtime for DYNAMIC mqtt mode:
+    AsyncMQTTSource(broker_address, broker_port)
+    InProcessBroker()
+    AsyncRuntime(source, topics, max_queue, flush_interval, checkpointer, pipelines)
+
+A single event loop owns the MQTT socket, runs one coroutine per sensor
+pipeline and writes CSV/alert output in batches on a worker thread, so any
+number of sensor streams share one thread and one broker connection.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+import paho.mqtt.client as mqtt
+from data_point import DataPoint
+from preprocessor import is_null
+from pipeline import SensorPipeline
+from mqtt_client import decode_batch, BATCH_SIZE
+from csv_writer import get_writer
+from raw_store import get_raw_store
+from shared_ring import publish_step
+
+HEADERS = {
+    "alerts": ['Time', 'Sensor', 'Alert'],
+}
+RECONNECT_MIN = 1    # seconds before the first reconnect attempt after a lost connection
+RECONNECT_MAX = 60   # longest wait between reconnect attempts
+
+
+class AsyncMQTTSource:
+    """
+    An MQTT connection driven by the asyncio event loop instead of paho's
+    background thread: the client socket is registered with the loop and
+    paho's read/write/misc steps run as loop callbacks.
+
+    A lost connection is re-established by the housekeeping task, waiting twice
+    as long after every failed attempt (RECONNECT_MIN to RECONNECT_MAX seconds).
+    Connecting blocks, so it runs on a worker thread.
+
+    Attributes:
+        broker_address (str): The address of the MQTT broker.
+        broker_port (int): The port of the MQTT broker.
+        client (mqtt.Client): The MQTT client instance.
+        misc (asyncio.Task): The task running paho's periodic housekeeping and reconnects.
+        reconnect_delay (float): The seconds to wait before the next reconnect attempt.
+    """
+
+    def __init__(self, broker_address, broker_port):
+        """
+        Initialize the source with broker details.
+
+        Args:
+            broker_address (str): The address of the MQTT broker.
+            broker_port (int): The port of the MQTT broker.
+        """
+        self.broker_address = broker_address
+        self.broker_port = broker_port
+        self.client = mqtt.Client()
+        self.misc = None
+        self.reconnect_delay = RECONNECT_MIN
+
+
+    async def subscribe(self, topics, on_message):
+        """
+        Connect to the broker and deliver every message on the topics to on_message.
+
+        Args:
+            topics (list): The MQTT topics to subscribe to.
+            on_message (callable): Called in the event loop as on_message(topic, payload).
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        client = self.client
+
+        loop_thread = threading.get_ident()
+
+        def in_loop(callback, *args):
+            # (re)connecting runs on a worker thread, which hands socket changes to the loop
+            if threading.get_ident() == loop_thread:
+                callback(*args)
+            else:
+                loop.call_soon_threadsafe(callback, *args)
+
+        client.on_socket_open = lambda c, userdata, sock: in_loop(loop.add_reader, sock, c.loop_read)
+        client.on_socket_close = lambda c, userdata, sock: in_loop(loop.remove_reader, sock)
+        client.on_socket_register_write = lambda c, userdata, sock: in_loop(loop.add_writer, sock, c.loop_write)
+        client.on_socket_unregister_write = lambda c, userdata, sock: in_loop(loop.remove_writer, sock)
+        client.on_connect = lambda c, userdata, flags, rc: self._on_connect(topics, rc)
+        client.on_message = lambda c, userdata, msg: on_message(msg.topic, msg.payload)
+
+        await asyncio.to_thread(client.connect, self.broker_address, self.broker_port, 60)
+        self.misc = loop.create_task(self._misc_loop())
+
+
+    async def close(self):
+        """
+        Disconnect from the broker.
+
+        Returns:
+            None
+        """
+        self.client.disconnect()
+        if self.misc is not None:
+            self.misc.cancel()
+
+
+    def _on_connect(self, topics, rc):
+        if rc != 0:
+            print(f"MQTT broker refused the connection: {mqtt.connack_string(rc)}")
+            return
+        print(f"Connected successfully")
+        self.reconnect_delay = RECONNECT_MIN
+        self.client.subscribe([(topic, 0) for topic in topics])
+
+
+    async def _misc_loop(self):
+        # paho only reconnects by itself in loop_start/loop_forever
+        while True:
+            if self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+                await asyncio.sleep(1)
+                continue
+            print(f"Not connected to the MQTT broker, reconnecting in {self.reconnect_delay} s")
+            await asyncio.sleep(self.reconnect_delay)
+            self.reconnect_delay = min(2 * self.reconnect_delay, RECONNECT_MAX)
+            try:
+                await asyncio.to_thread(self.client.reconnect)
+            except OSError as e:
+                print(f"Failed to reconnect to the MQTT broker: {e}")
+
+
+class InProcessBroker:
+    """
+    A stand-in for an MQTT broker that delivers published messages to
+    subscribers in the same process, for tests and load replays.
+
+    Attributes:
+        subscribers (list): (topics, on_message) pairs of every subscriber.
+    """
+
+    def __init__(self):
+        """
+        Initialize a broker without subscribers.
+        """
+        self.subscribers = []
+
+
+    async def subscribe(self, topics, on_message):
+        """
+        Deliver every message published on the topics (MQTT wildcards allowed) to on_message.
+
+        Args:
+            topics (list): The topic filters to subscribe to.
+            on_message (callable): Called as on_message(topic, payload).
+
+        Returns:
+            None
+        """
+        self.subscribers.append((list(topics), on_message))
+
+
+    def publish(self, topic, payload):
+        """
+        Deliver a message to every matching subscriber.
+
+        Args:
+            topic (str): The topic of the message.
+            payload (bytes | str): The message payload.
+
+        Returns:
+            None
+        """
+        if isinstance(payload, str):
+            payload = payload.encode()
+        for topics, on_message in self.subscribers:
+            if any(mqtt.topic_matches_sub(sub, topic) for sub in topics):
+                on_message(topic, payload)
+
+
+    async def close(self):
+        """
+        Remove every subscriber.
+
+        Returns:
+            None
+        """
+        self.subscribers = []
+
+
+class AsyncRuntime:
+    """
+    Runs one SensorPipeline coroutine per sensor stream on a single event loop.
+
+    Attributes:
+        source (AsyncMQTTSource | InProcessBroker): Where messages come from.
+        topics (list): The MQTT topics to subscribe to.
+        max_queue (int): The maximum number of readings queued per sensor.
+        flush_interval (float): The seconds between output flushes.
+        queues (dict): The asyncio.Queue of readings of every sensor, by key.
+        workers (dict): The pipeline task of every sensor, by key.
+        pipelines (dict): The SensorPipeline of every sensor, by key.
+        checkpointer (LiveCheckpointer): Saves the pipelines on every flush once its interval
+                                         has passed, and when the runtime finishes; or None.
+        messages (list): (topic, payload) messages received but not decoded yet.
+        rows (dict): Output rows waiting to be written, by (file type, sensor type); raw
+                     rows are (epoch, row) pairs for the raw store.
+        received (int): The number of readings decoded.
+        dropped (int): The number of readings dropped because a sensor queue was full.
+        decode_errors (int): The number of messages that failed to decode.
+    """
+
+    def __init__(self, source, topics, max_queue=1000, flush_interval=1.0, checkpointer=None, pipelines=None):
+        """
+        Initialize the runtime.
+
+        Args:
+            source (AsyncMQTTSource | InProcessBroker): Where messages come from.
+            topics (list): The MQTT topics to subscribe to.
+            max_queue (int): The maximum number of readings queued per sensor. Default is 1000.
+            flush_interval (float): The seconds between output flushes. Default is 1.0.
+            checkpointer (LiveCheckpointer): Saves the pipelines. Default is None (no checkpoints).
+            pipelines (dict): Pipelines to continue from, by key. Default is None (start empty).
+        """
+        self.source = source
+        self.topics = topics
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.queues = {}
+        self.workers = {}
+        self.pipelines = pipelines if pipelines is not None else {}
+        self.checkpointer = checkpointer
+        self.messages = []
+        self.loop = None
+        self.rows = defaultdict(list)
+        self.write_lock = threading.Lock()
+        self.stopping = None
+        self.received = 0
+        self.dropped = 0
+        self.decode_errors = 0
+
+
+    async def run(self):
+        """
+        Subscribe to the source and process readings until stop() is called
+        or the task is cancelled, then drain the queues and flush all output.
+
+        Returns:
+            None
+        """
+        self.stopping = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        flusher = asyncio.create_task(self._flush_loop())
+        await self.source.subscribe(self.topics, self.on_message)
+
+        try:
+            await self.stopping.wait()
+        finally:
+            await self.source.close()
+            self.decode_messages()
+            for readings in self.queues.values():
+                await readings.join()
+            for worker in self.workers.values():
+                worker.cancel()
+            flusher.cancel()
+            await self.flush()
+            if self.checkpointer is not None:
+                self.checkpointer.save(self.pipelines)
+
+
+    def stop(self):
+        """
+        Ask a running runtime to finish.
+
+        Returns:
+            None
+        """
+        self.stopping.set()
+
+
+    def on_message(self, topic, payload):
+        """
+        Hold a message for decoding. Messages that arrive together are decoded
+        as one batch, once the event loop gets to it or BATCH_SIZE are waiting.
+
+        Args:
+            topic (str): The topic the message arrived on.
+            payload (bytes): The raw JSON message payload.
+
+        Returns:
+            None
+        """
+        messages = self.messages
+        messages.append((topic, payload))
+        if len(messages) == 1:
+            self.loop.call_soon(self.decode_messages)
+        elif len(messages) >= BATCH_SIZE:
+            self.decode_messages()
+
+
+    def decode_messages(self):
+        """
+        Decode the held messages and queue every reading for its sensor's pipeline.
+
+        Returns:
+            None
+        """
+        if not self.messages:
+            return
+        batch, self.messages = self.messages, []
+        decoded, errors = decode_batch(batch)
+        self.decode_errors += len(errors)
+        for error in errors:
+            print(f"Failed to decode message: {error}")
+
+        self.received += len(decoded)
+        for value, epoch, device_class, unit, topic in decoded:
+            key = topic or device_class
+            readings = self.queues.get(key)
+            if readings is None:
+                readings = self._start_sensor(key)
+            try:
+                readings.put_nowait(DataPoint.from_epoch(value, epoch, device_class, unit))
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+
+    async def flush(self):
+        """
+        Write every pending output row on a worker thread.
+
+        Returns:
+            None
+        """
+        if self.rows:
+            batch, self.rows = self.rows, defaultdict(list)
+            await asyncio.to_thread(self._write_batch, batch)
+        # saved after the rows above, so a checkpoint never runs ahead of the output
+        if self.checkpointer is not None:
+            self.checkpointer.maybe_save(self.pipelines)
+
+
+    def _start_sensor(self, key):
+        readings = asyncio.Queue(maxsize=self.max_queue)
+        self.queues[key] = readings
+        if key not in self.pipelines:
+            self.pipelines[key] = SensorPipeline(key)
+        self.workers[key] = asyncio.create_task(self._sensor_worker(key, readings))
+        return readings
+
+
+    async def _sensor_worker(self, key, readings):
+        pipeline = self.pipelines[key]
+        while True:
+            reading = await readings.get()
+            try:
+                timer = pipeline.start_timer()
+                if is_null(reading):
+                    continue
+                if timer:
+                    timer.lap("null")
+                self.rows[("raw", reading.sensor_type)].append((reading.epoch, [
+                    reading.get_val(), reading.get_time(), reading.sensor_type, reading.unit_of_measurement]))
+                if timer:
+                    timer.lap("raw")
+
+                verdict = pipeline.step(reading)
+                if verdict is None:
+                    continue
+                const_err, in_control = verdict
+                publish_step(pipeline, const_err, in_control)
+                if const_err:
+                    self._alert(key, pipeline, "CONSTANT ERROR DETECTED")
+                if not in_control:
+                    self._alert(key, pipeline, "Drift detected in CUSUM")
+                for detector in pipeline.alarms:
+                    self._alert(key, pipeline, detector.message)
+                if timer:
+                    timer.lap("output")
+            finally:
+                readings.task_done()
+
+
+    def _alert(self, key, pipeline, message):
+        print(f"{message} for {key} at time: {pipeline.latest_time()}")
+        self.rows[("alerts", None)].append([pipeline.latest_time(), key, message])
+
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+
+    def _write_batch(self, batch):
+        # a cancelled flush can still be writing when the final flush starts
+        with self.write_lock:
+            for (file_type, sensor_type), rows in batch.items():
+                if file_type == "raw":
+                    get_raw_store().append_rows(sensor_type, rows)
+                    continue
+                file_path = "../data/" + file_type + ("_" + sensor_type if sensor_type else "") + ".csv"
+                writer = get_writer(file_path, HEADERS[file_type])
+                writer.write_rows(rows)
+                writer.flush()
@@ -0,0 +1,348 @@
+"""
+Module containing the NumPy batch engine for STATIC csv mode:
+    load_series(file_path)
+    PreparedSeries(frame)
+    clean_series(frame, UL, LL, max_time, win_size, med_window, alpha, k, h, target, detectors)
+
+The batch engine reproduces the per-point run_csv pipeline (range check, EMA,
+median filter, AES target, CUSUM and any extra detectors) on whole arrays
+instead of stepping a SlidingWindow one reading at a time. A PreparedSeries
+holds the work that does not depend on the pipeline parameters (null
+filtering, time parsing, the range and constant error masks), so it can be
+shared by many cleanings of the same series.
+
+Cleaned values and constant errors match the streaming path exactly. Targets
+match to rounding: the window std is computed exactly here but from running
+sums when streaming. Drift verdicts can differ on series whose AES terms
+underflow, where that rounding is no longer small against the values: on the
+illuminance export the EMA decays to ~1e-162 over a night of zero lux, and
+batch raises one more drift alert (30) than streaming (29).
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from data_point import TIME_FORMAT
+from sliding_window import NAT_EPOCH
+from rolling_median import RollingMedian
+from preprocessor import clip_outliers, in_range_mean
+from format_time import TimeNormalizer
+from detectors import DetectorContext
+
+CHUNK_ROWS = 65_536
+
+
+def load_series(file_path):
+    """
+    Load a sensor CSV file into a DataFrame in a single read.
+
+    Args:
+        file_path (str): The path to the CSV file containing raw data.
+
+    Returns:
+        DataFrame: The State, Time, Device and Unit columns of the file.
+    """
+    return pd.read_csv(
+        file_path,
+        header=0,
+        usecols=[0, 1, 2, 3],
+        names=['State', 'Time', 'Device', 'Unit'],
+        dtype={'State': float, 'Time': str, 'Device': str, 'Unit': str},
+    )
+
+
+def null_mask(frame):
+    """
+    Vectorized version of preprocessor.is_null over a whole DataFrame.
+
+    Args:
+        frame (DataFrame): The raw sensor readings.
+
+    Returns:
+        ndarray: A boolean array, True where the reading is null or invalid.
+    """
+    times = frame['Time']
+    return (frame['State'].isna() | times.isna() | (times == '0')).to_numpy()
+
+
+class PreparedSeries:
+    """
+    The parameter independent parts of cleaning a series, each computed once.
+
+    Attributes:
+        data (DataFrame): The non-null readings.
+        raw (ndarray): The values of the non-null readings.
+        init_target (float): The first value of the series, the initial AES target.
+    """
+
+    def __init__(self, frame):
+        """
+        Filter out the null readings of a series.
+
+        Args:
+            frame (DataFrame): The raw sensor readings as returned by load_series.
+        """
+        self.init_target = float(frame['State'].iloc[0]) if len(frame) else 0.0
+        self.data = frame[~null_mask(frame)].reset_index(drop=True)
+        self.raw = self.data['State'].to_numpy(dtype=float)
+        self._epochs = None
+        self._out_of_range = {}
+        self._const_err = {}
+
+
+    def epochs(self):
+        """
+        Returns:
+            ndarray: The epoch times of the readings, NAT_EPOCH where a time is invalid.
+        """
+        if self._epochs is None:
+            self._epochs = to_epochs(self.data['Time'])
+        return self._epochs
+
+
+    def out_of_range(self, UL, LL):
+        """
+        Args:
+            UL (float): The upper limit for acceptable values.
+            LL (float): The lower limit for acceptable values.
+
+        Returns:
+            list: Whether each raw value is out of range.
+        """
+        key = (UL, LL)
+        if key not in self._out_of_range:
+            self._out_of_range[key] = ((self.raw > UL) | (self.raw < LL)).tolist()
+        return self._out_of_range[key]
+
+
+    def const_err(self, max_time, win_size):
+        """
+        Args:
+            max_time (timedelta): The maximum allowed time between value changes.
+            win_size (int): The size of the sliding window.
+
+        Returns:
+            ndarray: Whether a constant error is detected at each processed reading.
+        """
+        key = (max_time, win_size)
+        if key not in self._const_err:
+            self._const_err[key] = _const_err_mask(self.raw, self.epochs(), max_time, win_size)
+        return self._const_err[key]
+
+
+def clean_series(frame, UL, LL, max_time, win_size=10, med_window=3, alpha=0.4, k=0.5, h=5, target="AES",
+                 detectors=None):
+    """
+    Clean a whole series of sensor readings with the run_csv pipeline.
+
+    The EMA, median filter and AES target are first order recurrences, so they
+    are computed in a single scalar pass over plain floats. Every windowed
+    statistic (std, min, max, CUSUM sums) and the constant error check are
+    computed as array operations over all windows at once.
+
+    Args:
+        frame (DataFrame | PreparedSeries): The raw sensor readings as returned by
+                                            load_series, or already prepared.
+        UL (float): The upper limit for acceptable values.
+        LL (float): The lower limit for acceptable values.
+        max_time (timedelta): The maximum allowed time between value changes.
+        win_size (int): The size of the sliding window. Default is 10.
+        med_window (int): The size of the median filter sub-window. Default is 3.
+        alpha (float): The EMA smoothing factor. Default is 0.4.
+        k (float): The CUSUM slack, in standard deviations. Default is 0.5.
+        h (float): The CUSUM control limit, in standard deviations. Default is 5.
+        target (str): The CUSUM target, "AES" (err_detections.AES_target) or "mean"
+                      (err_detections.mean_target). Default is "AES".
+        detectors (DetectorEngine): Extra detectors to run on every processed reading,
+                                    one reading at a time. Default is None.
+
+    Returns:
+        tuple: (cleaned, targets, const_err, drift, clipped, alarms) where cleaned is
+               a DataFrame of the cleaned readings, targets is a DataFrame of the CUSUM
+               target per processed reading, const_err and drift are boolean arrays
+               aligned with the rows of targets, clipped is a boolean array aligned
+               with the rows of cleaned, True where the range check replaced the
+               reading, and alarms is a list aligned with the rows of targets of the
+               extra detectors that fired, or None without detectors.
+    """
+    series = frame if isinstance(frame, PreparedSeries) else PreparedSeries(frame)
+    data, raw = series.data, series.raw
+    n = len(raw)
+    steps = n - win_size
+
+    clipped = np.zeros(n, dtype=bool)
+    if steps <= 0:
+        targets = pd.DataFrame({'Target': [], 'Time': []})
+        alarms = None if detectors is None else []
+        return data, targets, np.zeros(0, dtype=bool), np.zeros(0, dtype=bool), clipped, alarms
+
+    out_of_range = series.out_of_range(UL, LL)
+
+    # first window: every value at once, against the in-range values of the unmodified window
+    first, first_clipped = clip_outliers(raw[:win_size], UL, LL)
+    if first_clipped:
+        clipped[:win_size] = first != raw[:win_size]
+    vals = first.tolist() + raw[win_size:].tolist()
+
+    # pre holds each value after the range check and EMA, before the median filter
+    pre = list(vals)
+    last_EMA = raw[win_size - 1]
+    mid = med_window // 2
+
+    for j in range(win_size - 1, n - 1):
+        start = j - win_size + 1
+        if j > win_size - 1 and out_of_range[j]:
+            replacement = in_range_mean(vals[start:j], UL, LL)
+            if replacement is not None:
+                vals[j] = replacement
+                clipped[j] = True
+
+        last_EMA = alpha * vals[j] + (1 - alpha) * last_EMA
+        vals[j] = last_EMA
+        pre[j] = last_EMA
+
+        if start:
+            rolling.replace(vals[start - 1], vals[start + med_window - 1])
+        else:
+            rolling = RollingMedian(vals[:med_window])
+        med_val = rolling.median()
+        if vals[start + mid] != med_val:
+            rolling.replace(vals[start + mid], med_val)
+            vals[start + mid] = med_val
+
+    std, x_min, x_max, x_mean = _window_stats(np.asarray(pre), np.asarray(vals), win_size, mid, steps,
+                                               target == "mean" or detectors is not None)
+    xt = np.asarray(pre[win_size - 1:n - 1])
+
+    if target == "mean":
+        target = x_mean
+    else:
+        # AES target
+        std_max = (x_max - x_min) / 2.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            alphas = np.where(std_max == 0, 0.0, np.clip(std / std_max, 0, 1))
+
+        target = np.empty(steps)
+        last_smoothed = series.init_target
+        for i, (a, x) in enumerate(zip(alphas.tolist(), xt.tolist())):
+            last_smoothed = a * x + (1 - a) * last_smoothed
+            target[i] = last_smoothed
+
+    # CUSUM over windows of deviations
+    slack = k * std
+    control_lim = h * std
+    dev = xt - target
+    dev_plus = np.maximum(0, dev - slack)
+    dev_minus = np.maximum(0, -dev - slack)
+    CT_plus_sum = _rolling_sum(dev_plus, win_size)
+    CT_minus_sum = _rolling_sum(dev_minus, win_size)
+    drift = (CT_plus_sum > control_lim) | (CT_minus_sum > control_lim)
+
+    const_err = series.const_err(max_time, win_size)
+
+    alarms = None
+    if detectors is not None:
+        processed = slice(win_size - 1, n - 1)
+        alarms = _detect(detectors, series.epochs()[processed], raw[processed], xt, x_mean, std, x_min, x_max,
+                         UL, LL, target, const_err, drift)
+
+    cleaned = data.copy()
+    cleaned['State'] = vals
+    targets = pd.DataFrame({'Target': target, 'Time': data['Time'].to_numpy()[win_size - 1:n - 1]})
+    return cleaned, targets, const_err, drift, clipped, alarms
+
+
+def _window_stats(pre, final, win_size, mid, steps, with_mean=False):
+    """
+    Compute std, min, max and, if asked for, mean of the window seen by CUSUM
+    at every step.
+
+    At each step the head of the window (up to the median filter midpoint)
+    already holds final values, while the rest holds pre-median values.
+    """
+    std = np.empty(steps)
+    x_min = np.empty(steps)
+    x_max = np.empty(steps)
+    x_mean = np.empty(steps) if with_mean else None
+    pre_wins = sliding_window_view(pre, win_size)
+    final_wins = sliding_window_view(final, win_size)
+
+    for lo in range(0, steps, CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, steps)
+        wins = pre_wins[lo:hi].copy()
+        wins[:, :mid + 1] = final_wins[lo:hi, :mid + 1]
+        std[lo:hi] = wins.std(axis=1)
+        x_min[lo:hi] = wins.min(axis=1)
+        x_max[lo:hi] = wins.max(axis=1)
+        if with_mean:
+            x_mean[lo:hi] = wins.mean(axis=1)
+
+    return std, x_min, x_max, x_mean
+
+
+def _detect(detectors, epochs, raw, cleaned, x_mean, std, x_min, x_max, UL, LL, target, const_err, drift):
+    """
+    Run the extra detectors over every processed reading, with the context the
+    per-point pipeline would give them.
+    """
+    context = DetectorContext()
+    context.UL, context.LL = UL, LL
+    alarms = []
+    for row in zip(epochs.tolist(), raw.tolist(), cleaned.tolist(), x_mean.tolist(), std.tolist(),
+                   x_min.tolist(), x_max.tolist(), target.tolist(), const_err.tolist(), drift.tolist()):
+        (context.epoch, context.value, context.cleaned, context.mean, context.std,
+         context.min, context.max, context.target, context.const_err, drifted) = row
+        context.in_control = not drifted
+        alarms.append(detectors.evaluate(context))
+    return alarms
+
+
+def _rolling_sum(values, win_size):
+    """
+    Sum each value with up to win_size - 1 preceding values, like a filling
+    SlidingWindow of deviations.
+    """
+    padded = np.concatenate((np.zeros(win_size - 1), values))
+    return sliding_window_view(padded, win_size).sum(axis=1)
+
+
+def _const_err_mask(raw, epochs, max_time, win_size):
+    """
+    Vectorized version of is_const_err for every processed reading.
+
+    last_changed tracks the start of the current run of equal raw values,
+    beginning at the last reading of the first full window.
+    """
+    vals = raw[win_size - 1:-1]
+    epochs = epochs[win_size - 1:-1]
+    idx = np.arange(len(vals))
+
+    changed = np.ones(len(vals), dtype=bool)
+    changed[1:] = vals[1:] != vals[:-1]
+    run_start = np.maximum.accumulate(np.where(changed, idx, 0))
+
+    start_epochs = epochs[run_start]
+    valid = (epochs != NAT_EPOCH) & (start_epochs != NAT_EPOCH)
+    return valid & ((epochs - start_epochs) > int(max_time.total_seconds()))
+
+
+def to_epochs(times):
+    """
+    Vectorized version of data_point.to_epoch over a column of timestamps.
+
+    Args:
+        times (Series): The timestamp strings.
+
+    Returns:
+        ndarray: The int64 epoch seconds, NAT_EPOCH where a time is invalid.
+    """
+    parsed = pd.to_datetime(times, format=TIME_FORMAT, errors='coerce')
+
+    # timestamps in any other layout are parsed with their detected format
+    missing = parsed.isna().to_numpy()
+    if missing.any():
+        parsed = parsed.copy()
+        parsed[missing] = TimeNormalizer().to_datetimes(times[missing]).to_numpy()
+
+    epochs = parsed.to_numpy().astype('datetime64[s]').astype(np.int64)
+    epochs[parsed.isna().to_numpy()] = NAT_EPOCH
+    return epochs
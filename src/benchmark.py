@@ -0,0 +1,455 @@
+"""
+Benchmark suite for the cleaning pipeline:
+    micro        - every function in preprocessor and err_detections, on a full window
+    run_csv      - end to end run_csv (and batch engine) throughput on synthetic series
+    mqtt         - replay of JSON sensor messages through the asyncio runtime
+                   (in-process broker) and the threaded MQTTClient queue
+
+Synthetic data comes from a seeded generator, so every run sees the same
+input. Results are written as JSON and can be compared against a saved
+baseline:
+
+    python benchmark.py --out baseline.json
+    python benchmark.py --baseline baseline.json
+    python benchmark.py --full                    (run_csv up to 10M readings)
+
+All output files are written under a temporary directory; ../data is not touched.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from datetime import timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import err_detections
+import preprocessor
+from async_runtime import AsyncRuntime, InProcessBroker
+from csv_writer import close_all
+from data_point import DataPoint
+from main import stream_csv, stream_to_csv, run_csv_batch, process_live_reading
+from mqtt_client import MQTTClient
+from replay import to_payload
+from sliding_window import SlidingWindow
+
+SENSOR_TYPE = "SSTEMP_sensor"
+SIZES = (10_000, 100_000, 1_000_000)
+FULL_SIZES = SIZES + (10_000_000,)
+POINT_MAX = 1_000_000       # largest series the per-point engine runs in the default sizes
+REPLAY_SENSORS = 6
+REPLAY_READINGS = 60_000
+
+
+################################ SYNTHETIC DATA ################################
+
+def synthetic_series(n, seed=0, start="2024-01-01 00:00:00"):
+    """
+    Generate a reproducible sensor series: a random walk around 20 with
+    out-of-range spikes, stuck (constant) runs, level shifts and null readings.
+
+    Args:
+        n (int): The number of readings.
+        seed (int): The random seed. Default is 0.
+        start (str): The time of the first reading, readings are one minute apart.
+
+    Returns:
+        DataFrame: The State, Time, Device and Unit columns of a raw CSV file.
+    """
+    rng = np.random.default_rng(seed)
+    state = 20 + np.cumsum(rng.normal(0, 0.05, n))
+
+    # level shifts for CUSUM to find
+    shifts = rng.random(n) < 1e-3
+    state += np.cumsum(np.where(shifts, rng.normal(0, 3, n), 0))
+
+    # sensor stuck at a value for a while
+    for i in np.flatnonzero(rng.random(n) < 2e-4):
+        state[i:i + 60] = state[i]
+
+    # out of range spikes and nulls
+    spikes = rng.random(n) < 1e-3
+    state[spikes] = rng.choice([-50.0, 100.0], spikes.sum())
+    state[rng.random(n) < 1e-4] = np.nan
+
+    times = pd.date_range(start, periods=n, freq="min").strftime("%Y-%m-%d %H:%M:%S")
+    return pd.DataFrame({"State": state.round(3), "Time": times, "Device": SENSOR_TYPE, "Unit": "C"})
+
+
+def write_series(file_path, n, seed=0, chunk=1_000_000):
+    """
+    Write a synthetic series to a raw CSV file, chunk by chunk.
+
+    Args:
+        file_path (str): The CSV file to write.
+        n (int): The number of readings.
+        seed (int): The random seed. Default is 0.
+        chunk (int): The readings generated at a time. Default is 1 000 000.
+
+    Returns:
+        str: file_path
+    """
+    start = pd.Timestamp("2024-01-01 00:00:00")
+    for i, lo in enumerate(range(0, n, chunk)):
+        frame = synthetic_series(min(chunk, n - lo), seed + i, str(start + timedelta(minutes=lo)))
+        frame.to_csv(file_path, mode="w" if lo == 0 else "a", header=lo == 0, index=False, na_rep="nan")
+    return file_path
+
+
+################################ MICROBENCHMARKS ################################
+
+def full_window(values, stats=True):
+    """
+    Build a full SlidingWindow of SSTEMP readings, one minute apart.
+
+    Args:
+        values (array): The reading values.
+        stats (bool): Whether the window keeps running statistics. Default is True.
+
+    Returns:
+        SlidingWindow: The window.
+    """
+    window = SlidingWindow(len(values), stats=stats)
+    start = pd.Timestamp("2024-01-01 00:00:00")
+    for i, value in enumerate(values):
+        time_stamp = (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")
+        window.add_reading(DataPoint(float(value), time_stamp, SENSOR_TYPE, "C"))
+    return window
+
+
+def micro_benchmarks(win_size=10, seed=0):
+    """
+    Time every function in preprocessor and err_detections, plus the window
+    update, on a full window of the size the pipeline uses.
+
+    Args:
+        win_size (int): The window size. Default is 10.
+        seed (int): The random seed. Default is 0.
+
+    Returns:
+        dict: The ns per call of every function, by name.
+    """
+    values = 20 + np.random.default_rng(seed).normal(0, 1, win_size)
+    window = full_window(values)
+    vals = window.get_win_vals()
+    stats = window.stats
+    plus, minus = SlidingWindow(win_size, stats=True), SlidingWindow(win_size, stats=True)
+    for _ in range(win_size):
+        plus.add_reading(0.1)
+        minus.add_reading(0.2)
+    last_changed = [vals[0], window.get_win_times()[0]]
+    reading = window.get_latest()
+    slid = iter(full_window(values, stats=False).as_list() * 100_000)
+
+    cases = {
+        "preprocessor.is_null": lambda: preprocessor.is_null(reading),
+        "preprocessor.do_EMA": lambda: preprocessor.do_EMA(window, 20.0, 0.4),
+        "preprocessor.med_filter": lambda: preprocessor.med_filter(window, 3),
+        "preprocessor.range_check": lambda: preprocessor.range_check(window, 45, -10, False),
+        "preprocessor.range_check_all": lambda: preprocessor.range_check(window, 45, -10, True),
+        "err_detections.is_const_err": lambda: err_detections.is_const_err(window, last_changed,
+                                                                           timedelta(minutes=30)),
+        "err_detections.time_difference": lambda: err_detections.time_difference(1704067200, 1704069000),
+        "err_detections.CUSUM": lambda: err_detections.CUSUM(plus, minus, vals, 20.0, stats),
+        "err_detections.window_sum": lambda: err_detections.window_sum(plus),
+        "err_detections.get_slack": lambda: err_detections.get_slack(vals, 0.5, stats),
+        "err_detections.get_control_lim": lambda: err_detections.get_control_lim(vals, 5, stats),
+        "err_detections.get_target": lambda: err_detections.get_target(vals, 20.0, stats),
+        "err_detections.mean_target": lambda: err_detections.mean_target(vals, 20.0, stats),
+        "err_detections.AES_target": lambda: err_detections.AES_target(vals, 20.0, stats),
+        "err_detections.get_alpha": lambda: err_detections.get_alpha(vals, stats),
+        "err_detections.get_slack_numpy": lambda: err_detections.get_slack(vals, 0.5),
+        "err_detections.get_alpha_numpy": lambda: err_detections.get_alpha(vals),
+        "sliding_window.slide_next": lambda: window.slide_next(next(slid)),
+    }
+
+    results = {}
+    for name, case in cases.items():
+        timer = timeit.Timer(case)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        results[name] = best * 1e9
+    return results
+
+
+################################ END TO END ################################
+
+def run_csv_benchmarks(work_dir, sizes, seed=0, point_max=POINT_MAX):
+    """
+    Time run_csv (streamed, as csv mode runs it) and the batch engine on
+    synthetic series of every size.
+
+    Args:
+        work_dir (str): A directory with src/ and data/ subdirectories, src/ being the cwd.
+        sizes (iterable): The series lengths.
+        seed (int): The random seed. Default is 0.
+        point_max (int): The largest size the per-point engine is run on. Default is 1 000 000.
+
+    Returns:
+        dict: The readings per second of every engine and size, by name.
+    """
+    results = {}
+    for n in sizes:
+        file_path = write_series(os.path.join(work_dir, f"raw_bench_{n}.csv"), n, seed)
+
+        if n <= point_max:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stream_to_csv(stream_csv(file_path, "AES_bench", verbose=False), "clean", "bench")
+            close_all()
+            results[f"run_csv.{n}"] = n / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_csv_batch(file_path, "AES_bench_batch", "bench_batch", verbose=False)
+        close_all()
+        results[f"run_csv_batch.{n}"] = n / (time.perf_counter() - start)
+
+        os.remove(file_path)
+    return results
+
+
+################################ MQTT REPLAY ################################
+
+def replay_payloads(num_sensors, num_readings, seed=0):
+    """
+    Build the MQTT messages of a synthetic replay, interleaved across sensors.
+
+    Args:
+        num_sensors (int): The number of sensor topics.
+        num_readings (int): The total number of messages.
+        seed (int): The random seed. Default is 0.
+
+    Returns:
+        list: (topic, payload bytes) pairs in publish order.
+    """
+    per_sensor = num_readings // num_sensors
+    series = [synthetic_series(per_sensor, seed + s) for s in range(num_sensors)]
+    messages = []
+    for i in range(per_sensor):
+        for s, frame in enumerate(series):
+            last_changed = frame["Time"].iat[i].replace(" ", "T") + "+00:00"
+            payload = to_payload(str(frame["State"].iat[i]), last_changed, SENSOR_TYPE, "C")
+            messages.append((f"bench/sensor{s}", payload))
+    return messages
+
+
+def mqtt_async_benchmark(messages, num_sensors):
+    """
+    Replay messages through the asyncio runtime from an in-process broker.
+
+    Args:
+        messages (list): (topic, payload) pairs from replay_payloads.
+        num_sensors (int): The number of sensor topics.
+
+    Returns:
+        dict: The readings per second and the number of dropped readings.
+    """
+    async def replay():
+        broker = InProcessBroker()
+        runtime = AsyncRuntime(broker, ["bench/#"], max_queue=10_000)
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        for i, (topic, payload) in enumerate(messages):
+            broker.publish(topic, payload)
+            # let the sensor workers run, as a socket read would
+            if i % (num_sensors * 16) == 0:
+                await asyncio.sleep(0)
+        runtime.stop()
+        await task
+        return time.perf_counter() - start, runtime.dropped
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        elapsed, dropped = asyncio.run(replay())
+    close_all()
+    return {"mqtt_async.readings_per_s": len(messages) / elapsed, "mqtt_async.dropped": dropped}
+
+
+def mqtt_threaded_benchmark(messages):
+    """
+    Replay messages through MQTTClient.on_message on a network thread while the
+    main thread runs the pipelines, as mqtt mode does.
+
+    Args:
+        messages (list): (topic, payload) pairs from replay_payloads.
+
+    Returns:
+        dict: The readings per second and the number of dropped readings.
+    """
+    client = MQTTClient("localhost", 1883, ["bench/#"])
+    pipelines = {}
+
+    def network():
+        for topic, payload in messages:
+            client.on_message(client.client, None, SimpleNamespace(topic=topic, payload=payload))
+
+    start = time.perf_counter()
+    producer = threading.Thread(target=network)
+    producer.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while producer.is_alive() or client.has_readings():
+            raw_reading = client.get_reading(timeout=0.1)
+            if raw_reading is not None:
+                process_live_reading(pipelines, raw_reading)
+    producer.join()
+    elapsed = time.perf_counter() - start
+    close_all()
+    return {"mqtt_threaded.readings_per_s": client.received / elapsed, "mqtt_threaded.dropped": client.dropped}
+
+
+################################ REPORTING ################################
+
+def higher_is_better(name):
+    """
+    Returns:
+        bool: True if a larger value of the named result is an improvement.
+    """
+    return name.endswith("_per_s") or name.startswith(("run_csv.", "run_csv_batch."))
+
+
+def unit_of(name):
+    """
+    Returns:
+        str: The unit of the named result.
+    """
+    if name.endswith(".dropped"):
+        return "readings"
+    if higher_is_better(name):
+        return "readings/s"
+    return "ns/call"
+
+
+def environment():
+    """
+    Returns:
+        dict: The interpreter, library versions, machine and git commit of the run.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "commit": commit or None,
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print every result next to its baseline value.
+
+    Args:
+        results (dict): The results of this run, by name.
+        baseline (dict): The results of the baseline run, by name.
+        threshold (float): The relative change, in percent, counted as a regression.
+
+    Returns:
+        list: The names of the results that regressed by more than threshold.
+    """
+    regressions = []
+    print(f"{'benchmark':<40}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name, value in results.items():
+        old = baseline.get(name)
+        if old is None or name.endswith(".dropped"):
+            print(f"{name:<40}{'-' if old is None else f'{old:.4g}':>14}{value:>14.4g}{'':>10}")
+            continue
+        if old == 0:
+            continue
+        # positive change means faster
+        change = (value / old - 1) * 100 if higher_is_better(name) else (old / value - 1) * 100
+        flag = " !" if change < -threshold else ""
+        print(f"{name:<40}{old:>14.4g}{value:>14.4g}{change:>+9.1f}%{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    """
+    Run the benchmark suite from the command line.
+
+    Returns:
+        int: 1 if --fail is given and a result regressed against the baseline, otherwise 0.
+    """
+    args = argparse.ArgumentParser(description="Benchmark the sensor cleaning pipeline.")
+    args.add_argument("--suite", nargs="+", choices=("micro", "run_csv", "mqtt"),
+                      default=["micro", "run_csv", "mqtt"], help="the benchmarks to run")
+    args.add_argument("--sizes", nargs="+", type=int, help="run_csv series lengths (default 10k 100k 1M)")
+    args.add_argument("--full", action="store_true", help="run_csv up to 10M readings")
+    args.add_argument("--seed", type=int, default=0, help="random seed of the synthetic data")
+    args.add_argument("--out", help="write the results to this JSON file")
+    args.add_argument("--baseline", help="compare against the results in this JSON file")
+    args.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    args.add_argument("--fail", action="store_true", help="exit with 1 when a result regressed")
+    args = args.parse_args()
+
+    sizes = args.sizes or (FULL_SIZES if args.full else SIZES)
+    point_max = max(sizes) if args.sizes or args.full else POINT_MAX
+    results = {}
+    cwd = os.getcwd()
+
+    # outputs go to ../data relative to the cwd, so run inside a scratch tree
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, "src"))
+        os.makedirs(os.path.join(work_dir, "data"))
+        os.chdir(os.path.join(work_dir, "src"))
+        try:
+            if "micro" in args.suite:
+                print("Running microbenchmarks...")
+                results.update({f"micro.{name}": ns for name, ns in micro_benchmarks(seed=args.seed).items()})
+            if "run_csv" in args.suite:
+                print(f"Running run_csv on {', '.join(map(str, sizes))} readings...")
+                results.update(run_csv_benchmarks(work_dir, sizes, args.seed, point_max))
+            if "mqtt" in args.suite:
+                print(f"Replaying {REPLAY_READINGS} MQTT messages from {REPLAY_SENSORS} sensors...")
+                messages = replay_payloads(REPLAY_SENSORS, REPLAY_READINGS, args.seed)
+                results.update(mqtt_async_benchmark(messages, REPLAY_SENSORS))
+                results.update(mqtt_threaded_benchmark(messages))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "environment": environment(),
+        "seed": args.seed,
+        "results": {name: {"value": value, "unit": unit_of(name)} for name, value in results.items()},
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = {name: result["value"] for name, result in json.load(file)["results"].items()}
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} benchmarks regressed by more than {args.threshold}%")
+            return 1 if args.fail else 0
+    else:
+        for name, value in results.items():
+            print(f"{name:<40}{value:>14.4g} {unit_of(name)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Module containing the checkpoints of pipeline state:
+    save_checkpoint(file_path, state)
+    load_checkpoint(file_path)
+    file_marker(file_path, size)
+    LiveCheckpointer(file_path, interval)
+
+A checkpoint is a compact JSON file holding the state of one or more
+SensorPipelines (their windows, last changed value, last EMA, target and
+CUSUM deviations), written atomically so a crash can never leave half a
+checkpoint behind. The csv mode uses them to clean only the rows appended to
+a file since the last run; the live modes save one every interval and can
+continue from it with warm state after a restart.
+"""
+import json
+import os
+import time
+import zlib
+from pipeline import SensorPipeline
+
+LIVE_CHECKPOINT = "../data/checkpoint_live.json"
+CHECKPOINT_INTERVAL = 60.0   # default seconds between live checkpoints
+MARKER_BYTES = 4096          # bytes before a file offset that identify the file
+
+
+def save_checkpoint(file_path, state):
+    """
+    Replace a checkpoint file with a new state.
+
+    Args:
+        file_path (str): The path of the checkpoint file.
+        state (dict): The JSON serialisable state.
+
+    Returns:
+        None
+    """
+    temp_path = file_path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(state, file, separators=(",", ":"))
+    os.replace(temp_path, file_path)
+
+
+def load_checkpoint(file_path):
+    """
+    Read a checkpoint file.
+
+    Args:
+        file_path (str): The path of the checkpoint file.
+
+    Returns:
+        dict: The saved state, or None if there is no valid checkpoint.
+    """
+    try:
+        with open(file_path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable checkpoint {file_path}: {e}")
+        return None
+
+
+def file_marker(file_path, size):
+    """
+    Fingerprint the bytes of a file just before an offset, to tell later whether
+    the file was only appended to since or was rewritten.
+
+    Args:
+        file_path (str): The path of the file.
+        size (int): The offset the file was read up to.
+
+    Returns:
+        int: The CRC-32 of up to 4096 bytes before the offset.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(max(0, size - MARKER_BYTES))
+        return zlib.crc32(file.read(size - file.tell()))
+
+
+class LiveCheckpointer:
+    """
+    Periodically saves the pipelines of the live modes to one checkpoint file.
+
+    Attributes:
+        file_path (str): The path of the checkpoint file.
+        interval (float): The least number of seconds between checkpoints.
+        last_save (float): The monotonic time of the last checkpoint.
+    """
+
+    def __init__(self, file_path=LIVE_CHECKPOINT, interval=None):
+        """
+        Initialize the checkpointer.
+
+        Args:
+            file_path (str): The path of the checkpoint file. Default is ../data/checkpoint_live.json.
+            interval (float): The least number of seconds between checkpoints.
+                              Default is $CHECKPOINT_INTERVAL, or 60.
+        """
+        self.file_path = file_path
+        self.interval = float(os.getenv("CHECKPOINT_INTERVAL", CHECKPOINT_INTERVAL)) if interval is None else interval
+        self.last_save = time.monotonic()
+
+
+    def restore(self):
+        """
+        Rebuild the pipelines of the last checkpoint.
+
+        Returns:
+            dict: The SensorPipeline of every saved sensor, by key; empty if there is no checkpoint.
+        """
+        state = load_checkpoint(self.file_path)
+        pipelines = {}
+        for key, pipeline_state in (state or {}).get("pipelines", {}).items():
+            pipeline = pipelines[key] = SensorPipeline(key)
+            pipeline.set_state(pipeline_state)
+        if pipelines:
+            print(f"Resuming {len(pipelines)} sensor pipelines from {self.file_path}")
+        return pipelines
+
+
+    def maybe_save(self, pipelines):
+        """
+        Save the pipelines if the interval has passed since the last checkpoint.
+
+        Args:
+            pipelines (dict): The SensorPipeline of every sensor, by key.
+
+        Returns:
+            bool: True if a checkpoint was saved.
+        """
+        if time.monotonic() - self.last_save < self.interval:
+            return False
+        self.save(pipelines)
+        return True
+
+
+    def save(self, pipelines):
+        """
+        Save the pipelines now.
+
+        Args:
+            pipelines (dict): The SensorPipeline of every sensor, by key.
+
+        Returns:
+            None
+        """
+        save_checkpoint(self.file_path, {
+            "time": time.time(),
+            "pipelines": {key: pipeline.get_state() for key, pipeline in list(pipelines.items())},
+        })
+        self.last_save = time.monotonic()
@@ -0,0 +1,339 @@
+"""
+Module containing the optional Parquet output backend:
+    ParquetWriter(file_path, header, overwrite, row_group_rows)
+    get_table_writer(file_path, header, overwrite)
+    close_all()
+    read_range(file_path, start, end, columns)
+    export_csv(file_path, csv_path)
+
+Parquet files hold the same columns as the CSV outputs, but typed: values are
+float64, Time is a millisecond timestamp and strings (Device, Unit) are
+dictionary encoded, all zstd compressed. The Time text as written to CSV is
+kept next to it in a Time_text column, so export_csv gives back the CSV
+output exactly. Rows are written in row groups whose Time min/max statistics
+let read_range skip every group outside the requested time range.
+
+Needs pyarrow, which is an optional dependency; without it the CSV outputs
+keep working and only this module's functions raise ImportError.
+"""
+import atexit
+import os
+import threading
+import numpy as np
+import pandas as pd
+from csv_writer import BufferedCSVWriter
+from data_point import TIME_FORMAT
+from format_time import TimeNormalizer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ROW_GROUP_ROWS = 65_536
+STRING_COLUMNS = ("Device", "Unit", "Sensor", "Alert")
+TIME_TEXT = "Time_text"   # the Time column as written to CSV, stored next to the typed Time
+
+
+def require_arrow():
+    """
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    if pa is None:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+
+
+def column_type(name):
+    """
+    Get the Arrow type an output column is stored as.
+
+    Args:
+        name (str): The column name.
+
+    Returns:
+        pa.DataType: millisecond timestamp for Time, string for Time_text, dictionary encoded
+                     string for text columns, otherwise float64.
+    """
+    if name == "Time":
+        return pa.timestamp("ms")
+    if name == TIME_TEXT:
+        return pa.string()
+    if name in STRING_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.float64()
+
+
+def to_arrow(name, values):
+    """
+    Convert the values of an output column to an Arrow array of its type.
+
+    Args:
+        name (str): The column name.
+        values (iterable): The values as written to CSV (numbers, timestamp strings, text).
+
+    Returns:
+        pa.Array: The typed column.
+    """
+    if name == "Time":
+        times = pd.Series(values, dtype=object)
+        parsed = pd.to_datetime(times, format=TIME_FORMAT, errors="coerce")
+        # timestamps in any other layout are parsed with their detected format, keeping fractions of a second
+        missing = parsed.isna().to_numpy()
+        if missing.any():
+            parsed = parsed.copy()
+            parsed[missing] = TimeNormalizer().to_datetimes(times[missing]).to_numpy()
+        return pa.array(parsed.to_numpy().astype("datetime64[ms]"), pa.timestamp("ms"), mask=parsed.isna().to_numpy())
+    if name == TIME_TEXT:
+        return pa.array([value if isinstance(value, str) else None for value in values], pa.string())
+    if name in STRING_COLUMNS:
+        return pa.array(values, pa.string()).dictionary_encode()
+    return pa.array(pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64), pa.float64())
+
+
+class ParquetWriter:
+    """
+    A Parquet file writer with the interface of BufferedCSVWriter.
+
+    Rows are buffered and written a row group at a time. A Parquet file can
+    only be read once it is closed, so flush writes nothing until a full row
+    group is waiting; close writes the rest and the file footer. Writers
+    should be closed (close_all) before the program ends: the atexit fallback
+    cannot write rows that need pyarrow's pandas support loaded after
+    shutdown has begun. Appending to an existing file copies its rows into
+    the new file first.
+
+    Attributes:
+        file_path (str): The path of the Parquet file being written.
+        header (list): The columns of the rows written, as in the CSV output.
+        schema (pa.Schema): The typed columns of the file, header plus Time_text if it has a Time.
+        columns (list): The index in a row of the value of every schema column.
+        row_group_rows (int): The number of rows per row group.
+        rows (list): The rows waiting to be written.
+    """
+
+    def __init__(self, file_path, header, overwrite=False, row_group_rows=ROW_GROUP_ROWS):
+        """
+        Open the Parquet file, keeping the rows already in it unless overwriting.
+
+        Args:
+            file_path (str): The path of the Parquet file.
+            header (list): The column names.
+            overwrite (bool): Whether to start the file again (True) or append to it (False).
+            row_group_rows (int): The number of rows per row group. Default is 65 536.
+
+        Raises:
+            ImportError: If pyarrow is not installed.
+        """
+        require_arrow()
+        self.file_path = file_path
+        self.header = list(header)
+        names = self.header + ([TIME_TEXT] if "Time" in self.header else [])
+        self.schema = pa.schema([(name, column_type(name)) for name in names])
+        self.columns = [self.header.index("Time" if name == TIME_TEXT else name) for name in names]
+        self.row_group_rows = row_group_rows
+        self.rows = []
+        self.lock = threading.Lock()
+
+        existing = None
+        if not overwrite and os.path.exists(file_path):
+            existing = pq.read_table(file_path)
+            if TIME_TEXT in names and TIME_TEXT not in existing.column_names:
+                # written before the Time text was kept
+                text = existing.column("Time").to_pandas().dt.strftime(TIME_FORMAT)
+                existing = existing.append_column(TIME_TEXT, pa.array(text, pa.string()))
+            existing = existing.select(names).cast(self.schema)
+        self.writer = pq.ParquetWriter(file_path, self.schema, compression="zstd")
+        if existing is not None:
+            self.writer.write_table(existing, row_group_size=row_group_rows)
+
+
+    def write_row(self, row):
+        """
+        Buffer a single row, writing a row group once enough rows are waiting.
+
+        Args:
+            row (list): The row to write, in header order.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rows.append(row)
+            self._write_full_groups()
+
+
+    def write_rows(self, rows):
+        """
+        Buffer several rows, writing row groups once enough rows are waiting.
+
+        Args:
+            rows (iterable): The rows to write, in header order.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rows.extend(rows)
+            self._write_full_groups()
+
+
+    def write_frame(self, frame):
+        """
+        Write a whole DataFrame with the file's columns.
+
+        Args:
+            frame (DataFrame): The rows to write.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self._write_rows(len(self.rows))
+            table = pa.table([to_arrow(name, frame[self.header[column]].tolist())
+                              for name, column in zip(self.schema.names, self.columns)], schema=self.schema)
+            self.writer.write_table(table, row_group_size=self.row_group_rows)
+
+
+    def flush(self):
+        """
+        Write any full row groups waiting; see the class description.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self._write_full_groups()
+
+
+    def close(self):
+        """
+        Write the buffered rows and close the file.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.writer is None:
+                return
+            self._write_rows(len(self.rows))
+            self.writer.close()
+            self.writer = None
+
+
+    def _write_full_groups(self):
+        while len(self.rows) >= self.row_group_rows:
+            self._write_rows(self.row_group_rows)
+
+
+    def _write_rows(self, count):
+        if not count:
+            return
+        rows, self.rows = self.rows[:count], self.rows[count:]
+        columns = list(zip(*rows))
+        table = pa.table([to_arrow(name, list(columns[column])) for name, column in zip(self.schema.names, self.columns)],
+                         schema=self.schema)
+        self.writer.write_table(table)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_table_writer(file_path, header, overwrite=False):
+    """
+    Get the open Parquet writer for a file, creating it if needed.
+
+    Args:
+        file_path (str): The path of the Parquet file.
+        header (list): The column names.
+        overwrite (bool): Whether to start the file again, closing any open writer for it.
+
+    Returns:
+        ParquetWriter: The writer for the file.
+    """
+    key = os.path.abspath(file_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is not None and overwrite:
+            writer.close()
+            writer = None
+        if writer is None:
+            writer = ParquetWriter(file_path, header, overwrite)
+            _writers[key] = writer
+        return writer
+
+
+def close_all():
+    """
+    Write out and close every open Parquet writer.
+
+    Returns:
+        None
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_all)
+
+
+def read_range(file_path, start=None, end=None, columns=None):
+    """
+    Read the rows of a Parquet output whose Time falls in [start, end).
+
+    Only the row groups that can hold such rows are read.
+
+    Args:
+        file_path (str): The path of the Parquet file.
+        start (str | datetime): The first time to include. Default is None (from the start).
+        end (str | datetime): The first time to exclude. Default is None (to the end).
+        columns (list): The columns to read. Default is None (all columns but Time_text).
+
+    Returns:
+        DataFrame: The matching rows, with Device and Unit as categoricals.
+    """
+    require_arrow()
+    if columns is None:
+        columns = [name for name in pq.read_schema(file_path).names if name != TIME_TEXT]
+    filters = []
+    if start is not None:
+        filters.append(("Time", ">=", pd.Timestamp(start)))
+    if end is not None:
+        filters.append(("Time", "<", pd.Timestamp(end)))
+    table = pq.read_table(file_path, columns=columns, filters=filters or None)
+    return table.to_pandas()
+
+
+def export_csv(file_path, csv_path=None):
+    """
+    Write a Parquet output back out in the CSV layout of the other outputs.
+
+    Times are written as their Time_text, as in the CSV output, or in TIME_FORMAT
+    for files written before it was kept. Missing times are written as "0",
+    which is_null treats as a null reading.
+
+    Args:
+        file_path (str): The path of the Parquet file.
+        csv_path (str): The path of the CSV file. Default is file_path with a .csv extension.
+
+    Returns:
+        str: The path of the CSV file.
+    """
+    frame = read_range(file_path, columns=pq.read_schema(file_path).names)
+    if TIME_TEXT in frame:
+        frame["Time"] = frame.pop(TIME_TEXT).fillna("0")
+    elif "Time" in frame:
+        frame["Time"] = frame["Time"].dt.strftime(TIME_FORMAT).fillna("0")
+    for name in frame.columns.intersection(STRING_COLUMNS):
+        frame[name] = frame[name].astype(object)
+
+    csv_path = csv_path or os.path.splitext(file_path)[0] + ".csv"
+    writer = BufferedCSVWriter(csv_path, list(frame.columns), overwrite=True)
+    writer.write_frame(frame)
+    writer.close()
+    return csv_path
@@ -0,0 +1,242 @@
+"""
+Module containing the buffered CSV output writers:
+    BufferedCSVWriter(file_path, header, overwrite, max_rows, max_delay)
+    get_writer(file_path, header, overwrite)
+    close_writer(file_path)
+    flush_all()
+    close_all()
+
+Writers keep their output file open and buffer rows in memory, writing them
+in batches once max_rows rows are waiting or max_delay seconds have passed
+since the last flush. Writers made by get_writer are also checked every
+FLUSH_CHECK seconds by a background thread, so rows of a sensor that has gone
+quiet are still written within about max_delay. Every open writer is flushed
+and closed at interpreter exit, including exits caused by an unhandled exception.
+
+Rows end in "\n", like the pandas output files they are appended to.
+"""
+import atexit
+import csv
+import os
+import threading
+import time
+
+FLUSH_CHECK = 1.0   # seconds between the background checks for writers due a flush
+
+
+class BufferedCSVWriter:
+    """
+    A CSV writer that keeps its file open and writes rows in batches.
+
+    max_delay is checked when rows are written and by flush_if_due; a writer
+    not made by get_writer is not checked in the background.
+
+    Attributes:
+        file_path (str): The path of the CSV file being written.
+        max_rows (int): The number of buffered rows that triggers a flush.
+        max_delay (float): The seconds since the last flush that trigger a flush.
+        rows (list): The rows waiting to be written.
+    """
+
+    def __init__(self, file_path, header=None, overwrite=False, max_rows=1000, max_delay=5.0):
+        """
+        Open the CSV file and queue the header if the file is new.
+
+        Args:
+            file_path (str): The path of the CSV file.
+            header (list): The header row, written only when the file is created or overwritten.
+            overwrite (bool): Whether to truncate the file (True) or append to it (False).
+            max_rows (int): The number of buffered rows that triggers a flush. Default is 1000.
+            max_delay (float): The seconds since the last flush that trigger a flush. Default is 5.0.
+        """
+        new_file = overwrite or not os.path.exists(file_path)
+        self.file_path = file_path
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.file = open(file_path, mode='w' if overwrite else 'a', newline='')
+        self.csv_writer = csv.writer(self.file, lineterminator="\n")
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        self.rows = [header] if (header and new_file) else []
+
+
+    def write_row(self, row):
+        """
+        Buffer a single row, flushing if a threshold has been reached.
+
+        Args:
+            row (list): The row to write.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rows.append(row)
+            self._flush_if_due()
+
+
+    def write_rows(self, rows):
+        """
+        Buffer several rows, flushing if a threshold has been reached.
+
+        Args:
+            rows (iterable): The rows to write.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.rows.extend(rows)
+            self._flush_if_due()
+
+
+    def write_frame(self, frame):
+        """
+        Buffer every row of a DataFrame, in column order.
+
+        Args:
+            frame (DataFrame): The rows to write.
+
+        Returns:
+            None
+        """
+        self.write_rows(frame.itertuples(index=False, name=None))
+
+
+    def flush(self):
+        """
+        Write all buffered rows to the file.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self._flush()
+
+
+    def flush_if_due(self):
+        """
+        Write the buffered rows if max_delay seconds have passed since the last flush.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.rows and not self.file.closed:
+                self._flush_if_due()
+
+
+    def close(self):
+        """
+        Flush the buffered rows and close the file.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.file.closed:
+                return
+            self._flush()
+            self.file.close()
+
+
+    def _flush_if_due(self):
+        if len(self.rows) >= self.max_rows or time.monotonic() - self.last_flush >= self.max_delay:
+            self._flush()
+
+
+    def _flush(self):
+        if self.rows:
+            self.csv_writer.writerows(self.rows)
+            self.rows = []
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+_flusher = None
+
+
+def get_writer(file_path, header=None, overwrite=False):
+    """
+    Get the open writer for a file, creating it if needed.
+
+    Args:
+        file_path (str): The path of the CSV file.
+        header (list): The header row, written only when the file is created or overwritten.
+        overwrite (bool): Whether to start the file again, closing any open writer for it.
+
+    Returns:
+        BufferedCSVWriter: The writer for the file.
+    """
+    global _flusher
+    key = os.path.abspath(file_path)
+    with _writers_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="csv-flusher", daemon=True)
+            _flusher.start()
+        writer = _writers.get(key)
+        if writer is not None and overwrite:
+            writer.close()
+            writer = None
+        if writer is None:
+            writer = BufferedCSVWriter(file_path, header, overwrite)
+            _writers[key] = writer
+        return writer
+
+
+def close_writer(file_path):
+    """
+    Flush and close the open writer of a file, if it has one, so the file can be
+    changed by other means.
+
+    Args:
+        file_path (str): The path of the CSV file.
+
+    Returns:
+        None
+    """
+    with _writers_lock:
+        writer = _writers.pop(os.path.abspath(file_path), None)
+    if writer is not None:
+        writer.close()
+
+
+def flush_all():
+    """
+    Flush every open writer.
+
+    Returns:
+        None
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+def close_all():
+    """
+    Flush and close every open writer.
+
+    Returns:
+        None
+    """
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_CHECK)
+        with _writers_lock:
+            writers = list(_writers.values())
+        for writer in writers:
+            writer.flush_if_due()
+
+
+atexit.register(close_all)
@@ -1,13 +1,28 @@
+from datetime import datetime, timezone
+from sys import intern
+from time import gmtime, strftime
+from dateutil import parser
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"   # layout of the timestamps written to CSV
+
+
 class DataPoint:
     """
     A class representing a single data point from a sensor.
 
+    The timestamp is parsed into epoch seconds once, when the reading is
+    created. Timestamps in TIME_FORMAT are not stored as text at all and are
+    formatted again from the epoch when asked for; any other timestamp keeps
+    its original text so it is written back out unchanged.
+
     Attributes:
         value (float): The sensor reading value.
+        epoch (int): The timestamp in seconds since the Unix epoch, None if it is invalid.
         time_stamp (str): The timestamp of when the reading was taken.
         sensor_type (str): The type of sensor that produced the reading.
         unit_of_measurement (str): The unit of measurement for the sensor reading.
     """
+    __slots__ = ('value', 'epoch', 'sensor_type', 'unit_of_measurement', '_time_text')
 
     def __init__(self, value, time_stamp, sensor_type, unit_of_measurement):
         """
@@ -21,8 +36,49 @@ class DataPoint:
         """
         self.value = value
         self.time_stamp = time_stamp
-        self.sensor_type = sensor_type
-        self.unit_of_measurement = unit_of_measurement
+        # every reading of a sensor shares one copy of its type and unit
+        self.sensor_type = intern(sensor_type) if type(sensor_type) is str else sensor_type
+        self.unit_of_measurement = (intern(unit_of_measurement) if type(unit_of_measurement) is str
+                                    else unit_of_measurement)
+
+    @classmethod
+    def from_epoch(cls, value, epoch, sensor_type, unit_of_measurement):
+        """
+        Create a DataPoint from a time already in epoch seconds, without formatting
+        it as text to be parsed again.
+
+        Args:
+            value (float): The sensor reading value.
+            epoch (int): The time of the reading in seconds since the Unix epoch, None if
+                         it has no valid time.
+            sensor_type (str): The type of sensor that produced the reading.
+            unit_of_measurement (str): The unit of measurement for the sensor reading.
+
+        Returns:
+            DataPoint: The reading, its time_stamp in TIME_FORMAT, or None without a
+                       valid time so that is_null drops it.
+        """
+        point = cls.__new__(cls)
+        point.value = value
+        point.epoch = epoch
+        # None text with a None epoch reads back as a missing time, not as now
+        point._time_text = None
+        point.sensor_type = intern(sensor_type) if type(sensor_type) is str else sensor_type
+        point.unit_of_measurement = (intern(unit_of_measurement) if type(unit_of_measurement) is str
+                                     else unit_of_measurement)
+        return point
+
+    @property
+    def time_stamp(self):
+        # only valid canonical times are rebuilt; a missing time stays missing
+        if self._time_text is None and self.epoch is not None:
+            return strftime(TIME_FORMAT, gmtime(self.epoch))
+        return self._time_text
+
+    @time_stamp.setter
+    def time_stamp(self, time_stamp):
+        self.epoch = to_epoch(time_stamp)
+        self._time_text = None if self.epoch is not None and is_canonical(time_stamp) else time_stamp
 
     def get_val(self):
         """
@@ -40,4 +96,47 @@ class DataPoint:
         Returns:
             str: The timestamp of when the reading was taken.
         """
-        return self.time_stamp
\ No newline at end of file
+        return self.time_stamp
+
+
+def is_canonical(time_stamp):
+    """
+    Check if a valid timestamp string is in TIME_FORMAT, so it can be rebuilt from its epoch.
+
+    Args:
+        time_stamp (str): A timestamp that to_epoch could parse.
+
+    Returns:
+        bool: True if the timestamp is "%Y-%m-%d %H:%M:%S".
+    """
+    return len(time_stamp) == 19 and time_stamp[10] == ' ' and time_stamp[4] == time_stamp[7] == '-'
+
+
+def to_epoch(time_stamp):
+    """
+    Convert a timestamp string to integer seconds since the Unix epoch.
+
+    ISO-8601 style timestamps (eg "2024-09-12 01:04:03" or "2024-09-11T16:00:39.000Z")
+    take the fast path; any other layout falls back to the general dateutil parser.
+    Timestamps without a timezone are taken as UTC.
+
+    Args:
+        time_stamp (str): The timestamp of the reading.
+
+    Returns:
+        int: The epoch seconds, or None if the timestamp is missing or invalid.
+    """
+    if not isinstance(time_stamp, str) or time_stamp == '0':
+        return None
+
+    try:
+        parsed = datetime.fromisoformat(time_stamp)
+    except ValueError:
+        try:
+            parsed = parser.parse(time_stamp)
+        except (ValueError, OverflowError):
+            return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
@@ -0,0 +1,483 @@
+"""
+Module containing the pluggable drift and fault detectors:
+    DetectorContext()
+    Detector, EWMADetector, PageHinkleyDetector, StuckAtBoundDetector, SpikeRateDetector
+    register_detector(cls), make_engine(settings, stream)
+    DetectorEngine(detectors, budgets, stream)
+
+The constant error check and CUSUM are built into the pipeline. Any number of
+extra detectors can run alongside them: a detector is a class registered
+under a name, enabled per sensor type with a "detectors" setting in the
+sensor profiles, e.g. {"ewma": {"lam": 0.2}, "spike_rate": {}}.
+
+Once CUSUM has run on a reading, the pipeline fills one DetectorContext with
+the raw and cleaned value, the window's rolling mean, std, min and max (read
+once from its running statistics) and the built-in verdicts, and a
+DetectorEngine hands that same context to every detector in one pass. Every
+detector call is timed against its budget ("budget_us" in its settings,
+BUDGET_US by default); a detector over budget for OVERRUN_LIMIT readings in
+a row is suspended, so a slow detector cannot hold up the stream.
+"""
+from collections import deque
+from math import sqrt
+from time import perf_counter_ns
+from sliding_window import NAT_EPOCH
+
+BUDGET_US = 50       # default microseconds a detector may take per reading
+OVERRUN_LIMIT = 8    # readings in a row over budget before a detector is suspended
+
+DETECTORS = {}
+
+
+def register_detector(cls):
+    """
+    Make a detector class available to the sensor profiles under its name.
+
+    Args:
+        cls (type): A Detector subclass with a unique name.
+
+    Returns:
+        type: cls, so it can be used as a class decorator.
+    """
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+class DetectorContext:
+    """
+    What the detectors are told about the reading just processed.
+
+    Attributes:
+        epoch (int): The reading time in epoch seconds, NAT_EPOCH if it is invalid.
+        value (float): The raw value, before the range check.
+        cleaned (float): The value after the range check, EMA and median filter, as CUSUM saw it.
+        mean (float): The rolling mean of the window.
+        std (float): The rolling standard deviation of the window.
+        min (float): The smallest value in the window.
+        max (float): The largest value in the window.
+        UL (float): The upper limit for acceptable values.
+        LL (float): The lower limit for acceptable values.
+        target (float): The CUSUM target.
+        const_err (bool): Whether a constant error was detected.
+        in_control (bool): Whether CUSUM found the process in control.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty context, filled in for every reading.
+        """
+        self.epoch = NAT_EPOCH
+        self.value = self.cleaned = self.target = 0.0
+        self.mean = self.std = self.min = self.max = 0.0
+        self.UL = self.LL = 0.0
+        self.const_err = False
+        self.in_control = True
+
+
+class Detector:
+    """
+    The base of every detector: one update per processed reading.
+
+    Attributes:
+        name (str): The name the detector is enabled under in the sensor profiles.
+        message (str): The alert raised when the detector fires.
+    """
+    name = None
+    message = None
+
+    def update(self, context):
+        """
+        Take the next processed reading.
+
+        Args:
+            context (DetectorContext): The reading and its window statistics.
+
+        Returns:
+            bool: True if the detector fires on this reading.
+        """
+        raise NotImplementedError
+
+
+    def get_state(self):
+        """
+        Returns:
+            dict: The detector's state, in a JSON serialisable form.
+        """
+        return {}
+
+
+    def set_state(self, state):
+        """
+        Carry on from a state returned by get_state.
+
+        Args:
+            state (dict): The saved state.
+
+        Returns:
+            None
+        """
+
+
+@register_detector
+class EWMADetector(Detector):
+    """
+    An EWMA control chart of the cleaned values, with limits of L standard
+    deviations of the EWMA around the window mean.
+
+    Attributes:
+        lam (float): The EWMA smoothing factor.
+        L (float): The width of the control limits, in standard deviations of the EWMA.
+        z (float): The EWMA of the cleaned values, None before the first reading.
+    """
+    name = "ewma"
+    message = "Drift detected in EWMA"
+
+    def __init__(self, lam=0.2, L=3.0):
+        """
+        Args:
+            lam (float): The EWMA smoothing factor. Default is 0.2.
+            L (float): The width of the control limits. Default is 3.
+
+        Raises:
+            ValueError: If lam is not in (0, 1] or L is not positive.
+        """
+        if not 0 < lam <= 1 or L <= 0:
+            raise ValueError("ewma needs 0 < lam <= 1 and L > 0")
+        self.lam = lam
+        self.L = L
+        self.width = L * sqrt(lam / (2 - lam))
+        self.z = None
+
+
+    def update(self, context):
+        z = context.cleaned if self.z is None else self.lam * context.cleaned + (1 - self.lam) * self.z
+        self.z = z
+        return context.std > 0 and abs(z - context.mean) > self.width * context.std
+
+
+    def get_state(self):
+        return {"z": self.z}
+
+
+    def set_state(self, state):
+        self.z = state.get("z")
+
+
+@register_detector
+class PageHinkleyDetector(Detector):
+    """
+    A two-sided Page-Hinkley test of the cleaned values against their mean since
+    the last alarm, with the magnitude and threshold in window standard deviations.
+    It starts over after every alarm.
+
+    Attributes:
+        delta (float): The magnitude of change tolerated, in standard deviations.
+        threshold (float): The cumulative deviation that fires, in standard deviations.
+        min_readings (int): The readings since the last alarm before it can fire again.
+        count (int): The readings since the last alarm.
+        mean (float): The mean of the cleaned values since the last alarm.
+        up (float): The cumulative deviation for an increase, and up_min its minimum.
+        down (float): The cumulative deviation for a decrease, and down_max its maximum.
+    """
+    name = "page_hinkley"
+    message = "Drift detected in Page-Hinkley"
+
+    def __init__(self, delta=0.5, threshold=50.0, min_readings=30):
+        """
+        Args:
+            delta (float): The magnitude of change tolerated. Default is 0.5.
+            threshold (float): The cumulative deviation that fires. Default is 50.
+            min_readings (int): The readings before it can fire. Default is 30.
+
+        Raises:
+            ValueError: If delta is negative or threshold is not positive.
+        """
+        if delta < 0 or threshold <= 0:
+            raise ValueError("page_hinkley needs delta >= 0 and threshold > 0")
+        self.delta = delta
+        self.threshold = threshold
+        self.min_readings = min_readings
+        self.reset()
+
+
+    def reset(self):
+        """
+        Start over, as after an alarm.
+
+        Returns:
+            None
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.up = self.up_min = 0.0
+        self.down = self.down_max = 0.0
+
+
+    def update(self, context):
+        x = context.cleaned
+        self.count += 1
+        self.mean += (x - self.mean) / self.count
+        slack = self.delta * context.std
+        self.up += x - self.mean - slack
+        self.up_min = min(self.up_min, self.up)
+        self.down += x - self.mean + slack
+        self.down_max = max(self.down_max, self.down)
+
+        limit = self.threshold * context.std
+        if (self.count >= self.min_readings and limit > 0
+                and (self.up - self.up_min > limit or self.down_max - self.down > limit)):
+            self.reset()
+            return True
+        return False
+
+
+    def get_state(self):
+        return {"count": self.count, "mean": self.mean, "up": self.up, "up_min": self.up_min,
+                "down": self.down, "down_max": self.down_max}
+
+
+    def set_state(self, state):
+        for key, value in state.items():
+            setattr(self, key, value)
+
+
+@register_detector
+class StuckAtBoundDetector(Detector):
+    """
+    Fires while the raw value has been at or beyond a range limit for a number
+    of readings in a row, as a saturated or railed sensor reports.
+
+    Attributes:
+        readings (int): The readings in a row at a limit that fire.
+        run (int): The readings in a row at a limit so far.
+    """
+    name = "stuck_at_bound"
+    message = "Sensor stuck at a range limit"
+
+    def __init__(self, readings=3):
+        """
+        Args:
+            readings (int): The readings in a row at a limit that fire. Default is 3.
+
+        Raises:
+            ValueError: If readings is smaller than 1.
+        """
+        if readings < 1:
+            raise ValueError("stuck_at_bound needs readings >= 1")
+        self.readings = readings
+        self.run = 0
+
+
+    def update(self, context):
+        if context.value >= context.UL or context.value <= context.LL:
+            self.run += 1
+        else:
+            self.run = 0
+        return self.run >= self.readings
+
+
+    def get_state(self):
+        return {"run": self.run}
+
+
+    def set_state(self, state):
+        self.run = state.get("run", 0)
+
+
+@register_detector
+class SpikeRateDetector(Detector):
+    """
+    Fires while more than max_spikes spikes fell within the last period seconds.
+    A spike is a raw value out of range or more than k standard deviations from
+    the window mean.
+
+    Attributes:
+        k (float): The distance from the window mean that is a spike, in standard deviations.
+        max_spikes (int): The most spikes allowed within a period.
+        period (int): The seconds spikes are counted over.
+        spikes (deque): The epoch times of the spikes within the last period.
+    """
+    name = "spike_rate"
+    message = "Spike rate exceeded"
+
+    def __init__(self, k=8.0, max_spikes=5, period=3600):
+        """
+        Args:
+            k (float): The distance from the mean that is a spike. Default is 8.
+            max_spikes (int): The most spikes allowed within a period. Default is 5.
+            period (int): The seconds spikes are counted over. Default is 3600.
+
+        Raises:
+            ValueError: If k or period is not positive, or max_spikes is negative.
+        """
+        if k <= 0 or period <= 0 or max_spikes < 0:
+            raise ValueError("spike_rate needs k > 0, period > 0 and max_spikes >= 0")
+        self.k = k
+        self.max_spikes = max_spikes
+        self.period = period
+        self.spikes = deque()
+
+
+    def update(self, context):
+        value, epoch = context.value, context.epoch
+        if epoch == NAT_EPOCH:
+            # a spike without a time cannot be placed in a period
+            return len(self.spikes) > self.max_spikes
+        spikes = self.spikes
+        if (value > context.UL or value < context.LL
+                or (context.std > 0 and abs(value - context.mean) > self.k * context.std)):
+            spikes.append(epoch)
+        while spikes and spikes[0] <= epoch - self.period:
+            spikes.popleft()
+        return len(spikes) > self.max_spikes
+
+
+    def get_state(self):
+        return {"spikes": [int(epoch) for epoch in self.spikes]}
+
+
+    def set_state(self, state):
+        self.spikes = deque(state.get("spikes", []))
+
+
+class DetectorEngine:
+    """
+    Runs the extra detectors of a stream over every processed reading, in one
+    pass over a shared context, each within its time budget.
+
+    Attributes:
+        detectors (list): The Detector instances, in the order they run.
+        budgets (list): The nanoseconds each detector may take per reading, None for no limit.
+        stream (str): The stream the detectors belong to, for warnings.
+        settings (dict): The settings the engine was made from, by detector name.
+        overruns (list): The readings in a row each detector went over its budget.
+        suspended (list): Whether each detector was suspended for going over its budget.
+        alarms (list): The number of times each detector fired.
+        spent_ns (list): The nanoseconds spent in each detector.
+        calls (int): The number of readings evaluated.
+    """
+
+    def __init__(self, detectors, budgets=None, stream=None):
+        """
+        Args:
+            detectors (list): The Detector instances to run.
+            budgets (list): The microseconds each detector may take per reading, None
+                            for no limit. Default is None (no limits).
+            stream (str): The stream the detectors belong to. Default is None.
+        """
+        self.detectors = list(detectors)
+        budgets = budgets or [None] * len(self.detectors)
+        self.budgets = [None if budget is None else budget * 1000 for budget in budgets]
+        self.stream = stream
+        self.settings = {}
+        self.overruns = [0] * len(self.detectors)
+        self.suspended = [False] * len(self.detectors)
+        self.alarms = [0] * len(self.detectors)
+        self.spent_ns = [0] * len(self.detectors)
+        self.calls = 0
+
+
+    def evaluate(self, context):
+        """
+        Run every detector that is not suspended on the context of a reading.
+
+        Args:
+            context (DetectorContext): The reading and its window statistics.
+
+        Returns:
+            list: The detectors that fired, in order; empty if none did.
+        """
+        self.calls += 1
+        fired = []
+        for idx, detector in enumerate(self.detectors):
+            if self.suspended[idx]:
+                continue
+            start = perf_counter_ns()
+            alarm = detector.update(context)
+            spent = perf_counter_ns() - start
+            self.spent_ns[idx] += spent
+            if alarm:
+                self.alarms[idx] += 1
+                fired.append(detector)
+
+            budget = self.budgets[idx]
+            if budget is None:
+                continue
+            if spent <= budget:
+                self.overruns[idx] = 0
+                continue
+            self.overruns[idx] += 1
+            if self.overruns[idx] >= OVERRUN_LIMIT:
+                self.suspended[idx] = True
+                print(f"WARNING: {detector.name} detector suspended for {self.stream}, over its "
+                      f"{budget / 1000:g} us budget for {OVERRUN_LIMIT} readings in a row")
+        return fired
+
+
+    def summary(self):
+        """
+        Returns:
+            dict: The alarms, mean microseconds per reading, and whether it was
+                  suspended, of every detector by name.
+        """
+        return {detector.name: {
+            "alarms": self.alarms[idx],
+            "mean_us": self.spent_ns[idx] / self.calls / 1000 if self.calls else 0.0,
+            "suspended": self.suspended[idx],
+        } for idx, detector in enumerate(self.detectors)}
+
+
+    def get_state(self):
+        """
+        Returns:
+            dict: The state of every detector, by name.
+        """
+        return {detector.name: detector.get_state() for detector in self.detectors}
+
+
+    def set_state(self, state):
+        """
+        Carry on from a state returned by get_state; detectors it does not hold start fresh.
+
+        Args:
+            state (dict): The saved states, by detector name.
+
+        Returns:
+            None
+        """
+        for detector in self.detectors:
+            if detector.name in state:
+                detector.set_state(state[detector.name])
+
+
+def make_engine(settings, stream=None):
+    """
+    Make the detector engine of a sensor profile's "detectors" setting.
+
+    Args:
+        settings (dict): The parameters of every enabled detector by name, with an
+                         optional "budget_us" (default BUDGET_US, null for no limit).
+        stream (str): The stream the detectors belong to. Default is None.
+
+    Returns:
+        DetectorEngine: The engine, or None if no detector is enabled.
+
+    Raises:
+        ValueError: If a detector is unknown or its parameters are invalid.
+    """
+    if not settings:
+        return None
+    detectors, budgets = [], []
+    for name, params in settings.items():
+        cls = DETECTORS.get(name)
+        if cls is None:
+            raise ValueError(f"unknown detector {name}, known are {', '.join(sorted(DETECTORS))}")
+        params = dict(params or {})
+        budgets.append(params.pop("budget_us", BUDGET_US))
+        try:
+            detectors.append(cls(**params))
+        except TypeError as e:
+            raise ValueError(f"invalid {name} detector parameters: {e}") from None
+    engine = DetectorEngine(detectors, budgets, stream)
+    engine.settings = settings
+    return engine
@@ -1,5 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from numpy import std, mean
+from sliding_window import NAT_EPOCH
 def is_const_err(window, last_changed, max_time):
     """
     Check if the sensor is experiencing a constant error, where the latest value
@@ -21,8 +22,11 @@ def is_const_err(window, last_changed, max_time):
     
     if window_vals[-1] == last_changed[0]:
         #new value == last changed value
-        time_diff = time_difference(last_changed[1], window_times[-1])
-        if time_diff > max_time:
+        if NAT_EPOCH in (last_changed[1], window_times[-1]):
+            #no valid time to compare against
+            return False
+        #whole seconds between the two epochs
+        if window_times[-1] - last_changed[1] > max_time.total_seconds():
             return True
         
     else:
@@ -35,27 +39,29 @@ def is_const_err(window, last_changed, max_time):
 
 def time_difference(time1, time2):
     """
-    Calculate the difference between two timestamps in the format "%H:%M:%S".
+    Calculate the difference between two timestamps, given either as epoch
+    seconds or as strings in the format "%Y-%m-%d %H:%M:%S".
 
     Args:
-        time1 (str): The first timestamp as a string.
-        time2 (str): The second timestamp as a string.
+        time1 (int | str): The first timestamp.
+        time2 (int | str): The second timestamp.
 
     Returns:
         timedelta: The difference between the two times as a timedelta object.
     """
-    time_format = "%Y-%m-%d %H:%M:%S"
+    if isinstance(time1, str) or isinstance(time2, str):
+        time_format = "%Y-%m-%d %H:%M:%S"
 
-    t1 = datetime.strptime(time1, time_format)
-    t2 = datetime.strptime(time2, time_format)
-    
-    # Calculate the difference (this will be a timedelta object)
-    time_diff = t2 - t1
+        t1 = datetime.strptime(time1, time_format)
+        t2 = datetime.strptime(time2, time_format)
+        
+        # Calculate the difference (this will be a timedelta object)
+        return t2 - t1
     
-    return time_diff
+    return timedelta(seconds=int(time2) - int(time1))
 
 
-def CUSUM(dev_plus_win, dev_minus_win, window_vals, last_smoothed):
+def CUSUM(dev_plus_win, dev_minus_win, window_vals, last_smoothed, stats=None, k=0.5, h=5):
     """
     Compute the next values for the CUSUM control chart using a window of deviations.
 
@@ -63,13 +69,18 @@ def CUSUM(dev_plus_win, dev_minus_win, window_vals, last_smoothed):
         dev_plus_win (SlidingWindow): A sliding window holding recent positive deviations.
         dev_minus_win (SlidingWindow): A sliding window holding recent negative deviations.
         window_vals (list): The current window of data points.
+        last_smoothed (float): The previous target value.
+        stats (RollingStats): Running statistics of window_vals, read instead of
+                              rescanning the window when given.
+        k (float): The slack, in standard deviations. Default is 0.5.
+        h (float): The control limit, in standard deviations. Default is 5.
 
     Returns:
         boolean: A boolean indicating if the process is in control.
     """
-    target = get_target(window_vals, last_smoothed)
-    slack = get_slack(window_vals)
-    control_lim = get_control_lim(window_vals)
+    target = get_target(window_vals, last_smoothed, stats)
+    slack = get_slack(window_vals, k, stats)
+    control_lim = get_control_lim(window_vals, h, stats)
     
     xi = window_vals[-1]  # Latest data point
 
@@ -94,8 +105,8 @@ def CUSUM(dev_plus_win, dev_minus_win, window_vals, last_smoothed):
         
 
     # Calculate cumulative sums over the deviation windows
-    CT_plus_sum = sum(dev_plus_win.as_list())
-    CT_minus_sum = sum(dev_minus_win.as_list())
+    CT_plus_sum = window_sum(dev_plus_win)
+    CT_minus_sum = window_sum(dev_minus_win)
 
     # Check control limits
     if CT_plus_sum > control_lim or CT_minus_sum > control_lim:
@@ -105,7 +116,22 @@ def CUSUM(dev_plus_win, dev_minus_win, window_vals, last_smoothed):
 
 
 
-def get_slack(sensor_readings, k=0.5):
+def window_sum(window):
+    """
+    Sum the values in a sliding window, from its running statistics when it keeps them.
+
+    Args:
+        window (SlidingWindow): The sliding window to sum.
+
+    Returns:
+        float: The sum of the window values.
+    """
+    if window.stats is not None:
+        return window.stats.sum()
+    return sum(window.as_list())
+
+
+def get_slack(sensor_readings, k=0.5, stats=None):
     
     """
     Calculate slack based on the standard deviation of sensor readings.
@@ -113,56 +139,66 @@ def get_slack(sensor_readings, k=0.5):
     Args:
         sensor_readings (list): A list of sensor readings in the sliding window.
         k (float): Multiplier to adjust the slack level. Default is 0.5.
+        stats (RollingStats): Running statistics of the readings, if available.
         
     Returns:
         float: The calculated slack based on the standard deviation.
     """
-    return k * std(sensor_readings)
+    return k * (stats.std() if stats is not None else std(sensor_readings))
 
-def get_control_lim(sensor_readings, k=5):
+def get_control_lim(sensor_readings, k=5, stats=None):
     """
     Calculate the control limit based on the standard deviation of sensor readings.
 
     Args:
         sensor_readings (list): A list of sensor readings in the sliding window.
         h (float): Multiplier for the control limit.
+        stats (RollingStats): Running statistics of the readings, if available.
 
     Returns:
         float: The control limit.
     """
     
-    return k * std(sensor_readings)
+    return k * (stats.std() if stats is not None else std(sensor_readings))
 
-def get_target(window_vals, last_smoothed):
-    #return mean(window_vals)
-    return AES_target(window_vals, last_smoothed)
+def get_target(window_vals, last_smoothed, stats=None):
+    #return mean_target(window_vals, last_smoothed, stats)
+    return AES_target(window_vals, last_smoothed, stats)
     
     
-def mean_target(window_vals, last_smoothed=0):
+def mean_target(window_vals, last_smoothed=0, stats=None):
     """
     Calculate the target value as the mean of the window values.
 
     Args:
         window_vals (list): A list of sensor readings.
+        stats (RollingStats): Running statistics of the readings, if available.
 
     Returns:
         float: The target value.
     """
+    if stats is not None:
+        return stats.mean()
     return mean(window_vals)
     
     
 
-def AES_target(window_vals, last_smoothed):
-    alpha = get_alpha(window_vals)
+def AES_target(window_vals, last_smoothed, stats=None):
+    alpha = get_alpha(window_vals, stats)
     xt = window_vals[-1]
     target = alpha * xt + (1-alpha)*last_smoothed
     return target
     
     
-def get_alpha(window_vals):
-    std_norm = std(window_vals)
-    x_min = min(window_vals)
-    x_max = max(window_vals)
+def get_alpha(window_vals, stats=None):
+    if stats is not None:
+        std_norm = stats.std()
+        x_min = stats.min()
+        x_max = stats.max()
+    else:
+        std_norm = std(window_vals)
+        x_min = min(window_vals)
+        x_max = max(window_vals)
     delta_x = x_max - x_min
 
     # Calculate std_max as half the range
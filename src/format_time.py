@@ -1,21 +1,244 @@
+"""
+Module containing the timestamp normalizer:
+    detect_format(samples)
+    TimeNormalizer()
+    normalize_csv(input_path, output_path, chunk_rows)
+
+Sensor exports mix timestamp layouts ("2024/09/12 13:02" in the unit test
+files, "2024-09-11T16:00:39.000Z" in the Illuminance export, TIME_FORMAT
+elsewhere). A TimeNormalizer finds the layout of a file once, from its first
+timestamps, and parses with that explicit format from then on: one value at
+a time with strptime, or a whole column at once with pd.to_datetime. It only
+looks for another layout when a timestamp does not fit, and only falls back
+to the general dateutil parser for timestamps in none of the known layouts.
+Times are converted to UTC and written in TIME_FORMAT.
+
+Run as a script, it rewrites a CSV file with normalized times a chunk of
+rows at a time, into a temporary file that replaces the original only once
+it is complete:
+    python format_time.py input.csv [output.csv]
+"""
+import csv
+import os
 import sys
+from datetime import datetime, timezone
+from time import gmtime, strftime
 import pandas as pd
+from data_point import TIME_FORMAT, is_canonical, to_epoch
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python script.py input.csv")
-        sys.exit(1)
+# unambiguous layouts only: day-first dates would be read month-first by to_epoch
+TIME_FORMATS = (
+    TIME_FORMAT,
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+    "%Y-%m-%dT%H:%M:%S.%f%z",
+    "%Y-%m-%dT%H:%M:%S%z",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+)
+# layouts pandas parses faster as ISO 8601 than through their strptime format
+PANDAS_FORMATS = {
+    "%Y-%m-%dT%H:%M:%S.%fZ": "ISO8601",
+    "%Y-%m-%dT%H:%M:%SZ": "ISO8601",
+}
+SAMPLE_ROWS = 20     # timestamps a layout is detected from
+CHUNK_ROWS = 65_536  # rows normalized at a time by normalize_csv
+
+
+def detect_format(samples):
+    """
+    Find the first known layout every sample timestamp is in.
+
+    Args:
+        samples (iterable): Timestamp strings; empty and "0" ones are skipped.
+
+    Returns:
+        str: The strptime format, or None if no known layout fits them all.
+    """
+    samples = [sample for sample in samples if isinstance(sample, str) and sample not in ("", "0")]
+    if not samples:
+        return None
+    for time_format in TIME_FORMATS:
+        try:
+            for sample in samples:
+                datetime.strptime(sample, time_format)
+        except ValueError:
+            continue
+        return time_format
+    return None
+
+
+class TimeNormalizer:
+    """
+    Converts the timestamps of one file to TIME_FORMAT, with its layout detected once.
+
+    Attributes:
+        time_format (str): The layout of the last timestamps parsed, None until one is found.
+    """
+
+    def __init__(self):
+        """
+        Initialize a normalizer that has not seen a timestamp yet.
+        """
+        self.time_format = None
+
+
+    def normalize(self, time_stamp):
+        """
+        Convert a single timestamp to TIME_FORMAT.
+
+        Args:
+            time_stamp (str): The timestamp.
+
+        Returns:
+            str: The timestamp in TIME_FORMAT, UTC; or time_stamp itself if it is invalid.
+        """
+        if not isinstance(time_stamp, str) or time_stamp == '0':
+            return time_stamp
+        if is_canonical(time_stamp):
+            return time_stamp
+
+        parsed = self._strptime(time_stamp, self.time_format)
+        if parsed is None:
+            time_format = detect_format([time_stamp])
+            if time_format is None:
+                epoch = to_epoch(time_stamp)
+                return time_stamp if epoch is None else strftime(TIME_FORMAT, gmtime(epoch))
+            self.time_format = time_format
+            parsed = datetime.strptime(time_stamp, time_format)
+
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc)
+        return parsed.strftime(TIME_FORMAT)
+
+
+    def to_datetimes(self, times):
+        """
+        Parse a column of timestamps, one explicit format at a time.
 
-    input_csv = sys.argv[1]
+        Args:
+            times (Series): The timestamp strings.
 
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv(input_csv)
+        Returns:
+            Series: The UTC times as naive datetime64 values, NaT where a timestamp is invalid.
+        """
+        result = pd.Series(pd.NaT, index=times.index, dtype="datetime64[ns]")
+        pending = times[times.notna() & (times != '0') & (times != '')]
+        time_format = self.time_format or self._detect_pending(pending)
+        tried = set()
+        while len(pending) and time_format is not None and time_format not in tried:
+            tried.add(time_format)
+            parsed = pd.to_datetime(pending, format=PANDAS_FORMATS.get(time_format, time_format),
+                                    errors="coerce", utc=True).dt.tz_localize(None)
+            found = parsed.notna()
+            if found.any():
+                self.time_format = time_format
+                result[found[found].index] = parsed[found]
+                pending = pending[~found]
+            time_format = self._detect_pending(pending)
+
+        # in none of the known layouts: the general parser, one at a time
+        for idx, time_stamp in pending.items():
+            epoch = to_epoch(time_stamp)
+            if epoch is not None:
+                result[idx] = pd.Timestamp(epoch, unit="s")
+        return result
+
+
+    def normalize_column(self, times):
+        """
+        Convert a column of timestamps to TIME_FORMAT.
+
+        Args:
+            times (Series): The timestamp strings.
+
+        Returns:
+            Series: The timestamps in TIME_FORMAT, UTC; invalid ones are kept as they are.
+        """
+        parsed = self.to_datetimes(times)
+        return parsed.dt.strftime(TIME_FORMAT).where(parsed.notna(), times)
+
+
+    @staticmethod
+    def _detect_pending(pending):
+        # the layout of the first timestamp in a known layout, checked against the ones after it
+        for start, time_stamp in enumerate(pending):
+            if detect_format([time_stamp]) is not None:
+                return detect_format(pending.iloc[start:start + SAMPLE_ROWS]) or detect_format([time_stamp])
+        return None
+
+
+    @staticmethod
+    def _strptime(time_stamp, time_format):
+        if time_format is None:
+            return None
+        try:
+            return datetime.strptime(time_stamp, time_format)
+        except ValueError:
+            return None
+
+
+def normalize_csv(input_path, output_path=None, chunk_rows=CHUNK_ROWS):
+    """
+    Write a CSV file with its Time column in TIME_FORMAT, streaming it a chunk of
+    rows at a time. The output is written to a temporary file first and moved into
+    place once complete, so the input is never left half rewritten.
+
+    Args:
+        input_path (str): The path of the CSV file.
+        output_path (str): The path to write to. Default is None (replace the input).
+        chunk_rows (int): The number of rows normalized at a time. Default is 65536.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ValueError: If the file has no Time column.
+    """
+    output_path = output_path or input_path
+    temp_path = output_path + ".tmp"
+    normalizer = TimeNormalizer()
+    rows_written = 0
+
+    try:
+        with open(input_path, newline='') as source, open(temp_path, 'w', newline='') as target:
+            reader = csv.reader(source)
+            writer = csv.writer(target, lineterminator="\n")
+            header = next(reader, None)
+            if header is None:
+                return 0
+            if "Time" not in header:
+                raise ValueError(f"{input_path} has no Time column")
+            time_col = header.index("Time")
+            writer.writerow(header)
+
+            while True:
+                rows = [row for _, row in zip(range(chunk_rows), reader)]
+                if not rows:
+                    break
+                times = pd.Series([row[time_col] if len(row) > time_col else None for row in rows], dtype=object)
+                for row, time_stamp in zip(rows, normalizer.normalize_column(times).tolist()):
+                    if len(row) > time_col:
+                        row[time_col] = time_stamp
+                writer.writerows(rows)
+                rows_written += len(rows)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return rows_written
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python format_time.py input.csv [output.csv]")
+        sys.exit(1)
 
-    # Parse the 'Time' column and reformat it
-    df['Time'] = pd.to_datetime(df['Time']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    rows = normalize_csv(sys.argv[1], sys.argv[2] if len(sys.argv) == 3 else None)
+    print(f"{rows} rows normalized")
 
-    # Write back to the same CSV file
-    df.to_csv(input_csv, index=False)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
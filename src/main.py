@@ -1,25 +1,79 @@
 from mqtt_client import MQTTClient
-from sliding_window import SlidingWindow
 from data_point import DataPoint
-from preprocessor import range_check, med_filter, do_EMA, is_null
-from err_detections import is_const_err, CUSUM
-from datetime import timedelta
+from preprocessor import is_null
+from pipeline import SensorPipeline
+from sensor_limits import get_profile, get_registry
+from detectors import make_engine
+from batch_engine import load_series, clean_series
+from csv_writer import get_writer, close_writer, flush_all, close_all
+from columnar_store import get_table_writer, close_all as close_tables, export_csv, read_range, pa
+from metrics import start_from_env
+from raw_store import get_raw_store, HEADER as RAW_HEADER
+from time_index import read_csv_range
+from data_point import to_epoch, TIME_FORMAT
+from checkpoint import LiveCheckpointer, save_checkpoint, load_checkpoint, file_marker
+from async_runtime import AsyncRuntime, AsyncMQTTSource
+from shared_ring import publish_step, RingReader
+from param_sweep import sweep, load_grid
+from format_time import TimeNormalizer
+from sliding_window import NAT_EPOCH
 from dotenv import load_dotenv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain, islice
+from time import perf_counter, sleep, strftime, gmtime
+import pandas as pd
+import asyncio
+import glob
 import os
 import sys
-import time
 import csv
-import pandas as pd
+import signal
+
+SENSORS = ("pvolt", "bvolt", "temp", "illum", "ph", "humid")
+READ_BUFFER = 1 << 20   # bytes read from a CSV file at a time
+WRITE_CHUNK = 1000      # cleaned readings written to a CSV file at a time
+CSV_OPTIONS = ("batch", "parquet", "resume", "normalize")
+OUTPUT_FORMAT = "csv"   # format of the raw, clean and target outputs, "csv" or "parquet"
+NORMALIZE_TIMES = False # whether csv input timestamps are converted to "%Y-%m-%d %H:%M:%S" as they are read
+
 
 def main():
     """
     Main function that initiates the MQTT client or CSV processing based on command-line arguments.
     
     For "mqtt" DYNAMIC mode:
-        Connects to the MQTT broker, retrieves readings, processes them, and logs to CSV.
+        Connects to the MQTT broker, retrieves readings from every requested sensor,
+        processes them, and logs the raw readings to the time-partitioned raw store.
+
+    For "async" DYNAMIC mode:
+        As "mqtt", but runs the connection, every sensor pipeline and the CSV
+        output on a single asyncio event loop.
+
+    Both live modes checkpoint their pipelines periodically; with "resume" they
+    continue from the last checkpoint with warm state.
 
     For "csv" STATIC mode:
         Cleans data from the specified CSV file and writes it back to a new cleaned CSV file.
+        Given a directory or glob pattern instead, cleans every matching file in parallel.
+        With "parquet", the cleaned and target outputs are written as Parquet files instead.
+        With "resume", only the rows appended since the last resume run are cleaned.
+        With "normalize", timestamps in other layouts are written as "%Y-%m-%d %H:%M:%S" UTC.
+
+    For "export" mode:
+        Writes a Parquet output back out as a CSV file.
+
+    For "query" mode:
+        Prints the raw, cleaned and target values of a sensor between two times,
+        reading only the segments, indexed CSV blocks or Parquet row groups that hold them.
+
+    For "sweep" mode:
+        Cleans a CSV file with every combination of a grid of pipeline parameters
+        in parallel, and ranks them by drift alarms, hinge loss and MSE against
+        the raw data.
+
+    For "tail" mode:
+        Follows the cleaned values and CUSUM states a live mode publishes to a
+        shared-memory ring, from another process.
 
     Args:
         None (but uses command-line arguments for "mqtt" or "csv" mode).
@@ -27,10 +81,25 @@ def main():
     Returns:
         None
     """
-    last_changed = [0, 0]  #value, timestamp
-    last_EMA = 0
+    # exit normally on SIGTERM so buffered output is flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # reload the sensor profiles on SIGHUP, without a restart
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: get_registry().reload())
+    #load environment variables, before anything reads them
+    load_dotenv()
+    # per-stage latency metrics, when $METRICS_FILE or $METRICS_PORT is set
+    start_from_env()
     
-    if (len(sys.argv) not in (2, 3)) or (sys.argv[1] not in ("params", "mqtt", "csv")):
+    mode = sys.argv[1] if len(sys.argv) > 1 else None
+    valid = ((mode == "params" and len(sys.argv) == 2)
+             or (mode in ("mqtt", "async") and len(sys.argv) >= 3)
+             or (mode == "csv" and len(sys.argv) >= 3 and set(sys.argv[3:]) <= set(CSV_OPTIONS))
+             or (mode == "export" and len(sys.argv) in (3, 4))
+             or (mode == "query" and len(sys.argv) in (5, 6))
+             or (mode == "sweep" and len(sys.argv) in (3, 4))
+             or (mode == "tail" and len(sys.argv) in (3, 4) and sys.argv[3:] in ([], ["oldest"])))
+    if not valid:
         print("Invalid program arguments")
         print("Run <python/python3 main.py params> to see parameter options")
         return
@@ -38,30 +107,171 @@ def main():
     
     if sys.argv[1] == "params":
         print("For Dynamic sensor readings:")
-        print("     argv 1 = mqtt")
-        print("         argv 2 = pvolt | bvolt | temp | illum | ph | humid")
+        print("     argv 1 = mqtt | async")
+        print("         argv 2.. = one or more of pvolt | bvolt | temp | illum | ph | humid, or all")
+        print("                    resume (optional, continue from the last checkpoint with warm state)")
+        print("Pipelines are checkpointed to ../data/checkpoint_live.json every $CHECKPOINT_INTERVAL")
+        print("seconds (default 60) and on exit.")
         print()
         print("For Static data from csv file:")
         print("     argv 1 = csv")
         print("         argv 2 = csv file path eg ../Data/<csv_filename.csv>")
+        print("                  or a directory / glob pattern to clean many files in parallel")
+        print("         argv 3.. = batch (optional, clean the whole file with the NumPy batch engine)")
+        print("                    parquet (optional, write the outputs as Parquet files, needs pyarrow)")
+        print("                    resume (optional, clean only the rows appended since the last resume run,")
+        print("                            continuing from its checkpoint; not with batch or parquet)")
+        print("                    normalize (optional, write timestamps in other layouts, eg 2024/09/12 13:02")
+        print("                               or 2024-09-11T16:00:39.000Z, as %Y-%m-%d %H:%M:%S UTC)")
+        print()
+        print("To convert a Parquet output back to csv:")
+        print("     argv 1 = export")
+        print("         argv 2 = parquet file path eg ../data/<clean_sensor.parquet>")
+        print("         argv 3 = csv file path (optional, defaults to the same name with .csv)")
+        print()
+        print("To rank pipeline parameters on a historical series:")
+        print("     argv 1 = sweep")
+        print("         argv 2 = csv file path eg ../Data/<csv_filename.csv>")
+        print("         argv 3 = JSON grid file (optional), a list of values for any of alpha, k, h,")
+        print("                  win_size, med_window and target (AES | mean); others use the sensor profile")
+        print("The ranked table is written to ../data/sweep_<file name>.csv.")
+        print()
+        print("To look up the raw, cleaned and target values of a sensor between two times:")
+        print("     argv 1 = query")
+        print("         argv 2 = sensor eg SSTEMP_sensor, or the <name> of a raw_<name>.csv input")
+        print("         argv 3 = start time eg \"2024-09-12 01:00:00\"")
+        print("         argv 4 = end time (excluded)")
+        print("         argv 5 = target output name (optional, defaults to AES_method_<sensor> or AES_method)")
+        print("CSV outputs get a <file>.idx time index on their first query, kept up to date after.")
+        print()
+        print("Sensor settings are read from sensor_profiles.json, or the file named by $SENSOR_PROFILES.")
+        print("Set \"median\": \"legacy\" in a profile to re-sort the median sub-window every reading")
+        print("instead of the incremental rolling median (default \"rolling\", same results).")
+        print("Extra detectors (ewma, page_hinkley, stuck_at_bound, spike_rate) are enabled per sensor")
+        print("with a \"detectors\" setting, eg \"detectors\": {\"ewma\": {\"lam\": 0.2}, \"spike_rate\": {}}.")
+        print("Send SIGHUP to reload them while running.")
+        print()
+        print("Set $METRICS_FILE (snapshot file) and/or $METRICS_PORT (http://127.0.0.1:<port>/metrics)")
+        print("to export per-stage latency and throughput metrics.")
+        print()
+        print("Live raw readings (mqtt, async) are appended to ../data/raw/<sensor>/<segment>.csv,")
+        print("one segment per day, or per hour with $RAW_SEGMENT=hour. Set $RAW_RETENTION_DAYS")
+        print("to delete older segments, and $RAW_DIR to store them elsewhere.")
+        print()
+        print("Set $SHARED_RING to a name to also publish every cleaned live reading and its CUSUM")
+        print("state to a shared-memory ring of that name ($SHARED_RING_SLOTS records, default 65536).")
+        print("To follow it from another process:")
+        print("     argv 1 = tail")
+        print("         argv 2 = ring name")
+        print("         argv 3 = oldest (optional, start from the oldest record still held)")
         return
     
     elif sys.argv[1] == "mqtt":
-        #load environment variables
-        load_dotenv()
-        # Set up and start the MQTT client
+        resume = "resume" in sys.argv[2:]
+        sensors = [sensor for sensor in sys.argv[2:] if sensor != "resume"]
+        sensors = SENSORS if sensors in ([], ["all"]) else sensors
+        topics = sensor_topics(sensors)
+        if not topics:
+            print("No MQTT topic set for any of the sensors, add them to .env")
+            return
+        # Set up and start one MQTT client for every sensor topic
         broker_address = os.getenv("MQTT_BROKER")
         broker_port = int(os.getenv("MQTT_PORT"))
-        topic = os.getenv(sys.argv[2])
-        mqtt_client = MQTTClient(broker_address, broker_port, topic)
+        mqtt_client = MQTTClient(broker_address, broker_port, topics)
         mqtt_client.connect()
         mqtt_client.start()
         client = mqtt_client
-        run_sensors(client, last_changed, last_EMA)
+        run_sensors(client, resume)
+
+    elif sys.argv[1] == "async":
+        resume = "resume" in sys.argv[2:]
+        sensors = [sensor for sensor in sys.argv[2:] if sensor != "resume"]
+        sensors = SENSORS if sensors in ([], ["all"]) else sensors
+        topics = sensor_topics(sensors)
+        if not topics:
+            print("No MQTT topic set for any of the sensors, add them to .env")
+            return
+        broker_address = os.getenv("MQTT_BROKER")
+        broker_port = int(os.getenv("MQTT_PORT"))
+        checkpointer = LiveCheckpointer()
+        runtime = AsyncRuntime(AsyncMQTTSource(broker_address, broker_port), topics,
+                               checkpointer=checkpointer, pipelines=checkpointer.restore() if resume else None)
+        try:
+            asyncio.run(runtime.run())
+        except KeyboardInterrupt:
+            pass
         
+    elif sys.argv[1] == "export":
+        if pa is None:
+            print("Reading Parquet files needs pyarrow: pip install pyarrow")
+            return
+        csv_path = export_csv(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        print(f"exported to {csv_path}")
+        return
+
+    elif sys.argv[1] == "query":
+        if to_epoch(sys.argv[3]) is None or to_epoch(sys.argv[4]) is None:
+            print("Invalid start or end time")
+            return
+        began = perf_counter()
+        slices = query_outputs(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5] if len(sys.argv) == 6 else None)
+        elapsed = perf_counter() - began
+        if not slices:
+            print(f"No outputs found for {sys.argv[2]}")
+        for kind, (path, frame) in slices.items():
+            print(f"{kind} ({path}): {len(frame)} rows")
+            if len(frame):
+                print(frame.to_string(index=False))
+            print()
+        print(f"query took {elapsed * 1000:.1f} ms")
+        return
+
+    elif sys.argv[1] == "sweep":
+        grid = load_grid(sys.argv[3]) if len(sys.argv) == 4 else None
+        began = perf_counter()
+        try:
+            table = sweep(sys.argv[2], grid)
+        except ValueError as e:
+            print(f"Invalid sweep grid: {e}")
+            return
+        output_path = "../data/sweep_" + os.path.splitext(os.path.basename(sys.argv[2]))[0] + ".csv"
+        table.to_csv(output_path, index=False)
+        print(table.head(20).to_string(index=False))
+        print(f"{len(table)} combinations in {perf_counter() - began:.1f} s, ranking written to {output_path}")
+        return
+
+    elif sys.argv[1] == "tail":
+        try:
+            tail_ring(sys.argv[2], "oldest" if len(sys.argv) == 4 else "latest")
+        except FileNotFoundError:
+            print(f"No shared ring named {sys.argv[2]}, is a live mode running with $SHARED_RING set?")
+        except KeyboardInterrupt:
+            pass
+        return
+
     elif sys.argv[1] == "csv":
-        cleaned_data = run_csv(sys.argv[2], last_changed, last_EMA)
-        datapoints_to_csv(cleaned_data, "clean", True)
+        batch = "batch" in sys.argv[3:]
+        resume = "resume" in sys.argv[3:]
+        if resume and (batch or "parquet" in sys.argv[3:]):
+            print("resume only works with the streaming csv output, not with batch or parquet")
+            return
+        if "parquet" in sys.argv[3:]:
+            if pa is None:
+                print("Parquet output needs pyarrow: pip install pyarrow")
+                return
+            set_output_format("parquet")
+        set_normalize_times("normalize" in sys.argv[3:])
+        if os.path.isdir(sys.argv[2]) or any(c in sys.argv[2] for c in "*?["):
+            run_csv_files(sys.argv[2], batch, resume)
+            return
+        if batch:
+            run_csv_batch(sys.argv[2])
+        elif resume:
+            clean_csv_incremental(sys.argv[2])
+        else:
+            stream_to_csv(stream_csv(sys.argv[2]), "clean")
+        # Parquet files are only complete once closed
+        close_tables()
         print("new cleaned data csv made")
         return
     
@@ -69,295 +279,594 @@ def main():
 
 ################################ DYNAMIC SENSOR READINGS ################################
 
-def run_sensors(client, last_changed, last_EMA):
-    window = SlidingWindow(10)
-    CT_plus_win = SlidingWindow(10)
-    CT_min_win = SlidingWindow(10)
-    clean_vals = []
-    num_reads = 1
+def sensor_topics(sensors):
+    """
+    Look up the MQTT topic of every sensor in the environment, skipping sensors
+    whose topic is not set.
+
+    Args:
+        sensors (list): The sensor names, e.g. "temp".
+
+    Returns:
+        list: The topics that are set, in the order of sensors.
+    """
+    topics = []
+    for sensor in sensors:
+        topic = os.getenv(sensor)
+        if topic:
+            topics.append(topic)
+        else:
+            print(f"WARNING: no MQTT topic set for {sensor}, it is not subscribed")
+    return topics
+
+
+def run_sensors(client, resume=False):
+    """
+    Clean live readings from every subscribed sensor in a single process.
+
+    The pipelines are checkpointed periodically and on exit.
+
+    Args:
+        client (MQTTClient): The connected and started MQTT client.
+        resume (bool): Whether to continue from the last checkpoint. Default is False.
+
+    Returns:
+        None
+    """
+    checkpointer = LiveCheckpointer()
+    pipelines = checkpointer.restore() if resume else {}
+    dropped = 0
     
     try:
         while True:
-            ################### retrieve and format new reading ###################
-            reading = None
-            readings_list = client.get_readings()
-            if readings_list:
-                raw_reading = readings_list[0]
-                print(f"Reading number {num_reads} is: {raw_reading}")
-                reading = DataPoint(raw_reading[0], raw_reading[1], raw_reading[2], raw_reading[3])
-                
-                #check for Null values
-                if is_null(reading):
-                    reading = None
-                    num_reads -= 1
-                
-                if num_reads == 1:
-                    datapoints_to_csv([reading], "raw", True)
-                    last_EMA = reading.value
-                else: 
-                    datapoints_to_csv([reading], "raw", False)
-                num_reads += 1
-                
-            if reading and window.is_full():
-                clean_vals.append(window.slide_next(reading))
-                
-            elif reading:
-                window.add_reading(reading)
-                
-            
-            ###################### Preprocess new readings #####################
-            if window.is_full() and reading:
-                
-                if num_reads == 10:
-                    last_changed[0] = window.get_win_vals()[-1]
-                    last_changed[1] = window.get_win_times()[-1]
-            
-                #check for constant error sensor fault
-                if is_const_err(window, last_changed, get_max_time(window)):
-                    print("CONSTANT ERROR DETECTED")
-
-                #perform range check on current window
-                if num_reads == 10:
-                    range_check(window, get_UL(window), get_LL(window), True)
-                else:
-                    range_check(window, get_UL(window), get_LL(window), False)
-                    
-                #perform EMA smoothing
-                last_EMA = do_EMA(window, last_EMA, 0.4)
-
-                #perform median filtering to smooth data
-                med_filter(window, 3)
-                
-            ######################### Error Detection ##########################
-                no_err = CUSUM(CT_plus_win, CT_min_win, window.get_win_vals())
-                if not no_err:
-                    print("Drift detected in CUSUM")
-                print(f"CT plus values: {CT_plus_win.as_list()}")
-                print(f"CT minus values: {CT_min_win.as_list()}")
-                
-            client.clear_readings()
-            time.sleep(1)
+            # block until the next reading arrives
+            raw_reading = client.get_reading()
+            process_live_reading(pipelines, raw_reading)
+            checkpointer.maybe_save(pipelines)
+
+            if client.dropped > dropped:
+                print(f"WARNING: {client.dropped - dropped} readings dropped, pipeline is falling behind")
+                dropped = client.dropped
 
     except KeyboardInterrupt:
         # Stop the MQTT client correctly
         client.stop()
+    finally:
+        checkpointer.save(pipelines)
+
+
+def process_live_reading(pipelines, raw_reading):
+    """
+    Dispatch a live reading to its sensor's pipeline, then clean it and run error detection.
+
+    Readings are keyed by MQTT topic, or by device class if the topic is unknown,
+    and a new SensorPipeline is created the first time a sensor is seen.
+
+    Args:
+        pipelines (dict): The SensorPipeline of every sensor seen so far, by key.
+        raw_reading (tuple): (value, epoch, device_class, unit, topic) from the MQTT client.
+
+    Returns:
+        None
+    """
+    value, epoch, device_class, unit, topic = raw_reading
+    key = topic or device_class
+    pipeline = pipelines.get(key)
+    if pipeline is None:
+        pipeline = pipelines[key] = SensorPipeline(key)
+
+    print(f"Reading number {pipeline.num_reads + 1} from {key} is: {raw_reading}")
+    timer = pipeline.start_timer()
+    reading = DataPoint.from_epoch(value, epoch, device_class, unit)
+    
+    #check for Null values
+    if is_null(reading):
+        return
+    if timer:
+        timer.lap("null")
+
+    get_raw_store().append(reading)
+    if timer:
+        timer.lap("raw")
+    verdict = pipeline.step(reading)
+    if verdict is None:
+        return
+
+    const_err, in_control = verdict
+    publish_step(pipeline, const_err, in_control)
+    if const_err:
+        print(f"CONSTANT ERROR DETECTED in {key}")
+    if not in_control:
+        print(f"Drift detected in CUSUM for {key} at time: {pipeline.latest_time()}")
+    for detector in pipeline.alarms:
+        print(f"{detector.message} for {key} at time: {pipeline.latest_time()}")
+    if timer:
+        timer.lap("output")
+
+
+def tail_ring(name, start="latest", poll_interval=0.1):
+    """
+    Print the records published to a shared-memory ring as they arrive, until interrupted.
+
+    Args:
+        name (str): The name of the ring.
+        start (str): "latest" or "oldest", where to start reading. Default is "latest".
+        poll_interval (float): The seconds to wait when no record is pending. Default is 0.1.
+
+    Returns:
+        None
+    """
+    reader = RingReader(name, start)
+    try:
+        while True:
+            records, missed = reader.read()
+            if missed:
+                print(f"WARNING: {missed} records overwritten before they were read")
+            for record in records:
+                time_stamp = strftime(TIME_FORMAT, gmtime(record['epoch'])) if record['epoch'] != NAT_EPOCH else "-"
+                print(f"{record['seq']} {reader.sensor_name(record['sensor'])} {time_stamp} value={record['value']:.4f} "
+                      f"target={record['target']:.4f} CT+={record['CT_plus']:.4f} CT-={record['CT_min']:.4f}"
+                      f"{' CONSTANT ERROR' if record['const_err'] else ''}{'' if record['in_control'] else ' DRIFT'}")
+            if not len(records):
+                sleep(poll_interval)
+    finally:
+        reader.close()
 
 
 ################################ STATIC CSV READINGS ################################
 
-def run_csv(file_path, last_changed, last_EMA):
+def run_csv(file_path, target_name="AES_method", counts=None, verbose=True):
     """
     Clean data from a CSV file by processing sensor readings and applying filters.
 
     Args:
         file_path (str): The path to the CSV file containing raw data.
+        target_name (str): The name of the CSV file in ../data the targets are written to.
+        counts (dict): If given, filled with the number of readings, constant errors, drifts,
+                       range-check replacements and detector alarms.
+        verbose (bool): Whether to print every detected error. Default is True.
 
     Returns:
         list: A list of cleaned DataPoint objects.
     """
-    data_points = csv_to_datapoints(file_path)
-    cleaned_data = []
-    window = SlidingWindow(10)
-    CT_plus_win = SlidingWindow(10)
-    CT_min_win = SlidingWindow(10)
-    target = data_points[0].value
-    
-    while not window.is_full() and data_points:
-        if not is_null(data_points[0]):
-            window.add_reading(data_points.pop(0))
-        else:
-            data_points.pop(0)
-        first_window = True
-    
-    while data_points:
-        if first_window:
-            last_changed[0] = window.get_win_vals()[-1]
-            last_changed[1] = window.get_win_times()[-1]
-            last_EMA = window.get_win_vals()[-1]
-
-        #check for constant error sensor fault
-        if is_const_err(window, last_changed, get_max_time(window)):
-            print("CONSTANT ERROR DETECTED")
+    return list(stream_csv(file_path, target_name, counts, verbose))
 
-        #perform range check on current window
-        if first_window:
-            first_window = False
-            range_check(window, get_UL(window), get_LL(window), True)
-        else:
-            range_check(window, get_UL(window), get_LL(window), False)
-            
-        #perform EMA smoothing
-        last_EMA = do_EMA(window, last_EMA, 0.4)
 
-        #perform median filtering to smooth data
-        med_filter(window, 3)
-        
-        #error detection with CUSUM
-        no_err, target = CUSUM(CT_plus_win, CT_min_win, window.get_win_vals(), target)
-        if not no_err:
-            print(f"Drift detected in CUSUM at time: {window.as_list()[-1].time_stamp}")
-        
-        target_time = window.as_list()[-1].time_stamp
-        write_csv(target, target_time, "AES_method")
-        
+def stream_csv(file_path, target_name="AES_method", counts=None, verbose=True, checkpoint=None):
+    """
+    Clean data from a CSV file in a single pass, yielding every cleaned reading
+    as soon as it leaves the window.
 
-        while len(data_points) > 0 and is_null(data_points[0]):
-            data_points.pop(0)
-        
-        cleaned_val = window.slide_next(data_points.pop(0))
-        cleaned_data.append(cleaned_val)
+    The file is read lazily, so memory stays constant however large the file is
+    and the first cleaned readings are available before the rest has been read.
+
+    Args:
+        file_path (str): The path to the CSV file containing raw data.
+        target_name (str): The name of the CSV file in ../data the targets are written to.
+        counts (dict): If given, filled with the number of readings, constant errors, drifts,
+                       range-check replacements and detector alarms once the stream is exhausted.
+        verbose (bool): Whether to print every detected error. Default is True.
+        checkpoint (dict): If given, the run continues from its "pipeline" state at its
+                           byte "offset" in the file, when it has them, and they are
+                           updated once the stream is exhausted, before the readings
+                           left in the window are yielded.
+
+    Yields:
+        DataPoint: The cleaned readings, in order.
+    """
+    pipeline = SensorPipeline(file_path)
+    start = checkpoint.get("offset", 0) if checkpoint is not None else 0
+    progress = {"offset": start} if checkpoint is not None else None
+    data_points = iter_datapoints(file_path, start, progress)
+
+    if checkpoint and "pipeline" in checkpoint:
+        pipeline.set_state(checkpoint["pipeline"])
+    else:
+        first = next(data_points, None)
+        if first is None:
+            return
+        pipeline.target = first.value
+        data_points = chain([first], data_points)
+    resumed_reads, resumed_clipped = pipeline.num_reads, pipeline.num_clipped
+    num_const, num_drift, num_alarms = 0, 0, 0
+
+    #the newest reading of a resumed window was waiting for the one after it
+    reading = next(data_points, None)
+    while reading is not None and is_null(reading):
+        reading = next(data_points, None)
+    if resumed_reads and reading is not None and pipeline.window.is_full():
+        const_err, in_control = process_newest(pipeline, target_name, verbose)
+        num_const += const_err
+        num_drift += not in_control
+        num_alarms += len(pipeline.alarms)
+
+    #the final reading is only added to the window, never processed, so look one reading ahead
+    while reading is not None:
+        #read the next row before the timer starts, so reading and parsing the file are not timed as a stage
+        next_reading = next(data_points, None)
+        timer = pipeline.start_timer()
+        while next_reading is not None and is_null(next_reading):
+            next_reading = next(data_points, None)
+        if timer:
+            timer.lap("null")
+
+        cleaned_val = pipeline.add_reading(reading)
+        if timer:
+            timer.lap("window")
+
+        if next_reading is not None and pipeline.window.is_full():
+            const_err, in_control = process_newest(pipeline, target_name, verbose)
+            num_const += const_err
+            num_drift += not in_control
+            num_alarms += len(pipeline.alarms)
+            if timer:
+                timer.lap("output")
+
+        #hand the cleaned reading on once this reading is done, so its timings exclude the consumer
+        if cleaned_val is not None:
+            yield cleaned_val
+        reading = next_reading
     
-    cleaned_data += window.as_list()
-    return cleaned_data
+    if counts is not None:
+        counts.update(readings=pipeline.num_reads - resumed_reads, const_err=num_const, drift=num_drift,
+                      clipped=pipeline.num_clipped - resumed_clipped, alarms=num_alarms)
+    if checkpoint is not None:
+        checkpoint.update(pipeline=pipeline.get_state(), offset=progress["offset"],
+                          tail_rows=pipeline.window.length)
+    yield from pipeline.window.as_list()
+
+
+def process_newest(pipeline, target_name, verbose):
+    """
+    Clean the newest reading in a full window, report any error detected and write its target.
+
+    Args:
+        pipeline (SensorPipeline): The pipeline of the file being cleaned.
+        target_name (str): The name of the CSV file in ../data the targets are written to.
+        verbose (bool): Whether to print every detected error.
 
+    Returns:
+        tuple: (const_err, in_control) as returned by SensorPipeline.process.
+    """
+    const_err, in_control = pipeline.process()
+    if const_err and verbose:
+        print("CONSTANT ERROR DETECTED")
+    if not in_control and verbose:
+        print(f"Drift detected in CUSUM at time: {pipeline.latest_time()}")
+    for detector in pipeline.alarms if verbose else ():
+        print(f"{detector.message} at time: {pipeline.latest_time()}")
+
+    write_csv(pipeline.target, pipeline.latest_time(), target_name)
+    return const_err, in_control
 
-################################ UTILITY FUNCTIONS ################################
 
-def get_UL(window):
+def clean_csv_incremental(file_path, target_name="AES_method", clean_name=None, counts=None, verbose=True):
     """
-    Get the upper limit (UL) for a sensor based on its type.
+    Clean only the rows appended to a CSV file since its last incremental run,
+    continuing from the pipeline state checkpointed then, so the outputs end up
+    as if the whole file had been cleaned in one go.
+
+    The readings left in the window at the end of a run are written to the
+    cleaned output as they are, and replaced by the next run once they have
+    been cleaned. The first run, and any run after the file was rewritten,
+    cleans the whole file. The checkpoint is ../data/checkpoint_<file name>.json.
 
     Args:
-        window (SlidingWindow): The sliding window object containing sensor readings.
+        file_path (str): The path to the CSV file containing raw data.
+        target_name (str): The name of the CSV file in ../data the targets are written to.
+        clean_name (str): The name the cleaned file is written under, the sensor type if None.
+        counts (dict): If given, filled with the number of new readings, constant errors,
+                       drifts, range-check replacements and detector alarms.
+        verbose (bool): Whether to print every detected error. Default is True.
 
     Returns:
-        float: The upper limit for the specified sensor type.
+        None
     """
-    sensor_type = window.get_sensor_type()
-    if sensor_type == "Pvoltage_sensor":
-        UL = 50
-    
-    if sensor_type == "Bvoltage_sensor":
-        UL = 50
-        
-    if sensor_type == 'SSTEMP_sensor':
-        UL = 45
-        
-    if sensor_type == 'illuminance_sensor':
-        UL = 130_000
-        
-    if sensor_type == 'SSHUM_sensor':
-        UL = 85
-        
-    if sensor_type == 'PH_sensor':
-        UL = 50
-    
-    if sensor_type == 'WINDDIR_sensor':
-        UL = 360
-    
-    return UL
+    checkpoint_path = "../data/checkpoint_" + os.path.splitext(os.path.basename(file_path))[0] + ".json"
+    checkpoint = load_checkpoint(checkpoint_path) or {}
+    clean_path = "../data/clean_" + checkpoint.get("clean_name", "") + ".csv"
+    if checkpoint and not (os.path.exists(clean_path)
+                           and os.path.getsize(file_path) >= checkpoint["offset"]
+                           and file_marker(file_path, checkpoint["offset"]) == checkpoint["marker"]):
+        print(f"{file_path} or its output changed since the last run, cleaning it all again")
+        checkpoint = {}
+    resuming = bool(checkpoint)
+    if resuming:
+        # a writer left open by an earlier run in this process would write past the cut
+        close_writer(clean_path)
+        remove_last_rows(clean_path, checkpoint["tail_rows"])
+
+    stream_to_csv(stream_csv(file_path, target_name, counts, verbose, checkpoint), "clean", clean_name, resuming)
+    window = checkpoint.get("pipeline", {}).get("window")
+    clean_name = clean_name or checkpoint.get("clean_name") or (window and window[0][2])
+    if "offset" not in checkpoint or not clean_name:
+        # nothing was cleaned yet
+        return
+    checkpoint.update(marker=file_marker(file_path, checkpoint["offset"]), clean_name=clean_name)
+    # the checkpoint must never describe outputs that are not on disk yet
+    flush_all()
+    save_checkpoint(checkpoint_path, checkpoint)
 
 
-def get_LL(window):
+def run_csv_batch(file_path, target_name="AES_method", clean_name=None, counts=None, verbose=True):
     """
-    Get the lower limit (LL) for a sensor based on its type.
+    Clean data from a CSV file with the NumPy batch engine.
+
+    Produces the same cleaned readings, AES targets and alerts as run_csv, but
+    loads the whole file at once and processes it as arrays.
 
     Args:
-        window (SlidingWindow): The sliding window object containing sensor readings.
+        file_path (str): The path to the CSV file containing raw data.
+        target_name (str): The name of the CSV file in ../data the targets are written to.
+        clean_name (str): The name the cleaned file is written under, the sensor type if None.
+        counts (dict): If given, filled with the number of readings, constant errors, drifts,
+                       range-check replacements and detector alarms.
+        verbose (bool): Whether to print every detected error. Default is True.
 
     Returns:
-        float: The lower limit for the specified sensor type.
+        None
     """
-    sensor_type = window.get_sensor_type()
-    if sensor_type == "Pvoltage_sensor":
-        LL = -0.00000001
-    
-    if sensor_type == "Bvoltage_sensor":
-        LL = -0.00000001
-        
-    if sensor_type == 'SSTEMP_sensor':
-        LL = -10
-    
-    if sensor_type == 'illuminance_sensor':
-        LL = -0.00000001
-        
-    if sensor_type == 'SSHUM_sensor':
-        LL = 10
-        
-    if sensor_type == 'PH_sensor':
-        LL = -20
-        
-    if sensor_type == 'WINDDIR_sensor':
-        LL = 0
+    frame = load_series(file_path)
+    if frame.empty:
+        return
+    if NORMALIZE_TIMES:
+        frame['Time'] = TimeNormalizer().normalize_column(frame['Time'])
 
-    return LL
+    device = frame['Device'].iloc[0]
+    profile = get_profile(device)
+    cleaned, targets, const_err, drift, clipped, alarms = clean_series(
+        frame, profile.UL, profile.LL, profile.max_time, profile.win_size, profile.med_window, alpha=profile.alpha,
+        k=profile.k, h=profile.h, detectors=make_engine(profile.detectors, file_path))
 
+    if counts is not None:
+        counts.update(readings=len(cleaned), const_err=int(const_err.sum()), drift=int(drift.sum()),
+                      clipped=int(clipped.sum()), alarms=sum(map(len, alarms or ())))
 
-def get_max_time(window):
+    target_times = targets['Time'].to_numpy()
+    flagged = set((const_err | drift).nonzero()[0].tolist())
+    flagged.update(i for i, fired in enumerate(alarms or ()) if fired)
+    for i in sorted(flagged) if verbose else ():
+        if const_err[i]:
+            print("CONSTANT ERROR DETECTED")
+        if drift[i]:
+            print(f"Drift detected in CUSUM at time: {target_times[i]}")
+        for detector in alarms[i] if alarms else ():
+            print(f"{detector.message} at time: {target_times[i]}")
+
+    frame_to_csv(targets, "../data/" + target_name, False)
+    frame_to_csv(cleaned, "../data/clean_" + (clean_name or device), True)
+
+
+def run_csv_files(pattern, batch=False, resume=False):
     """
-    Retrieve the maximum allowed time for readings based on the sensor type.
+    Clean many CSV files in parallel, one file per worker process.
+
+    Every file is written to its own outputs, clean_<name>.csv and
+    AES_method_<name>.csv where raw_<name>.csv is the input, so workers never
+    share an output file.
 
     Args:
-        window (SlidingWindow): The sliding window object containing sensor readings.
+        pattern (str): A directory (all raw_*.csv files in it) or a glob pattern.
+        batch (bool): Whether workers use the NumPy batch engine. Default is False.
+        resume (bool): Whether workers clean only the rows appended since the last resume run.
+                       Default is False.
 
     Returns:
-        timedelta: The maximum time allowed for readings from the sensor.
+        dict: The total number of readings, constant errors, drifts, range-check replacements
+              and detector alarms.
     """
-    sensor_type = window.get_sensor_type()
-    max_time = 0
-    
-    if sensor_type == "Pvoltage_sensor":
-        max_time = timedelta(minutes=30)
-    
-    if sensor_type == "Bvoltage_sensor":
-        max_time = timedelta(minutes=30)
-        
-    if sensor_type == 'SSTEMP_sensor':
-        max_time = timedelta(minutes=30)
-    
-    if sensor_type == 'illuminance_sensor':
-        max_time = timedelta(minutes=30)
-        
-    if sensor_type == 'SSHUM_sensor':
-        max_time = timedelta(minutes=30)
-    
-    if sensor_type == 'PH_sensor':
-        max_time = timedelta(minutes=30)
-        
-    if sensor_type == 'WINDDIR_sensor':
-        max_time = timedelta(minutes=30)
-    
-    return max_time
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "raw_*.csv")
+    file_paths = sorted(glob.glob(pattern))
+    totals = {'files': 0, 'readings': 0, 'const_err': 0, 'drift': 0, 'clipped': 0, 'alarms': 0}
+
+    with ProcessPoolExecutor() as executor:
+        futures = [executor.submit(clean_csv_file, file_path, batch, OUTPUT_FORMAT, resume, NORMALIZE_TIMES) for file_path in file_paths]
+        for future in as_completed(futures):
+            file_path, counts = future.result()
+            totals['files'] += 1
+            for key in ('readings', 'const_err', 'drift', 'clipped', 'alarms'):
+                totals[key] += counts.get(key, 0)
+            print(f"[{totals['files']}/{len(file_paths)}] {file_path}: {counts.get('readings', 0)} readings, "
+                  f"{counts.get('const_err', 0)} constant errors, {counts.get('drift', 0)} drifts, "
+                  f"{counts.get('clipped', 0)} out of range, {counts.get('alarms', 0)} detector alarms")
+
+    print(f"Cleaned {totals['files']} files: {totals['readings']} readings, "
+          f"{totals['const_err']} constant errors, {totals['drift']} drifts, {totals['clipped']} out of range, "
+          f"{totals['alarms']} detector alarms")
+    return totals
+
+
+def clean_csv_file(file_path, batch=False, output_format="csv", resume=False, normalize=False):
+    """
+    Clean one CSV file into its own output files. Runs in a worker process.
+
+    Args:
+        file_path (str): The path to the CSV file containing raw data.
+        batch (bool): Whether to use the NumPy batch engine. Default is False.
+        output_format (str): The format of the output files, "csv" or "parquet". Default is "csv".
+        resume (bool): Whether to clean only the rows appended since the last resume run.
+                       Default is False.
+        normalize (bool): Whether to convert the timestamps to "%Y-%m-%d %H:%M:%S". Default is False.
+
+    Returns:
+        tuple: (file_path, counts) where counts holds the number of readings,
+               constant errors and drifts.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    if name.startswith("raw_"):
+        name = name[len("raw_"):]
+    counts = {}
+    set_output_format(output_format)
+    set_normalize_times(normalize)
+
+    if batch:
+        run_csv_batch(file_path, "AES_method_" + name, name, counts, verbose=False)
+    elif resume:
+        clean_csv_incremental(file_path, "AES_method_" + name, name, counts, verbose=False)
+    else:
+        stream_to_csv(stream_csv(file_path, "AES_method_" + name, counts, verbose=False), "clean", name)
+
+    # worker processes exit without running atexit handlers
+    close_all()
+    close_tables()
+    return file_path, counts
 
 
 ################################ READING / WRITING ################################
 
-def csv_to_datapoints(file_path):
+def set_output_format(output_format):
+    """
+    Choose the format the raw, clean and target outputs are written in.
+
+    Args:
+        output_format (str): "csv" or "parquet".
+
+    Returns:
+        None
+    """
+    global OUTPUT_FORMAT
+    OUTPUT_FORMAT = output_format
+
+
+def set_normalize_times(enabled):
+    """
+    Choose whether csv input timestamps are converted to "%Y-%m-%d %H:%M:%S" UTC as they are read.
+
+    Args:
+        enabled (bool): Whether to normalize the timestamps.
+
+    Returns:
+        None
+    """
+    global NORMALIZE_TIMES
+    NORMALIZE_TIMES = enabled
+
+
+def output_writer(file_path, header, overwrite=False):
+    """
+    Get the open writer of an output file in the current output format.
+
+    Args:
+        file_path (str): The path of the output file without its extension.
+        header (list): The column names.
+        overwrite (bool): Whether to start the file again (True) or append to it (False).
+
+    Returns:
+        BufferedCSVWriter | ParquetWriter: The writer, with write_row, write_rows,
+                                           write_frame and flush methods.
+    """
+    if OUTPUT_FORMAT == "parquet":
+        return get_table_writer(file_path + ".parquet", header, overwrite)
+    return get_writer(file_path + ".csv", header, overwrite)
+
+
+def csv_to_datapoints(file_path, normalize=None):
     """
     Convert data from a CSV file into a list of DataPoint objects.
 
     Args:
         file_path (str): The path to the CSV file.
+        normalize (bool): Whether to convert the timestamps to "%Y-%m-%d %H:%M:%S" UTC.
+                          Default is None (as chosen with set_normalize_times).
 
     Returns:
         list: A list of DataPoint objects created from the CSV rows.
     """
-    data_points = []
+    return list(iter_datapoints(file_path, normalize=normalize))
+
+
+def iter_datapoints(file_path, start=0, progress=None, normalize=None):
+    """
+    Lazily convert data from a CSV file into DataPoint objects, one row at a time.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        start (int): The byte offset of the first row to read. Default is 0 (the first
+                     row after the header).
+        progress (dict): If given, progress["offset"] is kept at the byte offset just past
+                         the last row read, where a later read can start. A last row
+                         still being written (no line end yet) is left for that read.
+        normalize (bool): Whether to convert the timestamps to "%Y-%m-%d %H:%M:%S" UTC, with
+                          the layout of the file detected once. Default is None (as chosen
+                          with set_normalize_times).
+
+    Yields:
+        DataPoint: A DataPoint object for every CSV row.
+    """
+    normalize = NORMALIZE_TIMES if normalize is None else normalize
+    normalize_time = TimeNormalizer().normalize if normalize else None
+    if start or progress is not None:
+        yield from _iter_datapoints_from(file_path, start, progress, normalize_time)
+        return
 
-    with open(file_path, mode='r') as file:
+    with open(file_path, mode='r', buffering=READ_BUFFER) as file:
         csv_reader = csv.reader(file)
 
         # Skip the header if present
         next(csv_reader, None)
 
-        # Iterate through each row in the CSV
-        for row in csv_reader:
-            # Extract data from each row
-            state = float(row[0])  
-            time = row[1]
-            device = row[2]
-            unit = row[3]
+        # Create a DataPoint object from each CSV row
+        if normalize_time is not None:
+            for state, time, device, unit, *_ in csv_reader:
+                yield DataPoint(float(state), normalize_time(time), device, unit)
+            return
+        for state, time, device, unit, *_ in csv_reader:
+            yield DataPoint(float(state), time, device, unit)
 
-            # Create a DataPoint object from the CSV row
-            data_point = DataPoint(state, time, device, unit)
 
-            # Append the DataPoint object to the list
-            data_points.append(data_point)
+def _iter_datapoints_from(file_path, start, progress, normalize_time=None):
+    with open(file_path, mode='rb', buffering=READ_BUFFER) as file:
+        if start:
+            file.seek(start)
+        else:
+            file.readline()
+        offset = file.tell()
 
-    return data_points
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            if progress is not None:
+                progress["offset"] = offset
+            for state, time, device, unit, *_ in csv.reader([line.decode()]):
+                if normalize_time is not None:
+                    time = normalize_time(time)
+                yield DataPoint(float(state), time, device, unit)
 
 
-def datapoints_to_csv(data_points, file_type, write_all):
+def remove_last_rows(file_path, count):
+    """
+    Remove the last rows of a CSV file in place.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        count (int): The number of rows to remove.
+
+    Returns:
+        None
+    """
+    if not count:
+        return
+    with open(file_path, 'rb+') as file:
+        size = file.seek(0, os.SEEK_END)
+        read = min(size, 1 << 16)
+        while True:
+            file.seek(size - read)
+            tail = file.read(read)
+            cut = len(tail)
+            for _ in range(count):
+                # the start of the row ending just before cut
+                cut = tail.rfind(b"\n", 0, cut - 1) + 1
+                if cut == 0:
+                    break
+            if cut or read == size:
+                break
+            read = min(size, read * 2)
+        file.truncate(size - read + cut)
+
+
+def datapoints_to_csv(data_points, file_type, write_all, name=None):
     """
     Write a list of DataPoint objects to a CSV file.
 
@@ -365,49 +874,191 @@ def datapoints_to_csv(data_points, file_type, write_all):
         data_points (list): The list of DataPoint objects to write.
         file_type (str): The type of file being written ("raw" or "clean").
         write_all (bool): Whether to overwrite the file (True) or append to it (False).
+        name (str): The name the file is written under, the sensor type if None.
 
     Returns:
         None
     """
-    file_path = "../data/" + file_type + "_" + data_points[0].sensor_type + ".csv"
-    
-    mode = 'w' if write_all else 'a'
-    
-    with open(file_path, mode=mode, newline='') as file:
-        csv_writer = csv.writer(file)
+    file_path = "../data/" + file_type + "_" + (name or data_points[0].sensor_type)
+    writer = output_writer(file_path, ['State', 'Time', 'Device', 'Unit'], overwrite=write_all)
 
-        # Write the header
-        if write_all:
-            csv_writer.writerow(['State', 'Time', 'Device', 'Unit'])
+    # Create a row from the DataPoint attributes of each reading
+    writer.write_rows([
+        data_point.get_val(),  # state
+        data_point.get_time(),  # time
+        data_point.sensor_type,  # device
+        data_point.unit_of_measurement  # unit
+    ] for data_point in data_points)
 
-        # Iterate through the DataPoint objects and write each to a row
-        for data_point in data_points:
-            # Create a row from the DataPoint attributes
-            row = [
-                data_point.get_val(),  # state
-                data_point.get_time(),  # time
-                data_point.sensor_type,  # device
-                data_point.unit_of_measurement  # unit
-            ]
+    # A full rewrite is complete once it is on disk
+    if write_all:
+        writer.flush()
 
-            # Write the row to the CSV file
-            csv_writer.writerow(row)
+
+def stream_to_csv(data_points, file_type, name=None, append=False):
+    """
+    Write a stream of DataPoint objects to a CSV file in chunks, replacing the file.
+
+    Args:
+        data_points (iterable): The DataPoint objects to write.
+        file_type (str): The type of file being written ("raw" or "clean").
+        name (str): The name the file is written under, the sensor type if None.
+        append (bool): Whether to append to the file instead of replacing it. Default is False.
+
+    Returns:
+        int: The number of DataPoint objects written.
+    """
+    written = 0
+    while chunk := list(islice(data_points, WRITE_CHUNK)):
+        datapoints_to_csv(chunk, file_type, written == 0 and not append, name)
+        written += len(chunk)
+    return written
 
 
 def write_csv(value, timestamp, output_path):
-    output_path = "../data/" + output_path + ".csv"
-    # Create a DataFrame with the given value and timestamp
-    data = {'Target': [value], 'Time': [timestamp]}
-    df = pd.DataFrame(data)
-
-    # Check if the file already exists
-    if not os.path.exists(output_path):
-        # File doesn't exist, write with header
-        df.to_csv(output_path, mode='w', header=True, index=False)
-    else:
-        # File exists, append without writing the header
-        df.to_csv(output_path, mode='a', header=False, index=False)
-            
-            
+    """
+    Append a target value and its timestamp to an output file in ../data.
+
+    Rows are buffered by the file's writer and written in batches, with the
+    header written only when the file is created.
+
+    Args:
+        value (float): The target value.
+        timestamp (str): The timestamp of the reading the target belongs to.
+        output_path (str): The name of the CSV file without its extension.
+
+    Returns:
+        None
+    """
+    output_writer("../data/" + output_path, ['Target', 'Time']).write_row([value, timestamp])
+
+
+def frame_to_csv(frame, output_path, write_all):
+    """
+    Write a whole DataFrame to a CSV file in one call.
+
+    Args:
+        frame (DataFrame): The rows to write.
+        output_path (str): The path of the CSV file without its extension.
+        write_all (bool): Whether to overwrite the file (True) or append to it (False).
+
+    Returns:
+        None
+    """
+    writer = output_writer(output_path, list(frame.columns), overwrite=write_all)
+    writer.write_frame(frame)
+    writer.flush()
+
+
+################################ QUERYING ################################
+
+def query_outputs(sensor, start, end, target_name=None):
+    """
+    Read the raw, cleaned and target values of a sensor whose time falls in [start, end).
+
+    Live raw readings come from the raw store; the other outputs are read from
+    their Parquet file if there is one, otherwise from their CSV file through
+    its time index. The files of the sensor are found with output_names.
+
+    Args:
+        sensor (str): The sensor type, or the <name> of a raw_<name>.csv input.
+        start (str): The first time to include.
+        end (str): The first time to exclude.
+        target_name (str): The target output name. Default is None (found by output_names).
+
+    Returns:
+        dict: (path, DataFrame) of every output found, by kind ("raw", "clean", "target").
+    """
+    slices = {}
+    names = output_names(sensor, target_name)
+    store = get_raw_store()
+    if os.path.isdir(os.path.join(store.root, names["sensor_type"])):
+        readings = store.query(names["sensor_type"], start, end)
+        slices["raw"] = (os.path.join(store.root, names["sensor_type"]), pd.DataFrame(
+            [[r.get_val(), r.get_time(), r.sensor_type, r.unit_of_measurement] for r in readings],
+            columns=RAW_HEADER))
+
+    outputs = [("clean", names["clean"]), ("target", names["target"])]
+    if "raw" not in slices:
+        outputs.insert(0, ("raw", names["raw"]))
+
+    for kind, name in outputs:
+        path = "../data/" + name
+        if pa is not None and os.path.exists(path + ".parquet"):
+            slices[kind] = (path + ".parquet", read_range(path + ".parquet", start, end))
+        elif os.path.exists(path + ".csv"):
+            slices[kind] = (path + ".csv", read_csv_range(path + ".csv", start, end))
+    return slices
+
+
+def output_names(sensor, target_name=None):
+    """
+    Find the names of the raw, clean and target outputs of one stream in ../data.
+
+    A raw_<name>.csv file cleaned on its own is written to clean_<sensor type> and
+    AES_method, while files cleaned together are written to clean_<name> and
+    AES_method_<name>. Either name of a stream maps to all three of its files: a
+    <name> to the sensor type of its readings, and a sensor type to the raw input
+    of its clean file, the raw_<name>.csv file of that type without outputs of its own.
+
+    Args:
+        sensor (str): The sensor type, or the <name> of a raw_<name>.csv input.
+        target_name (str): The target output name. Default is None (AES_method_<name> or
+                           AES_method_<sensor type> if it exists, otherwise AES_method).
+
+    Returns:
+        dict: The output name of every kind ("raw", "clean", "target"), without extension,
+              and the "sensor_type" of the stream.
+    """
+    name, sensor_type = sensor, sensor
+    if os.path.exists("../data/raw_" + sensor + ".csv"):
+        sensor_type = csv_sensor_type("../data/raw_" + sensor + ".csv") or sensor
+    elif not output_exists("raw_" + sensor):
+        for file_path in sorted(glob.glob("../data/raw_*.csv")):
+            file_name = os.path.splitext(os.path.basename(file_path))[0][len("raw_"):]
+            if not output_exists("clean_" + file_name) and csv_sensor_type(file_path) == sensor:
+                name = file_name
+                break
+
+    clean_name = name if output_exists("clean_" + name) else sensor_type
+    if target_name is None:
+        target_name = next((target for target in ("AES_method_" + name, "AES_method_" + sensor_type)
+                            if output_exists(target)), "AES_method")
+    return {"raw": "raw_" + name, "clean": "clean_" + clean_name, "target": target_name,
+            "sensor_type": sensor_type}
+
+
+def output_exists(name):
+    """
+    Check whether an output in ../data exists, as a CSV or a Parquet file.
+
+    Args:
+        name (str): The output name without extension.
+
+    Returns:
+        bool: True if the output exists.
+    """
+    return any(os.path.exists("../data/" + name + ext) for ext in (".parquet", ".csv"))
+
+
+def csv_sensor_type(file_path):
+    """
+    Read the sensor type of the first reading in a raw CSV file.
+
+    Args:
+        file_path (str): The path of the CSV file.
+
+    Returns:
+        str: The Device of the first row, or None if the file has no readings or no Device column.
+    """
+    with open(file_path, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, [])
+        row = next(reader, None)
+    if row is None or "Device" not in header or len(row) <= header.index("Device"):
+        return None
+    return row[header.index("Device")]
+
+
 if __name__ == '__main__' :
     main()
\ No newline at end of file
@@ -0,0 +1,432 @@
+"""
+Module containing the pipeline instrumentation:
+    Histogram()
+    SensorMetrics(name, sample_every)
+    Metrics(sample_every)
+    MetricsExporter(metrics, file_path, port, interval)
+    enable_metrics(sample_every), get_metrics(), sensor_metrics(name)
+    start_from_env()
+
+Every pipeline stage of a sampled reading is timed with perf_counter_ns and
+recorded in a per-sensor, per-stage log-bucketed histogram, from which the
+p50/p99 latencies are read. Only one reading in sample_every is timed, so
+instrumentation costs well under 1% of the pipeline; the throughput
+counters still count every reading.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ("null", "raw", "window", "const_err", "range", "ema", "median", "cusum", "detectors", "output")
+SUB_BITS = 3        # mantissa bits of a histogram bucket, bucket widths are at most 1/8
+SAMPLE_EVERY = 16   # default number of readings per timed reading
+
+
+class Histogram:
+    """
+    A latency histogram with logarithmic buckets of at most 12.5% width.
+
+    Attributes:
+        counts (list): The number of durations in every bucket.
+        count (int): The number of durations recorded.
+        total (int): The sum of the durations recorded, in nanoseconds.
+        max (int): The longest duration recorded, in nanoseconds.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty histogram.
+        """
+        self.counts = [0] * (64 << SUB_BITS)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+    def record(self, ns):
+        """
+        Record a duration.
+
+        Args:
+            ns (int): The duration in nanoseconds.
+
+        Returns:
+            None
+        """
+        shift = ns.bit_length() - SUB_BITS - 1
+        if shift <= 0:
+            self.counts[ns] += 1
+        else:
+            self.counts[(shift << SUB_BITS) + (ns >> shift)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+
+    def percentile(self, p):
+        """
+        Estimate a percentile of the recorded durations.
+
+        Args:
+            p (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: The midpoint of the bucket holding the percentile, in nanoseconds,
+                   or 0 if nothing was recorded.
+        """
+        counts = list(self.counts)
+        rank = p / 100 * sum(counts)
+        seen = 0
+        for idx, n in enumerate(counts):
+            seen += n
+            if n and seen >= rank:
+                return _bucket_mid(idx)
+        return 0.0
+
+
+    def summary(self):
+        """
+        Returns:
+            dict: The count, mean, p50, p99 and max of the durations, in microseconds.
+        """
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1000 if self.count else 0.0,
+            "p50_us": self.percentile(50) / 1000,
+            "p99_us": self.percentile(99) / 1000,
+            "max_us": self.max / 1000,
+        }
+
+
+def _bucket_mid(idx):
+    if idx < 2 << SUB_BITS:
+        return float(idx)
+    shift = (idx >> SUB_BITS) - 1
+    low = ((idx & ((1 << SUB_BITS) - 1)) | (1 << SUB_BITS)) << shift
+    return low + (1 << shift) / 2
+
+
+class SensorMetrics:
+    """
+    The stage latencies and throughput counters of one sensor stream.
+
+    Attributes:
+        name (str): The stream the metrics belong to.
+        sample_every (int): The number of readings per timed reading.
+        stages (dict): The Histogram of every stage.
+        readings (int): The number of readings started.
+        verdicts (int): The number of readings run through error detection.
+        const_errs (int): The number of constant errors detected.
+        drifts (int): The number of CUSUM drifts detected.
+        clipped (int): The number of values replaced by the range check.
+        alarms (int): The number of times an extra detector fired.
+        first_time (float): The wall clock time of the first reading.
+        last_time (float): The wall clock time of the latest reading.
+    """
+
+    def __init__(self, name, sample_every=SAMPLE_EVERY):
+        """
+        Initialize empty metrics for a sensor stream.
+
+        Args:
+            name (str): The stream the metrics belong to.
+            sample_every (int): The number of readings per timed reading. Default is 16.
+        """
+        self.name = name
+        self.sample_every = sample_every
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.readings = 0
+        self.verdicts = 0
+        self.const_errs = 0
+        self.drifts = 0
+        self.clipped = 0
+        self.alarms = 0
+        self.first_time = None
+        self.last_time = None
+        self.last = 0
+
+
+    def start(self):
+        """
+        Count a new reading and start its stage timer if it is sampled.
+
+        Returns:
+            SensorMetrics: self if the reading's stages are to be timed with lap, otherwise None.
+        """
+        self.readings += 1
+        if self.readings % self.sample_every:
+            return None
+        self.last_time = time.time()
+        if self.first_time is None:
+            self.first_time = self.last_time
+        self.last = time.perf_counter_ns()
+        return self
+
+
+    def lap(self, stage):
+        """
+        Record the time since the previous lap (or start) as the duration of a stage.
+
+        Args:
+            stage (str): One of STAGES.
+
+        Returns:
+            None
+        """
+        now = time.perf_counter_ns()
+        self.stages[stage].record(now - self.last)
+        self.last = now
+
+
+    def verdict(self, const_err, in_control, clipped=0, alarms=0):
+        """
+        Count the outcome of error detection on a reading.
+
+        Args:
+            const_err (bool): Whether a constant error was detected.
+            in_control (bool): Whether CUSUM found the process in control.
+            clipped (int): The number of values the range check replaced. Default is 0.
+            alarms (int): The number of extra detectors that fired. Default is 0.
+
+        Returns:
+            None
+        """
+        self.verdicts += 1
+        self.const_errs += const_err
+        self.drifts += not in_control
+        self.clipped += clipped
+        self.alarms += alarms
+
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The counters, the reading rate and a summary of every stage that was timed.
+        """
+        elapsed = (self.last_time or 0) - (self.first_time or 0)
+        return {
+            "readings": self.readings,
+            "verdicts": self.verdicts,
+            "const_errs": self.const_errs,
+            "drifts": self.drifts,
+            "clipped": self.clipped,
+            "alarms": self.alarms,
+            "readings_per_s": self.readings / elapsed if elapsed > 0 else None,
+            "stages": {stage: hist.summary() for stage, hist in self.stages.items() if hist.count},
+        }
+
+
+class Metrics:
+    """
+    The metrics of every sensor stream in the process.
+
+    Attributes:
+        sample_every (int): The number of readings per timed reading.
+        sensors (dict): The SensorMetrics of every stream, by name.
+        started (float): The wall clock time the metrics were created.
+    """
+
+    def __init__(self, sample_every=SAMPLE_EVERY):
+        """
+        Initialize metrics without any streams.
+
+        Args:
+            sample_every (int): The number of readings per timed reading. Default is 16.
+        """
+        self.sample_every = sample_every
+        self.sensors = {}
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+
+    def sensor(self, name):
+        """
+        Get the metrics of a stream, creating them on first use.
+
+        Args:
+            name (str): The stream.
+
+        Returns:
+            SensorMetrics: The metrics of the stream.
+        """
+        with self.lock:
+            if name not in self.sensors:
+                self.sensors[name] = SensorMetrics(name, self.sample_every)
+            return self.sensors[name]
+
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: The snapshot of every stream, with the time it was taken.
+        """
+        with self.lock:
+            sensors = dict(self.sensors)
+        return {
+            "time": time.time(),
+            "uptime_s": time.time() - self.started,
+            "sample_every": self.sample_every,
+            "sensors": {str(name): sensor.snapshot() for name, sensor in sensors.items()},
+        }
+
+
+class MetricsExporter:
+    """
+    Publishes metrics snapshots as a periodically rewritten JSON file and/or
+    on a local HTTP endpoint (GET /metrics), from daemon threads.
+
+    Attributes:
+        metrics (Metrics): The metrics to publish.
+        file_path (str): The snapshot file, or None.
+        port (int): The local HTTP port, or None.
+        interval (float): The seconds between snapshot file writes.
+        server (ThreadingHTTPServer): The HTTP server, once started.
+    """
+
+    def __init__(self, metrics, file_path=None, port=None, interval=10.0):
+        """
+        Initialize the exporter.
+
+        Args:
+            metrics (Metrics): The metrics to publish.
+            file_path (str): The snapshot file. Default is None (no file).
+            port (int): The local HTTP port. Default is None (no endpoint).
+            interval (float): The seconds between snapshot file writes. Default is 10.0.
+        """
+        self.metrics = metrics
+        self.file_path = file_path
+        self.port = port
+        self.interval = interval
+        self.server = None
+        self.stopping = threading.Event()
+
+
+    def start(self):
+        """
+        Start the snapshot file writer and the HTTP endpoint. Both are stopped,
+        with a final snapshot written, when the interpreter exits.
+
+        Returns:
+            None
+        """
+        atexit.register(self.stop)
+        if self.file_path:
+            threading.Thread(target=self._write_loop, daemon=True).start()
+        if self.port:
+            metrics = self.metrics
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip("/") not in ("", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = json.dumps(metrics.snapshot(), indent=2).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+    def stop(self):
+        """
+        Stop publishing, writing a final snapshot file.
+
+        Returns:
+            None
+        """
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        if self.server is not None:
+            self.server.shutdown()
+        if self.file_path:
+            self.write_snapshot()
+
+
+    def write_snapshot(self):
+        """
+        Replace the snapshot file with the current metrics.
+
+        Returns:
+            None
+        """
+        temp_path = self.file_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.metrics.snapshot(), file, indent=2)
+        os.replace(temp_path, self.file_path)
+
+
+    def _write_loop(self):
+        while not self.stopping.wait(self.interval):
+            self.write_snapshot()
+
+
+_metrics = None
+
+
+def enable_metrics(sample_every=SAMPLE_EVERY):
+    """
+    Turn on instrumentation for every pipeline created from now on.
+
+    Args:
+        sample_every (int): The number of readings per timed reading. Default is 16.
+
+    Returns:
+        Metrics: The process wide metrics.
+    """
+    global _metrics
+    _metrics = Metrics(sample_every)
+    return _metrics
+
+
+def get_metrics():
+    """
+    Returns:
+        Metrics: The process wide metrics, or None if instrumentation is off.
+    """
+    return _metrics
+
+
+def sensor_metrics(name):
+    """
+    Get the metrics of a stream from the process wide metrics.
+
+    Args:
+        name (str): The stream.
+
+    Returns:
+        SensorMetrics: The metrics of the stream, or None if instrumentation is off.
+    """
+    return _metrics.sensor(name) if _metrics is not None else None
+
+
+def start_from_env():
+    """
+    Turn on instrumentation if $METRICS_FILE or $METRICS_PORT is set, and start
+    exporting to them. $METRICS_INTERVAL and $METRICS_SAMPLE override the
+    snapshot interval and sampling rate.
+
+    Returns:
+        MetricsExporter: The running exporter, or None if instrumentation is off.
+    """
+    file_path = os.getenv("METRICS_FILE")
+    port = os.getenv("METRICS_PORT")
+    if not (file_path or port):
+        return None
+
+    metrics = enable_metrics(int(os.getenv("METRICS_SAMPLE", SAMPLE_EVERY)))
+    exporter = MetricsExporter(metrics, file_path, int(port) if port else None,
+                               float(os.getenv("METRICS_INTERVAL", 10.0)))
+    exporter.start()
+    return exporter
@@ -1,35 +1,65 @@
 import paho.mqtt.client as mqtt
 import json
+import queue
+from collections import deque
+from datetime import datetime, timezone
 from dateutil import parser
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BATCH_SIZE = 256        # queued messages decoded together
+EPOCH_CACHE_SIZE = 4096 # last_changed timestamps whose epoch is remembered
+
 class MQTTClient:
     """
     A client for interacting with an MQTT broker and receiving sensor data.
 
+    Received messages are put on a bounded thread-safe queue that the pipeline
+    blocks on, still encoded, so the network thread does no decoding. When the
+    queue is full the network thread waits up to put_timeout seconds for space
+    (backpressure on the broker connection), and then drops the message. The
+    pipeline thread takes the queued messages up to BATCH_SIZE at a time and
+    decodes them together with decode_batch.
+
     Attributes:
         broker_address (str): The address of the MQTT broker.
         broker_port (int): The port of the MQTT broker.
-        topic (str): The MQTT topic to subscribe to.
+        topics (list): The MQTT topics to subscribe to.
         client (mqtt.Client): The MQTT client instance.
-        readings (list): A list to store received sensor data readings.
+        readings (queue.Queue): A bounded queue of received (topic, payload) messages.
+        decoded (deque): Readings decoded from the queue but not yet taken.
+        put_timeout (float): The seconds to wait for queue space before dropping a message.
+        received (int): The number of readings decoded.
+        dropped (int): The number of messages dropped because the queue was full.
+        decode_errors (int): The number of messages that failed to decode.
     """
 
-    def __init__(self, broker_address, broker_port, topic):
+    def __init__(self, broker_address, broker_port, topics, max_queue=10_000, put_timeout=0.5):
         """
-        Initialize the MQTTClient instance with broker details and topic.
+        Initialize the MQTTClient instance with broker details and topics.
 
         Args:
             broker_address (str): The address of the MQTT broker.
             broker_port (int): The port of the MQTT broker.
-            topic (str): The MQTT topic to subscribe to.
+            topics (str | list): The MQTT topic, or list of topics, to subscribe to.
+            max_queue (int): The maximum number of queued messages. Default is 10 000.
+            put_timeout (float): The seconds to wait for queue space before dropping. Default is 0.5.
         """
         self.broker_address = broker_address
         self.broker_port = broker_port
-        self.topic = topic
+        self.topics = [topics] if isinstance(topics, str) else list(topics)
         self.client = mqtt.Client()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
-        self.readings = []
+        self.readings = queue.Queue(maxsize=max_queue)
+        self.decoded = deque()
+        self.put_timeout = put_timeout
+        self.received = 0
+        self.dropped = 0
+        self.decode_errors = 0
 
 
     def on_connect(self, client, userdata, flags, rc):
@@ -45,37 +75,26 @@ class MQTTClient:
             None
         """
         print(f"Connected successfully")
-        client.subscribe(self.topic)
+        client.subscribe([(topic, 0) for topic in self.topics])
 
 
     def on_message(self, client, userdata, msg):
+        """
+        Queue a received message for decoding.
+
+        Args:
+            client (mqtt.Client): The MQTT client instance.
+            userdata: The private user data.
+            msg (mqtt.MQTTMessage): The received message.
+
+        Returns:
+            None
+        """
+        # Queue the message, waiting briefly for space before dropping it
         try:
-            # Decode the payload
-            payload = json.loads(msg.payload.decode())
-            
-            # Extract relevant information
-            value = float(payload['state'])
-            data = payload.get('data', {})
-            
-            # Extract additional information from the 'data' field
-            device_class = data.get('device_class', 'unknown')
-            unit_of_measurement = data.get('unit_of_measurement', 'unknown')
-            last_changed = data.get('last_changed', None)
-            # Parse the last_changed timestamp if available
-            if last_changed:
-                timestamp = parser.isoparse(last_changed)
-                human_time = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                timestamp = None
-                human_time = None
-            
-            # Log the reading and metadata
-            reading = (value, human_time, device_class, unit_of_measurement)
-            # Store the reading
-            self.readings.append(reading)
-
-        except (ValueError, KeyError) as e:
-            print(f"Failed to decode message: {e}")
+            self.readings.put((msg.topic, msg.payload), timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
 
     def connect(self):
         """
@@ -108,21 +127,170 @@ class MQTTClient:
         self.client.disconnect()
 
 
+    def get_reading(self, timeout=None):
+        """
+        Wait for the next sensor reading received from the MQTT broker.
+
+        Args:
+            timeout (float): The seconds to wait, or None to wait indefinitely.
+
+        Returns:
+            tuple: A (value, epoch, device_class, unit, topic) tuple, or None on timeout.
+        """
+        while not self.decoded:
+            try:
+                messages = [self.readings.get(timeout=timeout)]
+            except queue.Empty:
+                return None
+            self._decode(messages)
+        return self.decoded.popleft()
+
+
     def get_readings(self):
         """
-        Retrieve the list of sensor readings received from the MQTT broker.
+        Take every sensor reading currently queued, without waiting.
+
+        Returns:
+            list: A list of (value, epoch, device_class, unit, topic) tuples.
+        """
+        self._decode([])
+        readings = list(self.decoded)
+        self.decoded.clear()
+        return readings
+
 
+    def has_readings(self):
+        """
         Returns:
-            list: A list of tuples containing sensor readings and metadata.
+            bool: Whether a reading is waiting to be taken.
         """
-        return self.readings
+        return bool(self.decoded) or not self.readings.empty()
 
 
     def clear_readings(self):
         """
-        Clear the list of stored sensor readings.
+        Discard every queued sensor reading.
 
         Returns:
             None
         """
-        self.readings = []
\ No newline at end of file
+        self.get_readings()
+
+
+    def _decode(self, messages):
+        # take whatever else is queued along with them, up to a batch
+        get = self.readings.get_nowait
+        try:
+            while len(messages) < BATCH_SIZE:
+                messages.append(get())
+        except queue.Empty:
+            pass
+        readings, errors = decode_batch(messages)
+        self.received += len(readings)
+        self.decode_errors += len(errors)
+        for error in errors:
+            print(f"Failed to decode message: {error}")
+        self.decoded.extend(readings)
+
+
+def decode_payload(payload):
+    """
+    Decode a Home Assistant state message into a sensor reading.
+
+    The JSON is parsed with orjson when it is installed, only the state and
+    data fields are read from it, and last_changed goes straight to epoch
+    seconds through parse_epoch.
+
+    Args:
+        payload (bytes): The raw JSON message payload.
+
+    Returns:
+        tuple: (value, epoch, device_class, unit_of_measurement) where epoch is
+               None if the message has no last_changed time.
+
+    Raises:
+        ValueError: If the payload is not valid JSON, the state is not a number
+                    or last_changed is not a timestamp.
+        KeyError: If the payload has no state.
+    """
+    payload = _loads(payload)
+    value = float(payload['state'])
+    data = payload.get('data') or {}
+    last_changed = data.get('last_changed')
+    return (value, parse_epoch(last_changed) if last_changed else None,
+            data.get('device_class', 'unknown'), data.get('unit_of_measurement', 'unknown'))
+
+
+def decode_batch(messages):
+    """
+    Decode a batch of queued messages.
+
+    Args:
+        messages (list): (topic, payload) pairs.
+
+    Returns:
+        tuple: (readings, errors) where readings is a list of (value, epoch,
+               device_class, unit_of_measurement, topic) tuples of the messages
+               that decoded and errors lists the exception of every one that did not.
+    """
+    readings = []
+    errors = []
+    append = readings.append
+    for topic, payload in messages:
+        try:
+            append(decode_payload(payload) + (topic,))
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(e)
+    return readings, errors
+
+
+def _loads(payload):
+    if orjson is not None:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json (eg about NaN), which has the last word
+            pass
+    return json.loads(payload)
+
+
+_epochs = {}
+
+
+def parse_epoch(time_stamp):
+    """
+    Convert an ISO-8601 last_changed timestamp to epoch seconds.
+
+    A timestamp with a UTC offset is converted to UTC, as data_point.to_epoch
+    and format_time do; one without is taken as written, in UTC. Timestamps
+    go through the C ISO parser of datetime, and only those it rejects through
+    dateutil's isoparse. A sensor repeats its last_changed until its state
+    changes, so recent results are remembered.
+
+    Args:
+        time_stamp (str): The timestamp, eg "2024-09-11T16:00:39.123456+00:00".
+
+    Returns:
+        int: The epoch seconds.
+
+    Raises:
+        ValueError: If the timestamp is not ISO-8601.
+    """
+    epoch = _epochs.get(time_stamp)
+    if epoch is not None:
+        return epoch
+    try:
+        parsed = datetime.fromisoformat(time_stamp)
+    except ValueError:
+        try:
+            parsed = parser.isoparse(time_stamp)
+        except OverflowError as e:
+            raise ValueError(str(e))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    epoch = int(parsed.timestamp())
+
+    if len(_epochs) >= EPOCH_CACHE_SIZE:
+        _epochs.clear()
+    _epochs[time_stamp] = epoch
+    return epoch
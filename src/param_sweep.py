@@ -0,0 +1,169 @@
+"""
+Module containing the parameter sweep of the cleaning pipeline:
+    expand_grid(grid, profile)
+    score(series, cleaned, drift, delta)
+    sweep(file_path, grid, delta, workers)
+    load_grid(file_path)
+
+A sweep cleans one historical series with every combination of a grid of
+pipeline parameters (EMA alpha, CUSUM k and h, window size, median window
+and the CUSUM target, AES or mean) and ranks the combinations by their
+number of drift alarms, then by hinge loss and MSE of the cleaned series
+against the raw one, as CUSUM_TARGET.ipynb and EMA_MED_FILTER.ipynb compare
+them by hand.
+
+The series is parsed, null filtered, time parsed and range checked against
+the profile limits once, and handed to every worker process when it starts;
+a worker builds the constant error mask once per window size. The
+combinations are spread over all cores and cleaned with the batch engine.
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+import pandas as pd
+from batch_engine import load_series, PreparedSeries, clean_series
+from sensor_limits import get_profile
+
+PARAMS = ("alpha", "k", "h", "win_size", "med_window", "target")
+TARGETS = ("AES", "mean")
+DEFAULT_GRID = {
+    "alpha": [0.2, 0.4, 0.6],
+    "k": [0.25, 0.5, 1.0],
+    "h": [3, 5, 8],
+    "target": list(TARGETS),
+}
+HINGE_DELTA = 0.02   # deviation from the raw value a cleaned value may have without loss
+RANK_BY = ("alarms", "hinge", "mse")
+
+
+def expand_grid(grid, profile):
+    """
+    List every valid combination of a parameter grid, taking the profile's
+    setting for any parameter the grid leaves out.
+
+    Args:
+        grid (dict): A list of values to try for some of alpha, k, h, win_size,
+                     med_window and target.
+        profile (SensorProfile): The profile of the swept sensor.
+
+    Returns:
+        list: One dict of all parameters per combination. A median window is cut
+              to the window, as pipelines do; combinations with an even or
+              smaller than 3 median window are left out.
+
+    Raises:
+        ValueError: If the grid has an unknown parameter or target.
+    """
+    unknown = set(grid) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameters: {', '.join(sorted(unknown))}")
+    if set(grid.get("target", ())) - set(TARGETS):
+        raise ValueError(f"sweep targets must be among {', '.join(TARGETS)}")
+
+    defaults = {param: getattr(profile, param) for param in PARAMS if param != "target"}
+    defaults["target"] = "AES"
+    values = [grid.get(param) or [defaults[param]] for param in PARAMS]
+    combos = []
+    for combo in product(*values):
+        combo = dict(zip(PARAMS, combo))
+        if combo["med_window"] % 2 == 0 or combo["med_window"] < 3:
+            continue
+        win_size = combo["win_size"]
+        combo["med_window"] = min(combo["med_window"], win_size - (win_size + 1) % 2)
+        if combo not in combos:
+            combos.append(combo)
+    return combos
+
+
+def score(series, cleaned, drift, delta=HINGE_DELTA):
+    """
+    Score a cleaning of a series against its raw values.
+
+    Args:
+        series (PreparedSeries): The series that was cleaned.
+        cleaned (DataFrame): The cleaned readings, aligned with series.raw.
+        drift (ndarray): The CUSUM drift verdict of every processed reading.
+        delta (float): The hinge loss margin. Default is 0.02.
+
+    Returns:
+        dict: The number of drift alarms, and the MSE and hinge loss of the
+              cleaned values against the raw ones.
+    """
+    diff = series.raw - cleaned['State'].to_numpy(dtype=float)
+    if not len(diff):
+        return {"alarms": 0, "mse": 0.0, "hinge": 0.0}
+    return {
+        "alarms": int(drift.sum()),
+        "mse": float(np.mean(diff ** 2)),
+        "hinge": float(np.mean(np.maximum(0, np.abs(diff) - delta))),
+    }
+
+
+_series = None
+_profile = None
+_delta = HINGE_DELTA
+
+
+def _init_worker(series, profile, delta):
+    global _series, _profile, _delta
+    _series, _profile, _delta = series, profile, delta
+
+
+def _evaluate(combo):
+    cleaned, _, const_err, drift, clipped, _ = clean_series(
+        _series, _profile.UL, _profile.LL, _profile.max_time, combo["win_size"], combo["med_window"],
+        alpha=combo["alpha"], k=combo["k"], h=combo["h"], target=combo["target"])
+    result = dict(combo)
+    result.update(score(_series, cleaned, drift, _delta))
+    result.update(const_errs=int(const_err.sum()), clipped=int(clipped.sum()))
+    return result
+
+
+def sweep(file_path, grid=None, delta=HINGE_DELTA, workers=None):
+    """
+    Clean a series with every combination of a parameter grid in parallel and rank them.
+
+    Args:
+        file_path (str): The path to the CSV file containing raw data.
+        grid (dict): A list of values per parameter. Default is DEFAULT_GRID.
+        delta (float): The hinge loss margin. Default is 0.02.
+        workers (int): The number of worker processes. Default is one per core.
+
+    Returns:
+        DataFrame: A row per combination with its parameters, drift alarms, MSE,
+                   hinge loss, constant errors and range-check replacements,
+                   best first, with its place in a rank column.
+    """
+    frame = load_series(file_path)
+    profile = get_profile(frame['Device'].iloc[0] if len(frame) else None)
+    combos = expand_grid(DEFAULT_GRID if grid is None else grid, profile)
+    series = PreparedSeries(frame)
+    # parsed once here rather than in every worker
+    series.epochs()
+    series.out_of_range(profile.UL, profile.LL)
+
+    workers = min(workers or os.cpu_count() or 1, len(combos)) or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(series, profile, delta)) as executor:
+        results = list(executor.map(_evaluate, combos, chunksize=max(1, len(combos) // (workers * 4))))
+
+    table = pd.DataFrame(results, columns=list(PARAMS) + ["alarms", "mse", "hinge", "const_errs", "clipped"])
+    table = table.sort_values(list(RANK_BY), kind="stable").reset_index(drop=True)
+    table.insert(0, "rank", np.arange(1, len(table) + 1))
+    return table
+
+
+def load_grid(file_path):
+    """
+    Read a parameter grid from a JSON file, e.g. {"alpha": [0.2, 0.4], "target": ["AES", "mean"]}.
+
+    Args:
+        file_path (str): The path of the JSON file.
+
+    Returns:
+        dict: A list of values per parameter; single values are made one-element lists.
+    """
+    with open(file_path) as file:
+        grid = json.load(file)
+    return {param: values if isinstance(values, list) else [values] for param, values in grid.items()}
@@ -0,0 +1,294 @@
+from sliding_window import SlidingWindow
+from data_point import DataPoint
+from preprocessor import range_check, do_EMA, med_filter
+from rolling_median import MedianFilter
+from err_detections import is_const_err, CUSUM
+from sensor_limits import get_registry
+from metrics import sensor_metrics
+from detectors import DetectorContext, make_engine
+
+
+class SensorPipeline:
+    """
+    The cleaning and error detection state of a single sensor stream.
+
+    Every sensor gets its own pipeline, so any number of streams can be
+    cleaned side by side in one process without sharing state.
+
+    The sensor profile is resolved from the first reading's sensor type and
+    kept on the pipeline. It is only looked up again after the profile
+    registry has been reloaded; a new window size then applies to streams
+    that have not started yet.
+
+    The extra detectors of the profile run after CUSUM on every processed
+    reading, sharing one DetectorContext; the ones that fired are kept in alarms.
+
+    Attributes:
+        name (str): The stream the pipeline belongs to (MQTT topic or sensor type).
+        registry (ProfileRegistry): The registry the sensor profile comes from.
+        profile (SensorProfile): The settings of the stream, None until the first reading.
+        profile_version (int): The registry version the profile was resolved at.
+        window (SlidingWindow): The window of recent readings being cleaned.
+        CT_plus_win (SlidingWindow): The window of recent positive CUSUM deviations.
+        CT_min_win (SlidingWindow): The window of recent negative CUSUM deviations.
+        median_filter (MedianFilter): The rolling median filter of window, None until first used
+                                      or with the legacy median filter.
+        last_changed (list): The last changed value and its epoch time, [value, time].
+        last_EMA (float): The last EMA smoothed value.
+        target (float): The last CUSUM target value, None until the first reading.
+        first_window (bool): Whether the next processed window is the first full window.
+        num_reads (int): The number of readings added to the pipeline.
+        num_clipped (int): The number of values replaced by the range check.
+        detectors (DetectorEngine): The extra detectors of the profile, None if it has none.
+        context (DetectorContext): The context the detectors are given, reused for every reading.
+        alarms (list): The extra detectors that fired on the last processed reading.
+        metrics (SensorMetrics): The stage latencies and counters of the stream, None if
+                                 instrumentation is off.
+        timer (SensorMetrics): metrics while the current reading is being timed, otherwise None.
+    """
+
+    def __init__(self, name, profile=None):
+        """
+        Initialize an empty pipeline for a sensor stream.
+
+        Args:
+            name (str): The stream the pipeline belongs to.
+            profile (SensorProfile): The settings of the stream. Default is the
+                                     profile of the first reading's sensor type.
+        """
+        self.name = name
+        self.registry = get_registry()
+        self.detectors = None
+        self.context = DetectorContext()
+        self.alarms = []
+        self.profile = None
+        self.profile_version = None
+        self._make_windows((profile or self.registry.default).win_size)
+        if profile is not None:
+            self._use_profile(profile)
+        self.last_changed = [0, 0]  #value, timestamp
+        self.last_EMA = 0
+        self.target = None
+        self.first_window = True
+        self.num_reads = 0
+        self.num_clipped = 0
+        self.metrics = sensor_metrics(name)
+        self.timer = None
+
+
+    def add_reading(self, reading):
+        """
+        Add a new (non-null) reading to the window, sliding out the oldest once full.
+
+        Args:
+            reading (DataPoint): The new sensor reading.
+
+        Returns:
+            DataPoint: The cleaned reading that left the window, or None.
+        """
+        if self.target is None:
+            self.target = reading.value
+        if self.profile is None:
+            self._use_profile(self.registry.get(reading.sensor_type))
+        self.num_reads += 1
+
+        if self.window.is_full():
+            return self.window.slide_next(reading)
+        self.window.add_reading(reading)
+        return None
+
+
+    def step(self, reading):
+        """
+        Add a new (non-null) reading and, once the window is full, clean it and
+        run error detection.
+
+        Args:
+            reading (DataPoint): The new sensor reading.
+
+        Returns:
+            tuple: (const_err, in_control) as returned by process, or None while
+                   the window is still filling.
+        """
+        self.add_reading(reading)
+        if self.timer:
+            self.timer.lap("window")
+        if not self.window.is_full():
+            return None
+        return self.process()
+
+
+    def process(self):
+        """
+        Clean the newest reading in a full window and run error detection on it.
+
+        Returns:
+            tuple: (const_err, in_control) where const_err is True if a constant
+                   error was detected and in_control is False if CUSUM detected drift.
+        """
+        window = self.window
+        timer = self.timer
+        if self.profile_version != self.registry.version:
+            self._use_profile(self.registry.get(window.get_sensor_type()))
+        profile = self.profile
+        detectors = self.detectors
+        if detectors is not None:
+            value = window.get_val(-1)
+
+        if self.first_window:
+            self.last_changed[0] = window.get_win_vals()[-1]
+            self.last_changed[1] = window.get_win_times()[-1]
+            self.last_EMA = window.get_win_vals()[-1]
+
+        #check for constant error sensor fault
+        const_err = is_const_err(window, self.last_changed, profile.max_time)
+        if timer:
+            timer.lap("const_err")
+
+        #perform range check on current window, all values the first time
+        clipped = range_check(window, profile.UL, profile.LL, self.first_window)
+        self.num_clipped += clipped
+        self.first_window = False
+        if timer:
+            timer.lap("range")
+
+        #perform EMA smoothing
+        self.last_EMA = do_EMA(window, self.last_EMA, profile.alpha)
+        if timer:
+            timer.lap("ema")
+
+        #perform median filtering to smooth data, over at most the largest odd number of readings in the window
+        med_window = min(profile.med_window, window.size - (window.size + 1) % 2)
+        if profile.median == "legacy":
+            med_filter(window, med_window)
+            self.median_filter = None
+        else:
+            if self.median_filter is None or self.median_filter.size != med_window:
+                self.median_filter = MedianFilter(med_window)
+            self.median_filter.apply(window, self.num_reads)
+        if timer:
+            timer.lap("median")
+
+        #error detection with CUSUM
+        in_control, self.target = CUSUM(self.CT_plus_win, self.CT_min_win, window.get_win_vals(),
+                                        self.target, window.stats, profile.k, profile.h)
+        if timer:
+            timer.lap("cusum")
+
+        #extra detectors, in one pass over the same window statistics
+        if detectors is not None:
+            context = self.context
+            stats = window.stats
+            context.epoch = window.get_win_times()[-1]
+            context.value = value
+            context.cleaned = window.get_val(-1)
+            context.mean, context.std, context.min, context.max = stats.mean(), stats.std(), stats.min(), stats.max()
+            context.UL, context.LL = profile.UL, profile.LL
+            context.target, context.const_err, context.in_control = self.target, const_err, in_control
+            self.alarms = detectors.evaluate(context)
+            if timer:
+                timer.lap("detectors")
+        if self.metrics is not None:
+            self.metrics.verdict(const_err, in_control, clipped, len(self.alarms))
+        return const_err, in_control
+
+
+    def start_timer(self):
+        """
+        Count a new reading in the stream's metrics, before any work is done on it.
+
+        Returns:
+            SensorMetrics: The metrics to time the reading's stages with, or None if
+                           instrumentation is off or the reading is not sampled.
+        """
+        self.timer = self.metrics.start() if self.metrics is not None else None
+        return self.timer
+
+
+    def get_state(self):
+        """
+        Get everything the pipeline needs to carry on where it is, in a JSON serialisable form.
+
+        Returns:
+            dict: The windows, last changed value, last EMA, target, counters, the
+                  state of the extra detectors and the running sums of the window statistics.
+        """
+        return {
+            "win_size": self.window.size,
+            "window": [[float(r.value), r.time_stamp, r.sensor_type, r.unit_of_measurement]
+                       for r in self.window.as_list()],
+            "CT_plus": [float(v) for v in self.CT_plus_win.as_list()],
+            "CT_min": [float(v) for v in self.CT_min_win.as_list()],
+            "last_changed": [float(self.last_changed[0]), int(self.last_changed[1])],
+            "last_EMA": float(self.last_EMA),
+            "target": None if self.target is None else float(self.target),
+            "first_window": self.first_window,
+            "num_reads": self.num_reads,
+            "num_clipped": self.num_clipped,
+            "detectors": self.detectors.get_state() if self.detectors is not None else {},
+            "stats": [window.stats.get_state() for window in (self.window, self.CT_plus_win, self.CT_min_win)],
+        }
+
+
+    def set_state(self, state):
+        """
+        Carry on from a state returned by get_state, replacing the current state.
+
+        Args:
+            state (dict): The saved state.
+
+        Returns:
+            None
+        """
+        self._make_windows(state["win_size"])
+        self.profile = None
+        for value, time_stamp, sensor_type, unit in state["window"]:
+            self.window.add_reading(DataPoint(value, time_stamp, sensor_type, unit))
+        if self.window.length:
+            self._use_profile(self.registry.get(self.window.get_sensor_type()))
+        for value in state["CT_plus"]:
+            self.CT_plus_win.add_reading(value)
+        for value in state["CT_min"]:
+            self.CT_min_win.add_reading(value)
+        # the running sums, so the statistics round exactly as they would have without the restart
+        for window, stats in zip((self.window, self.CT_plus_win, self.CT_min_win), state.get("stats", [])):
+            window.stats.set_state(stats)
+        self.last_changed = list(state["last_changed"])
+        self.last_EMA = state["last_EMA"]
+        self.target = state["target"]
+        self.first_window = state["first_window"]
+        self.num_reads = state["num_reads"]
+        self.num_clipped = state.get("num_clipped", 0)
+        if self.detectors is not None:
+            self.detectors.set_state(state.get("detectors", {}))
+
+
+    def latest_time(self):
+        """
+        Get the timestamp of the newest reading in the window.
+
+        Returns:
+            str: The timestamp of the newest reading.
+        """
+        return self.window.get_latest().time_stamp
+
+
+    def _use_profile(self, profile):
+        # the windows can only change size before the first reading
+        if self.window.length == 0 and profile.win_size != self.window.size:
+            self._make_windows(profile.win_size)
+        # detectors keep their state across a reload that leaves their settings alone
+        if profile.detectors != (self.detectors.settings if self.detectors is not None else {}):
+            self.detectors = make_engine(profile.detectors, self.name)
+        # alarms of a dropped engine must not be reported again
+        if self.detectors is None:
+            self.alarms = []
+        self.profile = profile
+        self.profile_version = self.registry.version
+
+
+    def _make_windows(self, win_size):
+        self.window = SlidingWindow(win_size, stats=True)
+        self.CT_plus_win = SlidingWindow(win_size, stats=True)
+        self.CT_min_win = SlidingWindow(win_size, stats=True)
+        self.median_filter = None
@@ -3,8 +3,10 @@ Module containing all functions needed to Preprocess the data:
     is_const_err(window_vals, limit)
     med_filter(window, med_window)
     range_check(window, UL, LL, all_vals)
+    clip_outliers(vals, UL, LL), in_range_mean(vals, UL, LL)
 """
-from statistics import median, mean
+from statistics import median
+import numpy as np
 from numpy import nan
 from pandas import isna
 
@@ -19,6 +21,15 @@ def is_null(datapoint):
         bool: 
             - True if the value or timestamp is None, NaN, or invalid.
             - False if both the value and timestamp are valid.
+
+    Examples:
+        >>> from data_point import DataPoint
+        >>> is_null(DataPoint(25.0, None, "SSTEMP_sensor", "C"))
+        True
+        >>> is_null(DataPoint(25.0, nan, "SSTEMP_sensor", "C"))
+        True
+        >>> is_null(DataPoint(25.0, "2024-09-12 01:04:03", "SSTEMP_sensor", "C"))
+        False
     """
     #check values
     val = datapoint.value
@@ -63,12 +74,12 @@ def med_filter(window, med_window):
     Returns:
         None
     """
-    window_vals = window.get_win_vals()
-    med_arr = window_vals[:med_window]
+    med_arr = window.get_win_vals()[:med_window].tolist()
     mid = med_window // 2
+    med_val = median(med_arr)
 
-    if (med_arr[mid] != median(med_arr)):
-        window.change_val(mid, median(med_arr))
+    if (med_arr[mid] != med_val):
+        window.change_val(mid, med_val)
 
 
 
@@ -76,6 +87,9 @@ def range_check(window, UL, LL, all_vals):
     """
     Check if values in the window are within a specified range and adjust if necessary.
 
+    Out-of-range values are replaced by the mean of the in-range values they are
+    checked against; if there are none, they are left as they are.
+
     Args:
         window (SlidingWindow): The sliding window object containing sensor readings.
         UL (float): The upper limit for acceptable values.
@@ -83,19 +97,68 @@ def range_check(window, UL, LL, all_vals):
         all_vals (bool): Whether to check and adjust all values or only the latest one.
 
     Returns:
-        None
+        int: The number of values replaced.
     """
     window_vals = window.get_win_vals()
     if all_vals:
-        for i in range(window.size):
-            if (window_vals[i] > UL) or (window_vals[i] < LL):
-                temp = window_vals[:i] + window_vals[i+1:]
-                window.change_val(i, mean(temp))
-    else:
-        if (window_vals[-1] > UL) or (window_vals[-1] < LL):
-            window_vals.pop()
-            window.change_val(-1, mean(window_vals))
-            
+        cleaned, clipped = clip_outliers(window_vals, UL, LL)
+        if clipped:
+            for i in np.flatnonzero(cleaned != window_vals):
+                window.change_val(int(i), float(cleaned[i]))
+        return clipped
+
+    latest = window_vals[-1]
+    if LL <= latest <= UL:
+        return 0
+    replacement = in_range_mean(window_vals[:-1], UL, LL)
+    if replacement is None:
+        return 0
+    window.change_val(-1, replacement)
+    return 1
+
+
+def clip_outliers(vals, UL, LL):
+    """
+    Replace every out-of-range value of an array at once with the mean of its
+    in-range values, found from a single masked sum and count.
+
+    Args:
+        vals (ndarray): The values, of a window or a whole series.
+        UL (float): The upper limit for acceptable values.
+        LL (float): The lower limit for acceptable values.
+
+    Returns:
+        tuple: (cleaned, clipped) where cleaned is a copy of the values with the
+               replacements made and clipped is the number of values replaced
+               (0 if none was in range).
+    """
+    vals = np.array(vals, dtype=np.float64)
+    in_range = (vals <= UL) & (vals >= LL)
+    count = int(np.count_nonzero(in_range))
+    if count in (0, len(vals)):
+        return vals, 0
+    vals[~in_range] = vals[in_range].sum() / count
+    return vals, len(vals) - count
+
+
+def in_range_mean(vals, UL, LL):
+    """
+    Get the mean of the in-range values of an array.
+
+    Args:
+        vals (ndarray): The values.
+        UL (float): The upper limit for acceptable values.
+        LL (float): The lower limit for acceptable values.
+
+    Returns:
+        float: The mean, or None if no value is in range.
+    """
+    vals = np.asarray(vals, dtype=np.float64)
+    in_range = vals[(vals <= UL) & (vals >= LL)]
+    if not len(in_range):
+        return None
+    return float(in_range.sum() / len(in_range))
+
 
 
 def main():
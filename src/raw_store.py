@@ -0,0 +1,361 @@
+"""
+Module containing the time-partitioned store of live raw readings:
+    SegmentLog(directory, granularity, retention, max_rows, max_delay, fsync_interval)
+    RawStore(root, granularity, retention)
+    get_raw_store()
+
+Every sensor type gets a directory of append-only segment files, one per
+hour or day of reading time (eg ../data/raw/SSTEMP_sensor/2024-09-12.csv),
+in the CSV layout of the other raw files; a reading without a valid time
+goes to the open segment. The open segment keeps its file
+handle, rows are written in batches and fsynced at most every
+fsync_interval seconds, and segments older than the retention period are
+deleted when a new segment starts. A time range query only opens the
+segments that overlap it.
+"""
+import atexit
+import calendar
+import csv
+import os
+import threading
+import time
+from data_point import DataPoint, to_epoch
+
+HEADER = ['State', 'Time', 'Device', 'Unit']
+GRANULARITIES = {
+    "hour": (3600, "%Y-%m-%dT%H"),
+    "day": (86400, "%Y-%m-%d"),
+}
+
+
+class SegmentLog:
+    """
+    The append-only segment files of one sensor.
+
+    Attributes:
+        directory (str): The directory holding the segment files.
+        span (int): The seconds of reading time covered by a segment.
+        name_format (str): The strftime layout of segment file names.
+        retention (float): The seconds of reading time kept before the newest segment, None to keep all.
+        max_rows (int): The number of buffered rows that triggers a write.
+        max_delay (float): The seconds since the last write that trigger a write.
+        fsync_interval (float): The least number of seconds between fsyncs of the open segment.
+        segment (int): The start epoch of the open segment, None if no segment is open.
+        file (file): The open segment file.
+        rows (list): The rows waiting to be written to the open segment.
+    """
+
+    def __init__(self, directory, granularity="day", retention=None, max_rows=1000, max_delay=5.0,
+                 fsync_interval=5.0):
+        """
+        Initialize the log of a sensor, creating its directory if needed.
+
+        Args:
+            directory (str): The directory holding the segment files.
+            granularity (str): "hour" or "day" segments. Default is "day".
+            retention (float): The seconds of reading time to keep. Default is None (keep all).
+            max_rows (int): The number of buffered rows that triggers a write. Default is 1000.
+            max_delay (float): The seconds since the last write that trigger a write. Default is 5.0.
+            fsync_interval (float): The least number of seconds between fsyncs. Default is 5.0.
+        """
+        self.directory = directory
+        self.span, self.name_format = GRANULARITIES[granularity]
+        self.retention = retention
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.fsync_interval = fsync_interval
+        self.segment = None
+        self.file = None
+        self.csv_writer = None
+        self.rows = []
+        self.last_write = self.last_sync = time.monotonic()
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+
+    def append(self, epoch, row):
+        """
+        Append a row to the segment of its reading time.
+
+        Args:
+            epoch (int): The reading time in epoch seconds, None if it is invalid.
+            row (list): The [State, Time, Device, Unit] row.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if epoch is None:
+                # readings without a valid time stay with their neighbours
+                epoch = self.segment if self.segment is not None else int(time.time())
+            segment = epoch - epoch % self.span
+            if segment != self.segment:
+                self._open(segment)
+            self.rows.append(row)
+            if len(self.rows) >= self.max_rows or time.monotonic() - self.last_write >= self.max_delay:
+                self._write()
+
+
+    def flush(self):
+        """
+        Write the buffered rows and fsync the open segment.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self._write(sync=True)
+
+
+    def close(self):
+        """
+        Write the buffered rows, fsync and close the open segment.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self._close()
+
+
+    def segments(self, start=None, end=None):
+        """
+        List the segment files holding readings in [start, end).
+
+        Args:
+            start (int): The first epoch to include. Default is None (from the oldest).
+            end (int): The first epoch to exclude. Default is None (to the newest).
+
+        Returns:
+            list: (segment start epoch, file path) pairs, oldest first.
+        """
+        found = []
+        for file_name in os.listdir(self.directory):
+            segment = self._segment_of(file_name)
+            if segment is None:
+                continue
+            if (start is None or segment + self.span > start) and (end is None or segment < end):
+                found.append((segment, os.path.join(self.directory, file_name)))
+        return sorted(found)
+
+
+    def query(self, start=None, end=None):
+        """
+        Read the readings whose time falls in [start, end), opening only the
+        segments that overlap the range.
+
+        Args:
+            start (int): The first epoch to include. Default is None (from the oldest).
+            end (int): The first epoch to exclude. Default is None (to the newest).
+
+        Yields:
+            DataPoint: The readings in the range, in segment and then file order.
+        """
+        # make rows still buffered for the open segment visible
+        self.flush()
+        for segment, file_path in self.segments(start, end):
+            inside = (start is None or segment >= start) and (end is None or segment + self.span <= end)
+            with open(file_path, newline='') as file:
+                csv_reader = csv.reader(file)
+                next(csv_reader, None)
+                for state, time_stamp, device, unit, *_ in csv_reader:
+                    reading = DataPoint(float(state), time_stamp, device, unit)
+                    if not inside:
+                        epoch = reading.epoch
+                        if epoch is None or (start is not None and epoch < start) or (end is not None and epoch >= end):
+                            continue
+                    yield reading
+
+
+    def _open(self, segment):
+        self._close()
+        file_path = os.path.join(self.directory, time.strftime(self.name_format, time.gmtime(segment)) + ".csv")
+        new_file = not os.path.exists(file_path)
+        self.segment = segment
+        self.file = open(file_path, mode='a', newline='')
+        self.csv_writer = csv.writer(self.file)
+        if new_file:
+            self.rows.append(HEADER)
+            self._expire(segment)
+
+
+    def _write(self, sync=False):
+        if self.file is None:
+            return
+        if self.rows:
+            self.csv_writer.writerows(self.rows)
+            self.rows = []
+        self.file.flush()
+        self.last_write = time.monotonic()
+        if sync or self.last_write - self.last_sync >= self.fsync_interval:
+            os.fsync(self.file.fileno())
+            self.last_sync = self.last_write
+
+
+    def _close(self):
+        if self.file is None:
+            return
+        self._write(sync=True)
+        self.file.close()
+        self.file = self.csv_writer = self.segment = None
+
+
+    def _expire(self, newest):
+        if self.retention is None:
+            return
+        for segment, file_path in self.segments(end=newest - self.retention - self.span + 1):
+            os.remove(file_path)
+
+
+    def _segment_of(self, file_name):
+        stem, extension = os.path.splitext(file_name)
+        if extension != ".csv":
+            return None
+        try:
+            return calendar.timegm(time.strptime(stem, self.name_format))
+        except ValueError:
+            return None
+
+
+class RawStore:
+    """
+    The segment logs of every sensor type under a root directory.
+
+    Attributes:
+        root (str): The directory holding a subdirectory per sensor type.
+        granularity (str): "hour" or "day" segments.
+        retention (float): The seconds of reading time to keep, None to keep all.
+        logs (dict): The SegmentLog of every sensor type written to or queried, by type.
+    """
+
+    def __init__(self, root="../data/raw", granularity="day", retention=None):
+        """
+        Initialize the store.
+
+        Args:
+            root (str): The directory holding a subdirectory per sensor type. Default is ../data/raw.
+            granularity (str): "hour" or "day" segments. Default is "day".
+            retention (float): The seconds of reading time to keep. Default is None (keep all).
+
+        Raises:
+            ValueError: If the granularity is not "hour" or "day".
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"segment granularity must be one of {', '.join(GRANULARITIES)}")
+        self.root = root
+        self.granularity = granularity
+        self.retention = retention
+        self.logs = {}
+        self.lock = threading.Lock()
+
+
+    def log(self, sensor_type):
+        """
+        Get the segment log of a sensor type, creating it if needed.
+
+        Args:
+            sensor_type (str): The sensor type.
+
+        Returns:
+            SegmentLog: The log.
+        """
+        with self.lock:
+            log = self.logs.get(sensor_type)
+            if log is None:
+                directory = os.path.join(self.root, sensor_type.replace(os.sep, "_"))
+                log = self.logs[sensor_type] = SegmentLog(directory, self.granularity, self.retention)
+            return log
+
+
+    def append(self, reading):
+        """
+        Append a raw reading to its sensor's log.
+
+        Args:
+            reading (DataPoint): The reading, before any cleaning.
+
+        Returns:
+            None
+        """
+        self.log(reading.sensor_type).append(reading.epoch, [
+            reading.get_val(), reading.get_time(), reading.sensor_type, reading.unit_of_measurement])
+
+
+    def append_rows(self, sensor_type, rows):
+        """
+        Append already formatted raw rows to a sensor's log.
+
+        Args:
+            sensor_type (str): The sensor type.
+            rows (iterable): (epoch, [State, Time, Device, Unit]) pairs.
+
+        Returns:
+            None
+        """
+        log = self.log(sensor_type)
+        for epoch, row in rows:
+            log.append(epoch, row)
+
+
+    def query(self, sensor_type, start=None, end=None):
+        """
+        Read a sensor's raw readings whose time falls in [start, end).
+
+        Args:
+            sensor_type (str): The sensor type.
+            start (int | str): The first time to include, as epoch seconds or a timestamp.
+            end (int | str): The first time to exclude, as epoch seconds or a timestamp.
+
+        Yields:
+            DataPoint: The readings in the range.
+        """
+        start = to_epoch(start) if isinstance(start, str) else start
+        end = to_epoch(end) if isinstance(end, str) else end
+        yield from self.log(sensor_type).query(start, end)
+
+
+    def flush(self):
+        """
+        Write and fsync every log's buffered rows.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            logs = list(self.logs.values())
+        for log in logs:
+            log.flush()
+
+
+    def close(self):
+        """
+        Write, fsync and close every log's open segment.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            logs = list(self.logs.values())
+        for log in logs:
+            log.close()
+
+
+_store = None
+
+
+def get_raw_store():
+    """
+    Get the process wide raw store, created on first use from $RAW_DIR
+    (default ../data/raw), $RAW_SEGMENT ("hour" or "day", default "day") and
+    $RAW_RETENTION_DAYS (default: keep everything). It is closed at exit.
+
+    Returns:
+        RawStore: The store.
+    """
+    global _store
+    if _store is None:
+        retention_days = os.getenv("RAW_RETENTION_DAYS")
+        _store = RawStore(os.getenv("RAW_DIR", "../data/raw"), os.getenv("RAW_SEGMENT", "day"),
+                          float(retention_days) * 86400 if retention_days else None)
+        atexit.register(_store.close)
+    return _store
@@ -0,0 +1,404 @@
+"""
+Load generator replaying recorded raw sensor CSV files as live MQTT messages:
+    to_payload(state, last_changed, device_class, unit)
+    load_recording(file_path, limit)
+    build_messages(recordings, num_sensors, prefix)
+    Pacer(speed)
+    replay_async(messages, speed, max_queue)
+    replay_threaded(messages, speed, max_queue, put_timeout)
+    replay_broker(messages, broker_address, broker_port, speed)
+
+Every row of a raw_*.csv file becomes the Home Assistant state message the
+MQTT clients decode ({"state": ..., "data": {"device_class": ...,
+"unit_of_measurement": ..., "last_changed": ...}}), with the State column
+sent as recorded, so empty or invalid states reach the decoder as they
+would live. Rows whose time cannot be parsed cannot be scheduled and are
+left out.
+
+A recording is fanned out to N synthetic sensors, one topic each
+(<prefix>/<file>/sensor<i>). All of them follow the recorded timestamps,
+sensor i starting i/N of the way into the recorded values so the streams
+differ. The messages are published at the recorded pace times a speed
+multiplier, or as fast as possible, to:
+    async     - the asyncio runtime through an InProcessBroker
+    threaded  - MQTTClient.on_message on a network thread, the pipelines on
+                the main thread, as mqtt mode runs
+    broker    - a real MQTT broker ($MQTT_BROKER, $MQTT_PORT), for a
+                separately started `main.py mqtt` or `main.py async`
+
+The report gives the messages sent, handed to a pipeline, failed to decode,
+dropped on full queues and lost without trace, how far the publisher fell behind the
+schedule, and the readings processed per second:
+
+    python replay.py ../data/raw_SSTEMP.csv --sensors 10 --speed 100
+    python replay.py ../data/raw_SSTEMP.csv ../data/raw_HUM.csv --speed max --target threaded
+    python replay.py ../data/raw_SSTEMP.csv --target broker --prefix homeassistant/sensor
+
+In-process output files are written under a temporary directory; ../data is not touched.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import pandas as pd
+import paho.mqtt.client as mqtt
+from dotenv import load_dotenv
+
+from async_runtime import AsyncRuntime, InProcessBroker
+from batch_engine import to_epochs
+from csv_writer import close_all
+from main import process_live_reading
+from mqtt_client import MQTTClient
+from sliding_window import NAT_EPOCH
+
+TARGETS = ("async", "threaded", "broker")
+LAST_CHANGED_FORMAT = "%Y-%m-%dT%H:%M:%S+00:00"
+YIELD_EVERY = 256   # messages published between event loop yields when not paced
+
+
+def to_payload(state, last_changed, device_class, unit):
+    """
+    Build the JSON payload of a Home Assistant state message.
+
+    Args:
+        state (str): The sensor state, as Home Assistant sends it.
+        last_changed (str): The ISO 8601 time of the reading.
+        device_class (str): The sensor type.
+        unit (str): The unit of measurement.
+
+    Returns:
+        bytes: The encoded payload.
+    """
+    return json.dumps({
+        "state": state,
+        "data": {
+            "device_class": device_class,
+            "unit_of_measurement": unit,
+            "last_changed": last_changed,
+        },
+    }).encode()
+
+
+def load_recording(file_path, limit=None):
+    """
+    Read the rows of a raw CSV file that can be replayed.
+
+    Args:
+        file_path (str): The path of the raw CSV file.
+        limit (int): The most rows to read. Default is None (all of them).
+
+    Returns:
+        DataFrame: The State, Device and Unit columns as recorded, and the epoch
+                   time of every row with a valid time, in file order.
+    """
+    frame = pd.read_csv(file_path, header=0, usecols=[0, 1, 2, 3], names=['State', 'Time', 'Device', 'Unit'],
+                        dtype=str, keep_default_na=False, nrows=limit)
+    epochs = to_epochs(frame['Time'])
+    frame = frame[epochs != NAT_EPOCH].drop(columns='Time')
+    frame['Epoch'] = epochs[epochs != NAT_EPOCH]
+    return frame.reset_index(drop=True)
+
+
+def build_messages(recordings, num_sensors=1, prefix="replay"):
+    """
+    Build the messages of a replay: every recording fanned out to num_sensors
+    topics, each recording starting at offset 0.
+
+    Args:
+        recordings (dict): The frame from load_recording of every recording, by name.
+        num_sensors (int): The number of synthetic sensors per recording. Default is 1.
+        prefix (str): The first level of every topic. Default is "replay".
+
+    Returns:
+        list: (offset, topic, payload) in publish order, where offset is the seconds
+              after the start of the replay the message was recorded at.
+    """
+    messages = []
+    for name, frame in recordings.items():
+        count = len(frame)
+        if not count:
+            continue
+        epochs = frame['Epoch'].to_numpy()
+        offsets = (epochs - epochs[0]).tolist()
+        last_changed = pd.to_datetime(epochs, unit="s").strftime(LAST_CHANGED_FORMAT).tolist()
+        states = frame['State'].tolist()
+        devices = frame['Device'].tolist()
+        units = frame['Unit'].tolist()
+        for sensor in range(num_sensors):
+            topic = f"{prefix}/{name}/sensor{sensor}"
+            shift = sensor * count // num_sensors
+            for row in range(count):
+                source = (row + shift) % count
+                messages.append((offsets[row], topic,
+                                 to_payload(states[source], last_changed[row], devices[source], units[source])))
+    # stable, so the rows of a sensor stay in file order
+    messages.sort(key=lambda message: message[0])
+    return messages
+
+
+class Pacer:
+    """
+    Keeps a publisher on the recorded schedule of a replay, sped up.
+
+    Attributes:
+        speed (float): The speed multiplier, None to publish as fast as possible.
+        start (float): The perf_counter time the replay started at.
+        behind (float): The most seconds a message was published after it was due.
+    """
+
+    def __init__(self, speed=None):
+        """
+        Start the replay clock.
+
+        Args:
+            speed (float): The speed multiplier. Default is None (as fast as possible).
+        """
+        self.speed = speed
+        self.start = time.perf_counter()
+        self.behind = 0.0
+
+
+    def delay(self, offset):
+        """
+        Get how long to wait before publishing a message.
+
+        Args:
+            offset (float): The recorded seconds after the start of the message.
+
+        Returns:
+            float: The seconds until the message is due, 0 if it is already due.
+        """
+        if self.speed is None:
+            return 0.0
+        late = time.perf_counter() - self.start - offset / self.speed
+        if late >= 0:
+            self.behind = max(self.behind, late)
+            return 0.0
+        return -late
+
+
+def _report(sent, processed, decode_errors, dropped, elapsed, behind):
+    return {
+        "sent": sent,
+        "processed": processed,
+        "decode_errors": decode_errors,
+        "dropped": dropped,
+        "lost": sent - processed - decode_errors - dropped,
+        "elapsed_s": elapsed,
+        "behind_s": behind,
+        "readings_per_s": processed / elapsed if elapsed else 0.0,
+    }
+
+
+def replay_async(messages, speed=None, max_queue=1000):
+    """
+    Replay messages through the asyncio runtime from an in-process broker.
+
+    Args:
+        messages (list): (offset, topic, payload) from build_messages.
+        speed (float): The speed multiplier. Default is None (as fast as possible).
+        max_queue (int): The maximum number of readings queued per sensor. Default is 1000.
+
+    Returns:
+        dict: The replay report. Dropped readings were decoded, then found their
+              sensor's queue full.
+    """
+    async def replay():
+        broker = InProcessBroker()
+        runtime = AsyncRuntime(broker, ["#"], max_queue=max_queue)
+        task = asyncio.create_task(runtime.run())
+        await asyncio.sleep(0)
+
+        pacer = Pacer(speed)
+        for i, (offset, topic, payload) in enumerate(messages):
+            delay = pacer.delay(offset)
+            if delay:
+                await asyncio.sleep(delay)
+            elif i % YIELD_EVERY == 0:
+                # let the sensor workers run, as a socket read would
+                await asyncio.sleep(0)
+            broker.publish(topic, payload)
+        runtime.stop()
+        await task
+        return runtime, time.perf_counter() - pacer.start, pacer.behind
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        runtime, elapsed, behind = asyncio.run(replay())
+    close_all()
+    return _report(len(messages), runtime.received - runtime.dropped, runtime.decode_errors, runtime.dropped, elapsed, behind)
+
+
+def replay_threaded(messages, speed=None, max_queue=10_000, put_timeout=0.5):
+    """
+    Replay messages through MQTTClient.on_message on a network thread while the
+    main thread runs the pipelines, as mqtt mode does.
+
+    Args:
+        messages (list): (offset, topic, payload) from build_messages.
+        speed (float): The speed multiplier. Default is None (as fast as possible).
+        max_queue (int): The maximum number of queued messages. Default is 10 000.
+        put_timeout (float): The seconds to wait for queue space before dropping. Default is 0.5.
+
+    Returns:
+        dict: The replay report. Dropped messages found the client queue full
+              for put_timeout seconds.
+    """
+    client = MQTTClient("localhost", 1883, ["#"], max_queue=max_queue, put_timeout=put_timeout)
+    pipelines = {}
+    pacer = Pacer(speed)
+
+    def network():
+        for offset, topic, payload in messages:
+            delay = pacer.delay(offset)
+            if delay:
+                time.sleep(delay)
+            client.on_message(client.client, None, SimpleNamespace(topic=topic, payload=payload))
+
+    producer = threading.Thread(target=network)
+    producer.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        while producer.is_alive() or client.has_readings():
+            raw_reading = client.get_reading(timeout=0.1)
+            if raw_reading is not None:
+                process_live_reading(pipelines, raw_reading)
+    producer.join()
+    elapsed = time.perf_counter() - pacer.start
+    close_all()
+    return _report(len(messages), client.received, client.decode_errors, client.dropped, elapsed, pacer.behind)
+
+
+def replay_broker(messages, broker_address, broker_port, speed=None, qos=0):
+    """
+    Publish messages to an MQTT broker. What the subscribers received and dropped
+    is reported by them, so this report only covers the publishing side.
+
+    Args:
+        messages (list): (offset, topic, payload) from build_messages.
+        broker_address (str): The address of the MQTT broker.
+        broker_port (int): The port of the MQTT broker.
+        speed (float): The speed multiplier. Default is None (as fast as possible).
+        qos (int): The MQTT quality of service of every message. Default is 0.
+
+    Returns:
+        dict: The messages sent and refused by the client, the publish rate and
+              how far the publisher fell behind the schedule.
+    """
+    client = mqtt.Client()
+    client.connect(broker_address, broker_port)
+    client.loop_start()
+    failed = 0
+    info = None
+    pacer = Pacer(speed)
+    try:
+        for offset, topic, payload in messages:
+            delay = pacer.delay(offset)
+            if delay:
+                time.sleep(delay)
+            info = client.publish(topic, payload, qos=qos)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                failed += 1
+        if info is not None and info.rc == mqtt.MQTT_ERR_SUCCESS:
+            info.wait_for_publish(timeout=10)
+    finally:
+        elapsed = time.perf_counter() - pacer.start
+        client.loop_stop()
+        client.disconnect()
+    sent = len(messages) - failed
+    return {
+        "sent": sent,
+        "failed": failed,
+        "elapsed_s": elapsed,
+        "behind_s": pacer.behind,
+        "messages_per_s": sent / elapsed if elapsed else 0.0,
+    }
+
+
+def speed_arg(text):
+    """
+    Returns:
+        float: The speed multiplier of a --speed argument, None for "max" or 0.
+    """
+    if text == "max":
+        return None
+    speed = float(text)
+    if speed < 0:
+        raise argparse.ArgumentTypeError("speed must be positive, 0 or max")
+    return speed or None
+
+
+def recording_name(file_path):
+    """
+    Returns:
+        str: The topic level of a raw CSV file, "SSTEMP" for raw_SSTEMP.csv.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return name[len("raw_"):] if name.startswith("raw_") else name
+
+
+def main():
+    """
+    Run a replay from the command line.
+
+    Returns:
+        int: 1 if any message was lost, otherwise 0.
+    """
+    args = argparse.ArgumentParser(description="Replay recorded raw sensor CSV files as MQTT messages.")
+    args.add_argument("files", nargs="+", help="raw CSV files to replay")
+    args.add_argument("--sensors", type=int, default=1, help="synthetic sensors per file (default 1)")
+    args.add_argument("--speed", type=speed_arg, default=None,
+                      help="speed multiplier of the recorded pace, e.g. 1 or 100; max or 0 for as fast as possible")
+    args.add_argument("--target", choices=TARGETS, default="async", help="where to publish (default async)")
+    args.add_argument("--limit", type=int, help="replay at most this many rows per file")
+    args.add_argument("--prefix", default="replay", help="first level of every topic (default replay)")
+    args.add_argument("--max-queue", type=int, help="queue bound of the in-process runtime")
+    args.add_argument("--put-timeout", type=float, default=0.5,
+                      help="seconds the threaded client waits for queue space before dropping (default 0.5)")
+    args.add_argument("--qos", type=int, choices=(0, 1, 2), default=0, help="MQTT QoS of broker messages")
+    args.add_argument("--out", help="write the report to this JSON file")
+    args = args.parse_args()
+
+    recordings = {recording_name(file_path): load_recording(file_path, args.limit) for file_path in args.files}
+    messages = build_messages(recordings, args.sensors, args.prefix)
+    duration = messages[-1][0] if messages else 0
+    print(f"Replaying {len(messages)} messages from {len(recordings) * args.sensors} sensors, "
+          f"{duration}s recorded, at {'max' if args.speed is None else f'{args.speed:g}x'} speed "
+          f"to {args.target}...")
+
+    if args.target == "broker":
+        load_dotenv()
+        report = replay_broker(messages, os.getenv("MQTT_BROKER"), int(os.getenv("MQTT_PORT")), args.speed, args.qos)
+    else:
+        cwd = os.getcwd()
+        # outputs go to ../data relative to the cwd, so run inside a scratch tree
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.makedirs(os.path.join(work_dir, "src"))
+            os.makedirs(os.path.join(work_dir, "data"))
+            os.chdir(os.path.join(work_dir, "src"))
+            try:
+                if args.target == "async":
+                    report = replay_async(messages, args.speed, args.max_queue or 1000)
+                else:
+                    report = replay_threaded(messages, args.speed, args.max_queue or 10_000, args.put_timeout)
+            finally:
+                os.chdir(cwd)
+
+    for name, value in report.items():
+        print(f"{name:<20}{value:>14.4g}" if isinstance(value, float) else f"{name:<20}{value:>14}")
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump({"files": args.files, "sensors": args.sensors, "speed": args.speed,
+                       "target": args.target, "report": report}, file, indent=2)
+        print(f"Report written to {args.out}")
+    return 1 if report.get("lost") else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
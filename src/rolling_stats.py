@@ -0,0 +1,310 @@
+from collections import deque
+from math import sqrt, nan
+from sys import float_info
+
+RESYNC_EVERY = 256      # pushes between exact recomputations of every statistic
+MAX_REL_ERR = 1e-10     # largest estimated relative rounding error of the running sums
+
+
+class RollingStats:
+    """
+    Running statistics of the values held in a SlidingWindow.
+
+    The statistics are updated in O(1) as readings slide in and out or are
+    changed in place: a Welford running mean and sum of squared differences
+    give the standard deviation, and monotonic deques of (seq, key) pairs give
+    the min and max. The newest reading is kept out of the deques until the
+    next one arrives, since the pipeline changes it (range check, EMA) before
+    the statistics are read.
+
+    Removing values from running sums loses precision when a large value
+    leaves a window of nearly equal values, so a bound on the rounding error
+    is kept alongside each sum and the sum is recomputed from the window when
+    the bound gets too large relative to it.
+
+    Attributes:
+        window (SlidingWindow): The window the statistics describe.
+        count (int): The number of values in the window.
+        mean_val (float): The running mean of the values.
+        m2 (float): The running sum of squared differences from the mean.
+        total (float): The running sum of the values.
+        m2_err (float): A bound on the rounding error in m2.
+        total_err (float): A bound on the rounding error in total.
+        nonzero (int): The number of non-zero values, so an all zero window sums to exactly 0.
+        updates (int): The pushes since the last exact recomputation.
+        max_deque (deque): (seq, value) pairs of candidate maxima, oldest first.
+        min_deque (deque): (seq, -value) pairs of candidate minima, oldest first.
+        pending (list): [seq, value] of the newest reading, not yet in the deques.
+        first_seq (int): The sequence number of the oldest value in the window.
+        next_seq (int): The sequence number of the next value pushed.
+    """
+
+    def __init__(self, window):
+        """
+        Initialize empty statistics for a window.
+
+        Args:
+            window (SlidingWindow): The window the statistics describe.
+        """
+        self.window = window
+        self.rebuild()
+
+
+    def push(self, value):
+        """
+        Add a new newest value.
+
+        Args:
+            value (float): The value added to the window.
+
+        Returns:
+            None
+        """
+        if self.pending is not None:
+            self._commit(*self.pending)
+        self.pending = [self.next_seq, value]
+        self.next_seq += 1
+
+        self.count += 1
+        delta = value - self.mean_val
+        self.mean_val += delta / self.count
+        self._add_m2(delta * (value - self.mean_val))
+        self._add_total(value)
+        self.nonzero += value != 0
+
+        self.updates += 1
+        if self.updates >= RESYNC_EVERY:
+            self.rebuild()
+
+
+    def pop(self, value):
+        """
+        Remove the oldest value.
+
+        Args:
+            value (float): The value removed from the window.
+
+        Returns:
+            None
+        """
+        seq = self.first_seq
+        self.first_seq += 1
+        if self.max_deque and self.max_deque[0][0] == seq:
+            self.max_deque.popleft()
+        if self.min_deque and self.min_deque[0][0] == seq:
+            self.min_deque.popleft()
+        if self.pending is not None and self.pending[0] == seq:
+            self.pending = None
+
+        self.count -= 1
+        if self.count == 0:
+            self._resync_sums()
+            return
+        delta = value - self.mean_val
+        self.mean_val -= delta / self.count
+        self._add_m2(-delta * (value - self.mean_val))
+        self._add_total(-value)
+        self.nonzero -= value != 0
+
+
+    def replace(self, idx, old_val, new_val):
+        """
+        Change the value at a window index.
+
+        Args:
+            idx (int): The (non-negative) index of the changed value.
+            old_val (float): The value before the change.
+            new_val (float): The value after the change.
+
+        Returns:
+            None
+        """
+        old_mean = self.mean_val
+        self.mean_val += (new_val - old_val) / self.count
+        self._add_m2((new_val - old_val) * (new_val - self.mean_val + old_val - old_mean))
+        self._add_total(new_val - old_val)
+        self.nonzero += (new_val != 0) - (old_val != 0)
+
+        seq = self.first_seq + idx
+        if self.pending is not None and self.pending[0] == seq:
+            self.pending[1] = new_val
+            return
+        if not (self._repair(self.max_deque, seq, old_val, new_val)
+                and self._repair(self.min_deque, seq, -old_val, -new_val)):
+            self.rebuild()
+
+
+    def rebuild(self):
+        """
+        Recompute every statistic exactly from the window values.
+
+        Returns:
+            None
+        """
+        vals = self._resync_sums()
+        self.first_seq = 0
+        self.next_seq = self.count
+        self.updates = 0
+        self.max_deque = deque()
+        self.min_deque = deque()
+        self.pending = None
+
+        for seq, value in enumerate(vals[:-1]):
+            self._commit(seq, value)
+        if vals:
+            self.pending = [self.count - 1, vals[-1]]
+
+
+    def get_state(self):
+        """
+        Get the running sums, which carry the rounding of every update since the
+        last exact recomputation; everything else is rebuilt from the window.
+
+        Returns:
+            dict: The running mean, m2, total, their error bounds and the update count.
+        """
+        return {"mean": self.mean_val, "m2": self.m2, "total": self.total,
+                "m2_err": self.m2_err, "total_err": self.total_err, "updates": self.updates}
+
+
+    def set_state(self, state):
+        """
+        Carry on from running sums returned by get_state, for a window that holds
+        the same values again.
+
+        Args:
+            state (dict): The saved running sums.
+
+        Returns:
+            None
+        """
+        self.mean_val, self.m2, self.total = state["mean"], state["m2"], state["total"]
+        self.m2_err, self.total_err, self.updates = state["m2_err"], state["total_err"], state["updates"]
+
+
+    def mean(self):
+        """
+        Returns:
+            float: The mean of the window values.
+        """
+        return self.mean_val if self.count else nan
+
+
+    def std(self):
+        """
+        Returns:
+            float: The population standard deviation of the window values.
+        """
+        if not self.count:
+            return nan
+        if self.min() == self.max():
+            return 0.0
+        if self.m2_err > MAX_REL_ERR * self.m2:
+            self._resync_sums()
+        return sqrt(self.m2 / self.count)
+
+
+    def sum(self):
+        """
+        Returns:
+            float: The sum of the window values.
+        """
+        if not self.nonzero:
+            return 0.0
+        if self.total_err > MAX_REL_ERR * abs(self.total):
+            self._resync_sums()
+        return self.total
+
+
+    def min(self):
+        """
+        Returns:
+            float: The smallest window value.
+        """
+        candidates = [-self.min_deque[0][1]] if self.min_deque else []
+        if self.pending is not None:
+            candidates.append(self.pending[1])
+        return min(candidates) if candidates else nan
+
+
+    def max(self):
+        """
+        Returns:
+            float: The largest window value.
+        """
+        candidates = [self.max_deque[0][1]] if self.max_deque else []
+        if self.pending is not None:
+            candidates.append(self.pending[1])
+        return max(candidates) if candidates else nan
+
+
+    def _add_m2(self, term):
+        self.m2 = max(0.0, self.m2 + term)
+        self.m2_err += float_info.epsilon * (abs(term) + self.m2)
+
+
+    def _add_total(self, term):
+        self.total += term
+        self.total_err += float_info.epsilon * (abs(term) + abs(self.total))
+
+
+    def _resync_sums(self):
+        """
+        Recompute count, sums, mean and m2 exactly from the window values.
+
+        Returns:
+            list: The window values.
+        """
+        vals = self.window.get_win_vals().tolist()
+        self.count = len(vals)
+        self.total = sum(vals)
+        self.mean_val = self.total / self.count if vals else 0.0
+        self.m2 = sum((v - self.mean_val) ** 2 for v in vals)
+        self.nonzero = sum(v != 0 for v in vals)
+        self.m2_err = self.total_err = 0.0
+        return vals
+
+
+    def _commit(self, seq, value):
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((seq, value))
+        while self.min_deque and self.min_deque[-1][1] <= -value:
+            self.min_deque.pop()
+        self.min_deque.append((seq, -value))
+
+
+    def _repair(self, dq, seq, old_key, new_key):
+        """
+        Restore the invariant of a max deque (keys strictly decreasing, each
+        key larger than every later committed key) after one key changed.
+
+        Returns:
+            bool: False if the deque cannot be repaired locally and needs a rebuild.
+        """
+        pos = 0
+        while pos < len(dq) and dq[pos][0] < seq:
+            pos += 1
+
+        if pos < len(dq) and dq[pos][0] == seq:
+            if new_key < old_key:
+                # values between the previous candidate and this one were dominated by
+                # the old key and may now beat the new one
+                prev_seq = dq[pos - 1][0] if pos else self.first_seq - 1
+                gap = self.window.get_win_vals()[prev_seq + 1 - self.first_seq:seq - self.first_seq]
+                sign = 1 if dq is self.max_deque else -1
+                if any(sign * v > new_key for v in gap.tolist()):
+                    return False
+                if pos + 1 < len(dq) and dq[pos + 1][1] >= new_key:
+                    del dq[pos]
+                    return True
+            dq[pos] = (seq, new_key)
+        elif new_key > old_key and (pos == len(dq) or dq[pos][1] < new_key):
+            dq.insert(pos, (seq, new_key))
+        else:
+            return True
+
+        while pos > 0 and dq[pos - 1][1] <= new_key:
+            del dq[pos - 1]
+            pos -= 1
+        return True
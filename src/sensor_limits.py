@@ -0,0 +1,231 @@
+"""
+Module containing the sensor profile registry:
+    SensorProfile(sensor_type, settings)
+    ProfileRegistry(path)
+    get_registry(), get_profile(sensor_type)
+    get_UL(window), get_LL(window), get_max_time(window)
+
+Every sensor type has a profile with its range limits, maximum constant
+time, EMA alpha, window size, median window, CUSUM k/h and any extra
+detectors (see detectors.py), loaded from a JSON config file
+(sensor_profiles.json next to this module, or the file named by the
+SENSOR_PROFILES environment variable). Types without a profile of their own
+use the defaults of the file. Pipelines resolve their profile once and only
+look it up again after the registry is reloaded.
+"""
+import json
+import os
+from datetime import timedelta
+from math import inf
+from detectors import make_engine
+
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensor_profiles.json")
+SETTINGS = ("UL", "LL", "max_time", "alpha", "win_size", "k", "h")
+MED_WINDOW = 3   # median window of config files written before it was a setting
+MEDIANS = ("rolling", "legacy")   # median filters: rolling_median.MedianFilter, preprocessor.med_filter
+
+
+class SensorProfile:
+    """
+    The cleaning and error detection settings of one sensor type.
+
+    Attributes:
+        sensor_type (str): The sensor type the profile belongs to, None for the defaults.
+        UL (float): The upper limit for acceptable values.
+        LL (float): The lower limit for acceptable values.
+        max_time (timedelta): The maximum time a value may stay unchanged before it is a constant error.
+        alpha (float): The EMA smoothing factor.
+        win_size (int): The size of the sliding windows.
+        med_window (int): The odd number of oldest window readings the median filter is taken over.
+        median (str): The median filter, "rolling" (incremental) or "legacy" (re-sorts the sub-window).
+        k (float): The CUSUM slack, in standard deviations.
+        h (float): The CUSUM control limit, in standard deviations.
+        detectors (dict): The parameters of every extra detector enabled, by name.
+    """
+
+    def __init__(self, sensor_type, settings):
+        """
+        Initialize a profile from its config file settings.
+
+        Args:
+            sensor_type (str): The sensor type the profile belongs to, None for the defaults.
+            settings (dict): A value for every name in SETTINGS, and optionally med_window,
+                             median and detectors.
+                             A null limit means unbounded and max_time is in seconds.
+
+        Raises:
+            ValueError: If a setting is missing or invalid.
+        """
+        missing = [name for name in SETTINGS if name not in settings]
+        if missing:
+            raise ValueError(f"profile {sensor_type} is missing {', '.join(missing)}")
+
+        self.sensor_type = sensor_type
+        self.UL = inf if settings["UL"] is None else float(settings["UL"])
+        self.LL = -inf if settings["LL"] is None else float(settings["LL"])
+        self.max_time = timedelta(seconds=settings["max_time"])
+        self.alpha = float(settings["alpha"])
+        self.win_size = int(settings["win_size"])
+        self.med_window = int(settings.get("med_window", MED_WINDOW))
+        self.median = settings.get("median", MEDIANS[0])
+        self.k = float(settings["k"])
+        self.h = float(settings["h"])
+        self.detectors = dict(settings.get("detectors") or {})
+
+        if (self.LL > self.UL or not 0 < self.alpha <= 1 or self.win_size < 3
+                or self.med_window % 2 == 0 or not 3 <= self.med_window <= self.win_size
+                or self.median not in MEDIANS):
+            raise ValueError(f"profile {sensor_type} has invalid settings")
+        try:
+            make_engine(self.detectors)
+        except ValueError as e:
+            raise ValueError(f"profile {sensor_type}: {e}") from None
+
+
+class ProfileRegistry:
+    """
+    The sensor profiles of a config file.
+
+    Attributes:
+        path (str): The path of the JSON config file.
+        profiles (dict): The SensorProfile of every configured sensor type.
+        default (SensorProfile): The profile of sensor types that have none of their own.
+        version (int): Incremented on every successful load, so cached profiles can be checked cheaply.
+        unknown (set): The sensor types already reported as falling back to the defaults.
+    """
+
+    def __init__(self, path=None):
+        """
+        Load the profiles from a config file.
+
+        Args:
+            path (str): The path of the config file. Default is $SENSOR_PROFILES, or
+                        sensor_profiles.json next to this module.
+
+        Raises:
+            OSError: If the config file cannot be read.
+            ValueError: If the config file is not valid.
+        """
+        self.path = path or os.getenv("SENSOR_PROFILES", PROFILES_PATH)
+        self.profiles = {}
+        self.default = None
+        self.version = 0
+        self.unknown = set()
+        self._load()
+
+
+    def reload(self):
+        """
+        Load the config file again, keeping the current profiles if it is invalid.
+
+        Returns:
+            bool: True if the new profiles were loaded.
+        """
+        try:
+            self._load()
+        except (OSError, ValueError) as e:
+            print(f"Failed to reload sensor profiles from {self.path}: {e}")
+            return False
+        print(f"Reloaded sensor profiles from {self.path}")
+        return True
+
+
+    def get(self, sensor_type):
+        """
+        Get the profile of a sensor type.
+
+        Args:
+            sensor_type (str): The sensor type.
+
+        Returns:
+            SensorProfile: The profile of the type, or the default profile if it has none.
+        """
+        profile = self.profiles.get(sensor_type)
+        if profile is not None:
+            return profile
+        if sensor_type not in self.unknown:
+            self.unknown.add(sensor_type)
+            print(f"No sensor profile for {sensor_type}, using the defaults")
+        return self.default
+
+
+    def _load(self):
+        with open(self.path) as file:
+            config = json.load(file)
+
+        defaults = config.get("defaults", {})
+        default = SensorProfile(None, defaults)
+        profiles = {sensor_type: SensorProfile(sensor_type, {**defaults, **settings})
+                    for sensor_type, settings in config.get("sensors", {}).items()}
+
+        self.default, self.profiles = default, profiles
+        self.unknown = set()
+        self.version += 1
+
+
+_registry = None
+
+
+def get_registry():
+    """
+    Get the process wide profile registry, loading it on first use.
+
+    Returns:
+        ProfileRegistry: The registry.
+    """
+    global _registry
+    if _registry is None:
+        _registry = ProfileRegistry()
+    return _registry
+
+
+def get_profile(sensor_type):
+    """
+    Get the profile of a sensor type from the process wide registry.
+
+    Args:
+        sensor_type (str): The sensor type.
+
+    Returns:
+        SensorProfile: The profile of the type, or the default profile if it has none.
+    """
+    return get_registry().get(sensor_type)
+
+
+def get_UL(window):
+    """
+    Get the upper limit (UL) for a sensor based on its type.
+
+    Args:
+        window (SlidingWindow): The sliding window object containing sensor readings.
+
+    Returns:
+        float: The upper limit for the specified sensor type.
+    """
+    return get_profile(window.get_sensor_type()).UL
+
+
+def get_LL(window):
+    """
+    Get the lower limit (LL) for a sensor based on its type.
+
+    Args:
+        window (SlidingWindow): The sliding window object containing sensor readings.
+
+    Returns:
+        float: The lower limit for the specified sensor type.
+    """
+    return get_profile(window.get_sensor_type()).LL
+
+
+def get_max_time(window):
+    """
+    Retrieve the maximum allowed time for readings based on the sensor type.
+
+    Args:
+        window (SlidingWindow): The sliding window object containing sensor readings.
+
+    Returns:
+        timedelta: The maximum time allowed for readings from the sensor.
+    """
+    return get_profile(window.get_sensor_type()).max_time
@@ -0,0 +1,337 @@
+"""
+Module containing the shared-memory fan-out of the live cleaned streams:
+    RingWriter(name, capacity)
+    RingReader(name, start)
+    get_ring(), publish_step(pipeline, const_err, in_control)
+
+Every processed live reading is published as one fixed-size record (sequence
+number, epoch, cleaned value, AES target, CUSUM deviations and verdict) into
+a ring buffer in a multiprocessing.shared_memory block. Any number of local
+consumer processes map the same block and read the records as a NumPy
+record array over it, without a CSV file in between or any parsing.
+
+The writer never waits for readers. Every record carries its sequence
+number: the writer marks a slot as being written (sequence -1), fills it,
+then stamps the sequence and advances the header. A reader that falls more
+than a ring's length behind, or that copied a slot while it was being
+overwritten, sees the sequence numbers jump and is told how many records it
+missed.
+"""
+import atexit
+import os
+import struct
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+RING_MAGIC = 0x49534352   # "ISCR"
+RING_VERSION = 1
+RING_SLOTS = 65536        # default number of records in a ring
+MAX_SENSORS = 64
+NAME_BYTES = 64
+HEADER_BYTES = 64
+NAMES_BYTES = MAX_SENSORS * NAME_BYTES
+# header int64 fields
+H_MAGIC, H_VERSION, H_CAPACITY, H_WRITE_SEQ, H_SENSORS = range(5)
+
+RECORD = np.dtype([
+    ("seq", "<i8"),
+    ("epoch", "<i8"),
+    ("value", "<f8"),
+    ("target", "<f8"),
+    ("CT_plus", "<f8"),
+    ("CT_min", "<f8"),
+    ("sensor", "<u2"),
+    ("const_err", "u1"),
+    ("in_control", "u1"),
+    ("pad", "V4"),
+])
+FIELDS = struct.Struct("<qddddHBB")   # a record after its sequence number
+SEQ = struct.Struct("<q")
+
+
+def _ring_size(capacity):
+    return HEADER_BYTES + NAMES_BYTES + capacity * RECORD.itemsize
+
+
+class RingWriter:
+    """
+    The single producer of a shared-memory ring of cleaned readings.
+
+    Attributes:
+        name (str): The name of the shared memory block.
+        capacity (int): The number of records the ring holds.
+        shm (SharedMemory): The shared memory block.
+        header (ndarray): The int64 header fields, a view of the block.
+        sensors (dict): The id of every sensor name registered, by name.
+        seq (int): The sequence number of the next record.
+    """
+
+    def __init__(self, name, capacity=RING_SLOTS):
+        """
+        Create the shared memory block of a ring, replacing any left behind by a
+        writer that did not exit cleanly.
+
+        Args:
+            name (str): The name of the shared memory block.
+            capacity (int): The number of records the ring holds. Default is 65536.
+        """
+        self.name = name
+        self.capacity = capacity
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=_ring_size(capacity))
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=_ring_size(capacity))
+        self.buf = self.shm.buf
+        self.header = np.ndarray(8, dtype="<i8", buffer=self.buf)
+        self.header[:] = 0
+        self.header[H_CAPACITY] = capacity
+        self.header[H_VERSION] = RING_VERSION
+        # readers check the magic number last, once the rest of the header is set
+        self.header[H_MAGIC] = RING_MAGIC
+        self.sensors = {}
+        self.seq = 0
+
+
+    def sensor_id(self, sensor):
+        """
+        Get the id records of a sensor are published under, registering its name
+        for readers the first time.
+
+        Args:
+            sensor (str): The sensor stream name.
+
+        Returns:
+            int: The sensor id.
+
+        Raises:
+            ValueError: If the ring already holds MAX_SENSORS sensors.
+        """
+        sensor_id = self.sensors.get(sensor)
+        if sensor_id is None:
+            sensor_id = len(self.sensors)
+            if sensor_id >= MAX_SENSORS:
+                raise ValueError(f"shared ring {self.name} holds at most {MAX_SENSORS} sensors")
+            offset = HEADER_BYTES + sensor_id * NAME_BYTES
+            encoded = sensor.encode()[:NAME_BYTES]
+            self.buf[offset:offset + NAME_BYTES] = encoded.ljust(NAME_BYTES, b"\0")
+            self.header[H_SENSORS] = sensor_id + 1
+            self.sensors[sensor] = sensor_id
+        return sensor_id
+
+
+    def publish(self, sensor, epoch, value, target, CT_plus, CT_min, const_err, in_control):
+        """
+        Write the record of a processed reading, overwriting the oldest once the ring is full.
+
+        Args:
+            sensor (str): The sensor stream name.
+            epoch (int): The reading time in epoch seconds.
+            value (float): The cleaned value.
+            target (float): The AES target.
+            CT_plus (float): The positive CUSUM deviation.
+            CT_min (float): The negative CUSUM deviation.
+            const_err (bool): Whether a constant error was detected.
+            in_control (bool): Whether CUSUM found the process in control.
+
+        Returns:
+            int: The sequence number of the record.
+        """
+        sensor_id = self.sensor_id(sensor)
+        seq = self.seq
+        offset = HEADER_BYTES + NAMES_BYTES + (seq % self.capacity) * RECORD.itemsize
+        SEQ.pack_into(self.buf, offset, -1)
+        FIELDS.pack_into(self.buf, offset + SEQ.size, epoch, value, target, CT_plus, CT_min,
+                         sensor_id, const_err, in_control)
+        SEQ.pack_into(self.buf, offset, seq)
+        self.seq = seq + 1
+        self.header[H_WRITE_SEQ] = self.seq
+        return seq
+
+
+    def close(self):
+        """
+        Unmap and remove the shared memory block; readers keep their mapping until they close.
+
+        Returns:
+            None
+        """
+        if self.shm is None:
+            return
+        self.header = None
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+class RingReader:
+    """
+    A consumer of a shared-memory ring, in its own process.
+
+    Attributes:
+        name (str): The name of the shared memory block.
+        shm (SharedMemory): The shared memory block.
+        header (ndarray): The int64 header fields, a view of the block.
+        capacity (int): The number of records the ring holds.
+        records (ndarray): The RECORD slots of the ring, a zero-copy view of the block.
+        next_seq (int): The sequence number of the next record to read.
+        missed (int): The number of records overwritten before they could be read.
+    """
+
+    def __init__(self, name, start="latest"):
+        """
+        Map the shared memory block of a running writer.
+
+        Args:
+            name (str): The name of the shared memory block.
+            start (str): "latest" to read only records published from now on, or
+                         "oldest" to start from the oldest record still held. Default is "latest".
+
+        Raises:
+            FileNotFoundError: If there is no ring with that name.
+            ValueError: If the block is not a ring of this version.
+        """
+        self.name = name
+        self.shm = shared_memory.SharedMemory(name)
+        # the writer owns the block: keep the resource tracker from removing it when this process exits
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.header = np.ndarray(8, dtype="<i8", buffer=self.shm.buf)
+        if self.header[H_MAGIC] != RING_MAGIC or self.header[H_VERSION] != RING_VERSION:
+            self.close()
+            raise ValueError(f"{name} is not a version {RING_VERSION} shared ring")
+        self.capacity = int(self.header[H_CAPACITY])
+        self.records = np.ndarray(self.capacity, dtype=RECORD, buffer=self.shm.buf,
+                                  offset=HEADER_BYTES + NAMES_BYTES)
+        self._names = []
+        write_seq = int(self.header[H_WRITE_SEQ])
+        self.next_seq = write_seq if start == "latest" else max(0, write_seq - self.capacity)
+        self.missed = 0
+
+
+    def sensor_name(self, sensor_id):
+        """
+        Get the sensor name of a record's sensor id.
+
+        Args:
+            sensor_id (int): The id in the record's sensor field.
+
+        Returns:
+            str: The sensor stream name.
+        """
+        if sensor_id >= len(self._names):
+            buf = self.shm.buf
+            self._names = [bytes(buf[HEADER_BYTES + idx * NAME_BYTES:HEADER_BYTES + (idx + 1) * NAME_BYTES])
+                           .rstrip(b"\0").decode() for idx in range(int(self.header[H_SENSORS]))]
+        return self._names[sensor_id]
+
+
+    def read(self, max_records=None):
+        """
+        Take every record published since the last read, oldest first.
+
+        The records are copied out of the ring in at most two slices and then
+        checked against their expected sequence numbers, so a slot the writer
+        overwrote during the copy is never returned.
+
+        Args:
+            max_records (int): The most records to take. Default is None (all available).
+
+        Returns:
+            tuple: (records, missed) where records is a RECORD array and missed is
+                   the number of records overwritten before they could be read.
+        """
+        write_seq = int(self.header[H_WRITE_SEQ])
+        missed = 0
+        if write_seq - self.next_seq > self.capacity:
+            missed = write_seq - self.capacity - self.next_seq
+            self.next_seq = write_seq - self.capacity
+        count = write_seq - self.next_seq
+        if max_records is not None:
+            count = min(count, max_records)
+        if count <= 0:
+            return self.records[:0].copy(), missed
+
+        first = self.next_seq % self.capacity
+        last = first + count
+        if last <= self.capacity:
+            records = self.records[first:last].copy()
+            seqs = self.records["seq"][first:last]
+        else:
+            wrap = last - self.capacity
+            records = np.concatenate([self.records[first:], self.records[:wrap]])
+            seqs = np.concatenate([self.records["seq"][first:], self.records["seq"][:wrap]])
+
+        # a record is only valid if its slot held it both while and after it was copied
+        expected = np.arange(self.next_seq, self.next_seq + count, dtype=np.int64)
+        valid = (records["seq"] == expected) & (seqs == expected)
+        if not valid.all():
+            # only the oldest slots can be overwritten mid-read: keep what follows the last bad one
+            keep = int(np.flatnonzero(~valid)[-1]) + 1
+            missed += keep
+            records = records[keep:]
+
+        self.next_seq += count
+        self.missed += missed
+        return records, missed
+
+
+    def close(self):
+        """
+        Unmap the shared memory block.
+
+        Returns:
+            None
+        """
+        if self.shm is None:
+            return
+        self.records = None
+        self.header = None
+        self.shm.close()
+        self.shm = None
+
+
+_ring = None
+_ring_checked = False
+
+
+def get_ring():
+    """
+    Get the process wide ring writer, created on first use when $SHARED_RING names
+    its shared memory block; $SHARED_RING_SLOTS sets its capacity (default 65536).
+    It is removed at exit.
+
+    Returns:
+        RingWriter: The writer, or None if $SHARED_RING is not set.
+    """
+    global _ring, _ring_checked
+    if not _ring_checked:
+        _ring_checked = True
+        name = os.getenv("SHARED_RING")
+        if name:
+            _ring = RingWriter(name, int(os.getenv("SHARED_RING_SLOTS", RING_SLOTS)))
+            atexit.register(_ring.close)
+    return _ring
+
+
+def publish_step(pipeline, const_err, in_control):
+    """
+    Publish the newest processed reading of a pipeline to the shared ring, if there is one.
+
+    Args:
+        pipeline (SensorPipeline): The pipeline that just processed a reading.
+        const_err (bool): Whether a constant error was detected.
+        in_control (bool): Whether CUSUM found the process in control.
+
+    Returns:
+        None
+    """
+    ring = _ring if _ring_checked else get_ring()
+    if ring is None:
+        return
+    window = pipeline.window
+    ring.publish(pipeline.name, int(window.get_win_times()[-1]), window.get_val(-1), pipeline.target,
+                 pipeline.CT_plus_win.get_val(-1), pipeline.CT_min_win.get_val(-1),
+                 int(const_err), int(in_control))
@@ -1,25 +1,45 @@
-from collections import deque
+import numpy as np
+from data_point import DataPoint
+from rolling_stats import RollingStats
+
+NAT_EPOCH = np.iinfo(np.int64).min    # epoch stored for readings without a valid time
+
 
 class SlidingWindow:
     """
     A class representing a sliding window buffer that stores sensor readings.
 
+    Values and epoch times are kept in preallocated mirrored ring buffers: every
+    slot is written twice, cap apart, so the live window is always a contiguous
+    slice and can be returned as a NumPy view without copying.
+
     Attributes:
         size (int): The desired size of the sliding window.
         max_size (int): The maximum allowable size of the window buffer.
-        window (deque): A deque object to hold sensor readings.
+        readings (list): A ring of the reading objects held in the window.
+        vals (ndarray): A mirrored float64 ring of the reading values.
+        times (ndarray): A mirrored int64 ring of the reading epoch times.
+        head (int): The ring slot of the oldest reading.
+        length (int): The number of readings in the window.
+        stats (RollingStats): Running statistics of the window values, or None.
     """
-    
-    def __init__(self, size):
+
+    def __init__(self, size, stats=False):
         """
         Initialize the SlidingWindow instance with the specified size.
 
         Args:
             size (int): The desired size of the sliding window.
+            stats (bool): Whether to keep running statistics of the values. Default is False.
         """
         self.size = size
-        self.max_size = 40                             # Max size of window queue
-        self.window = deque(maxlen=self.max_size)      # create a queue object
+        self.max_size = max(40, size)                  # Max size of window queue
+        self.readings = [None] * self.max_size
+        self.vals = np.zeros(2 * self.max_size, dtype=np.float64)
+        self.times = np.full(2 * self.max_size, NAT_EPOCH, dtype=np.int64)
+        self.head = 0
+        self.length = 0
+        self.stats = RollingStats(self) if stats else None
 
 
     def add_reading(self, reading):
@@ -27,41 +47,58 @@ class SlidingWindow:
         Add a new reading to the sliding window buffer.
 
         Args:
-            reading (DataPoint): The new sensor reading to add.
+            reading (DataPoint | float): The new sensor reading to add.
 
         Returns:
             None
         """
-        self.window.append(reading)
-    
-    
+        if self.length == self.max_size:
+            self._pop_oldest()
+        self._append(reading)
+
+
     def slide_next(self, reading):
         """
         Slide the window by adding a new reading and removing the oldest one.
 
         Args:
-            reading (DataPoint): The new sensor reading to add.
+            reading (DataPoint | float): The new sensor reading to add.
 
         Returns:
-            DataPoint: The oldest reading that was removed from the buffer.
+            DataPoint | float: The oldest reading that was removed from the buffer,
+                               reading itself if the window is empty.
         """
-        self.window.append(reading)
-        return self.window.popleft()
+        if self.length == 0:
+            # nothing to slide out: the new reading passes straight through, as it did through the deque
+            return reading
+        oldest = self._pop_oldest()
+        self._append(reading)
+        return oldest
 
 
     def remove_idx(self, idx):
         """
-        Remove a reading from the window by index.
+        Remove a reading from the window by index, shifting later readings down in place.
 
         Args:
             idx (int): The index of the reading to remove.
 
         Returns:
-            DataPoint: The removed reading.
+            DataPoint | float: The removed reading.
         """
-        buf_list = list(self.window)
-        removed = buf_list.pop(idx)
-        self.window = deque(buf_list, maxlen=self.max_size)
+        idx = self._index(idx)
+        removed = self.readings[(self.head + idx) % self.max_size]
+
+        for i in range(idx, self.length - 1):
+            slot = (self.head + i) % self.max_size
+            next_slot = (slot + 1) % self.max_size
+            self.readings[slot] = self.readings[next_slot]
+            self._mirror(slot, self.vals[next_slot], self.times[next_slot])
+
+        self.length -= 1
+        self.readings[(self.head + self.length) % self.max_size] = None
+        if self.stats is not None:
+            self.stats.rebuild()
         return removed
 
 
@@ -70,32 +107,37 @@ class SlidingWindow:
         Retrieve the values of all readings in the window.
 
         Returns:
-            list: A list of sensor reading values.
+            ndarray: A read-only view of the sensor reading values, oldest first.
         """
-        obj_list = list(self.window)
-        vals_list = []
+        view = self.vals[self.head:self.head + self.length]
+        view.flags.writeable = False
+        return view
 
-        for i in range(len(self.window)):
-            vals_list.append(obj_list[i].get_val())
-        
-        return vals_list
-    
 
     def get_win_times(self):
         """
         Retrieve the timestamps of all readings in the window.
 
         Returns:
-            list: A list of timestamps for the sensor readings.
+            ndarray: A read-only view of the reading epoch times, oldest first.
+        """
+        view = self.times[self.head:self.head + self.length]
+        view.flags.writeable = False
+        return view
+
+
+    def get_val(self, index):
+        """
+        Retrieve the value of a single reading, without making a view of the window.
+
+        Args:
+            index (int): The index of the reading, negative to count from the newest.
+
+        Returns:
+            float: The value of the reading.
         """
-        obj_list = list(self.window)
-        times_list = []
+        return self.vals.item(self.head + self._index(index))
 
-        for i in range(len(self.window)):
-            times_list.append(obj_list[i].get_time())
-        
-        return times_list
-    
 
     def get_sensor_type(self):
         """
@@ -104,9 +146,18 @@ class SlidingWindow:
         Returns:
             str: The sensor type of the first reading.
         """
-        readings = list(self.window)
-        return readings[0].sensor_type
-    
+        return self.readings[self.head].sensor_type
+
+
+    def get_latest(self):
+        """
+        Get the newest reading in the window.
+
+        Returns:
+            DataPoint | float: The newest reading.
+        """
+        return self.readings[(self.head + self.length - 1) % self.max_size]
+
 
     def change_val(self, index, new_val):
         """
@@ -119,18 +170,28 @@ class SlidingWindow:
         Returns:
             None
         """
-        readings = list(self.window)
-        readings[index].value = new_val
-        
-    
+        index = self._index(index)
+        slot = (self.head + index) % self.max_size
+        reading = self.readings[slot]
+        if isinstance(reading, DataPoint):
+            reading.value = new_val
+        else:
+            self.readings[slot] = new_val
+        old_val = float(self.vals[slot])
+        self._mirror(slot, new_val, self.times[slot])
+        if self.stats is not None:
+            self.stats.replace(index, old_val, float(new_val))
+
+
     def as_list(self):
-        """_summary_
+        """
+        Get the readings held in the window.
 
         Returns:
             list: The window represented as a list
         """
-        return list(self.window)
-        
+        return [self.readings[(self.head + i) % self.max_size] for i in range(self.length)]
+
 
     def is_full(self):
         """
@@ -139,12 +200,51 @@ class SlidingWindow:
         Returns:
             bool: True if the buffer is full, False otherwise.
         """
-        return len(self.window) >= self.size
-    
+        return self.length >= self.size
+
+
+    def _index(self, idx):
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError("SlidingWindow index out of range")
+        return idx
+
+
+    def _append(self, reading):
+        slot = (self.head + self.length) % self.max_size
+        self.readings[slot] = reading
+        if isinstance(reading, DataPoint):
+            epoch = reading.epoch
+            value = reading.value
+            self._mirror(slot, value, NAT_EPOCH if epoch is None else epoch)
+        else:
+            value = reading
+            self._mirror(slot, value, NAT_EPOCH)
+        self.length += 1
+        if self.stats is not None:
+            self.stats.push(float(value))
+
+
+    def _mirror(self, slot, value, epoch):
+        self.vals[slot] = self.vals[slot + self.max_size] = value
+        self.times[slot] = self.times[slot + self.max_size] = epoch
+
+
+    def _pop_oldest(self):
+        oldest = self.readings[self.head]
+        value = float(self.vals[self.head])
+        self.readings[self.head] = None
+        self.head = (self.head + 1) % self.max_size
+        self.length -= 1
+        if self.stats is not None:
+            self.stats.pop(value)
+        return oldest
+
 
 def main():
     pass
 
 
 if __name__ == '__main__' :
-    main()
\ No newline at end of file
+    main()
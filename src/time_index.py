@@ -0,0 +1,262 @@
+"""
+Module containing the sidecar time indexes of the CSV outputs:
+    TimeIndex(csv_path, block_rows)
+    get_index(csv_path)
+    read_csv_range(csv_path, start, end)
+
+A CSV output is split into blocks of block_rows rows, and its index records
+the byte offset, row count and min/max reading time of every block in a
+<file>.idx file next to it. A time range query seeks straight to the blocks
+whose times overlap the range and parses only those, so it costs the same on
+a file of a thousand rows as on one of a hundred million. Outputs are
+append-only: an index catches up with rows appended since it was saved by
+reading only the new bytes, and is rebuilt when its file was rewritten.
+"""
+import csv
+import io
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from batch_engine import to_epochs
+from data_point import to_epoch
+from sliding_window import NAT_EPOCH
+
+BLOCK_ROWS = 4096
+INDEX_VERSION = 1
+TAIL_BYTES = 4096   # bytes before the indexed end that identify the file it was built from
+NO_TIME = (np.iinfo(np.int64).max, np.iinfo(np.int64).min)   # min/max of a block without valid times
+
+
+class TimeIndex:
+    """
+    The block index of one CSV output.
+
+    Attributes:
+        csv_path (str): The path of the indexed CSV file.
+        index_path (str): The path of the sidecar index file.
+        block_rows (int): The number of rows per block.
+        header (list): The column names of the CSV file.
+        time_col (int): The position of the Time column.
+        size (int): The number of bytes of the CSV file indexed, up to its last complete row.
+        blocks (ndarray): A row of [byte offset, row count, min epoch, max epoch] per block.
+    """
+
+    def __init__(self, csv_path, block_rows=BLOCK_ROWS):
+        """
+        Load the index of a CSV file, building or updating it as needed.
+
+        Args:
+            csv_path (str): The path of the CSV file.
+            block_rows (int): The number of rows per block. Default is 4096.
+
+        Raises:
+            ValueError: If the CSV file has no Time column.
+        """
+        self.csv_path = csv_path
+        self.index_path = csv_path + ".idx"
+        self.block_rows = block_rows
+        self.header = None
+        self.time_col = None
+        self.size = 0
+        self.tail_crc = 0
+        self.blocks = np.empty((0, 4), dtype=np.int64)
+
+        with open(csv_path, 'rb') as file:
+            self.header = next(csv.reader([file.readline().decode()]), [])
+        if "Time" not in self.header:
+            raise ValueError(f"{csv_path} has no Time column")
+        self.time_col = self.header.index("Time")
+        if not self._load():
+            self.blocks = self.blocks[:0]
+            self.size = 0
+        self.refresh()
+
+
+    def refresh(self):
+        """
+        Index the rows appended to the CSV file since the index was last updated,
+        saving the index if it changed.
+
+        Returns:
+            bool: True if the index changed.
+        """
+        file_size = os.path.getsize(self.csv_path)
+        if file_size == self.size:
+            return False
+        if file_size < self.size or not self._same_file():
+            self.blocks = self.blocks[:0]
+            self.size = 0
+
+        # a short last block is indexed again with the rows that followed it
+        start = self.size
+        if len(self.blocks) and self.blocks[-1, 1] < self.block_rows:
+            start = int(self.blocks[-1, 0])
+            self.blocks = self.blocks[:-1]
+
+        new_blocks = []
+        with open(self.csv_path, 'rb') as file:
+            if start == 0:
+                file.readline()
+            else:
+                file.seek(start)
+            offset = file.tell()
+            lines = []
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                lines.append(line)
+                if len(lines) == self.block_rows:
+                    new_blocks.append(self._block(offset, lines))
+                    offset += sum(map(len, lines))
+                    lines = []
+            if lines:
+                new_blocks.append(self._block(offset, lines))
+                offset += sum(map(len, lines))
+
+        if new_blocks:
+            self.blocks = np.vstack([self.blocks, np.array(new_blocks, dtype=np.int64)])
+        self.size = offset
+        self._save()
+        return True
+
+
+    def spans(self, start=None, end=None):
+        """
+        Find the byte ranges of the blocks that can hold rows in [start, end).
+
+        Args:
+            start (int): The first epoch to include. Default is None (from the start).
+            end (int): The first epoch to exclude. Default is None (to the end).
+
+        Returns:
+            list: (first byte, end byte) pairs, adjacent blocks merged.
+        """
+        blocks = self.blocks
+        if not len(blocks):
+            return []
+        hit = blocks[:, 3] >= blocks[:, 2]
+        if start is not None:
+            hit &= blocks[:, 3] >= start
+        if end is not None:
+            hit &= blocks[:, 2] < end
+        ends = np.append(blocks[1:, 0], self.size)
+
+        spans = []
+        for idx in np.flatnonzero(hit):
+            first, last = int(blocks[idx, 0]), int(ends[idx])
+            if spans and spans[-1][1] == first:
+                spans[-1] = (spans[-1][0], last)
+            else:
+                spans.append((first, last))
+        return spans
+
+
+    def read_range(self, start=None, end=None):
+        """
+        Read the rows whose Time falls in [start, end), parsing only the blocks that can hold them.
+
+        Args:
+            start (int): The first epoch to include. Default is None (from the start).
+            end (int): The first epoch to exclude. Default is None (to the end).
+
+        Returns:
+            DataFrame: The matching rows, with the CSV file's columns.
+        """
+        self.refresh()
+        chunks = []
+        with open(self.csv_path, 'rb') as file:
+            for first, last in self.spans(start, end):
+                file.seek(first)
+                chunks.append(file.read(last - first))
+        if not chunks:
+            return pd.DataFrame(columns=self.header)
+
+        frame = pd.read_csv(io.BytesIO(b"".join(chunks)), names=self.header, header=None,
+                            dtype={"Time": object})
+        epochs = to_epochs(frame["Time"])
+        keep = epochs != NAT_EPOCH
+        if start is not None:
+            keep &= epochs >= start
+        if end is not None:
+            keep &= epochs < end
+        return frame[keep].reset_index(drop=True)
+
+
+    def _block(self, offset, lines):
+        times = pd.Series([row[self.time_col] if len(row) > self.time_col else None
+                           for row in csv.reader(line.decode() for line in lines)], dtype=object)
+        epochs = to_epochs(times)
+        epochs = epochs[epochs != NAT_EPOCH]
+        low, high = (epochs.min(), epochs.max()) if len(epochs) else NO_TIME
+        return [offset, len(lines), low, high]
+
+
+    def _tail_crc(self):
+        with open(self.csv_path, 'rb') as file:
+            file.seek(max(0, self.size - TAIL_BYTES))
+            return zlib.crc32(file.read(self.size - file.tell()))
+
+
+    def _same_file(self):
+        return self.size == 0 or self._tail_crc() == self.tail_crc
+
+
+    def _load(self):
+        try:
+            saved = np.load(self.index_path, allow_pickle=False)
+        except (OSError, ValueError):
+            return False
+        if saved.ndim != 2 or saved.shape[1] != 4 or not len(saved):
+            return False
+        version, block_rows, self.size, self.tail_crc = (int(v) for v in saved[0])
+        self.blocks = saved[1:]
+        return version == INDEX_VERSION and block_rows == self.block_rows
+
+
+    def _save(self):
+        self.tail_crc = self._tail_crc()
+        meta = np.array([[INDEX_VERSION, self.block_rows, self.size, self.tail_crc]], dtype=np.int64)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'wb') as file:
+            np.save(file, np.vstack([meta, self.blocks]))
+        os.replace(temp_path, self.index_path)
+
+
+_indexes = {}
+
+
+def get_index(csv_path):
+    """
+    Get the index of a CSV file, kept open for the rest of the process.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+
+    Returns:
+        TimeIndex: The index, up to date with the file.
+    """
+    key = os.path.abspath(csv_path)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = TimeIndex(csv_path)
+    else:
+        index.refresh()
+    return index
+
+
+def read_csv_range(csv_path, start=None, end=None):
+    """
+    Read the rows of a CSV output whose Time falls in [start, end), through its index.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        start (int | str): The first time to include, as epoch seconds or a timestamp.
+        end (int | str): The first time to exclude, as epoch seconds or a timestamp.
+
+    Returns:
+        DataFrame: The matching rows.
+    """
+    start = to_epoch(start) if isinstance(start, str) else start
+    end = to_epoch(end) if isinstance(end, str) else end
+    return get_index(csv_path).read_range(start, end)
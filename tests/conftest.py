@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+@pytest.fixture
+def data_dir():
+    """The repository's sample data files."""
+    return os.path.join(ROOT, "data")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """An empty src/ and data/ pair to run in, as the scripts write their outputs to ../data."""
+    from csv_writer import close_all
+    (tmp_path / "src").mkdir()
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path / "src")
+    yield tmp_path
+    close_all()
@@ -0,0 +1,42 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from csv_writer import close_all
+from main import stream_csv, stream_to_csv, run_csv_batch
+
+
+def write_series(file_path, values, sensor_type="SSTEMP_sensor"):
+    start = pd.Timestamp("2024-09-12 00:00:00")
+    times = [(start + pd.Timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S") for i in range(len(values))]
+    pd.DataFrame({"State": values, "Time": times, "Device": sensor_type, "Unit": "C"}).to_csv(file_path, index=False)
+
+
+@pytest.mark.parametrize("file_name", ["raw_SSTEMP.csv", "raw_HUM.csv", "synthetic"])
+def test_batch_matches_stream(workdir, data_dir, file_name):
+    file_path = os.path.join(data_dir, file_name)
+    if file_name == "synthetic":
+        # out of range readings, flat stretches and a step, with SSTEMP limits of -10 to 45
+        rng = np.random.default_rng(1)
+        values = np.concatenate([20 + rng.normal(0, 1, 300), np.full(60, 21.5), 30 + rng.normal(0, 1, 300)])
+        values[rng.choice(len(values), 30, replace=False)] = 80
+        values[::97] = -40
+        values[300:360] = 21.5
+        file_path = str(workdir / "raw_synthetic.csv")
+        write_series(file_path, values.round(2))
+    stream_counts, batch_counts = {}, {}
+    stream_to_csv(stream_csv(file_path, "AES_stream", stream_counts, verbose=False), "clean", "stream")
+    run_csv_batch(file_path, "AES_batch", "batch", batch_counts, verbose=False)
+    close_all()
+
+    data = workdir / "data"
+    assert (data / "clean_batch.csv").read_bytes() == (data / "clean_stream.csv").read_bytes()
+    assert batch_counts == stream_counts
+    assert stream_counts["readings"] > 0
+    if file_name == "synthetic":
+        assert stream_counts["clipped"] > 0 and stream_counts["const_err"] > 0 and stream_counts["drift"] > 0
+
+    stream_targets = pd.read_csv(data / "AES_stream.csv")
+    batch_targets = pd.read_csv(data / "AES_batch.csv")
+    assert list(batch_targets["Time"]) == list(stream_targets["Time"])
+    np.testing.assert_allclose(batch_targets["Target"], stream_targets["Target"], rtol=1e-9)
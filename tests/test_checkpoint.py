@@ -0,0 +1,68 @@
+import os
+import pytest
+from checkpoint import LiveCheckpointer
+from csv_writer import close_all
+from data_point import DataPoint
+from main import clean_csv_incremental, stream_csv, stream_to_csv
+from pipeline import SensorPipeline
+
+
+def split_lines(file_path):
+    with open(file_path, newline='') as file:
+        return file.readlines()
+
+
+@pytest.mark.parametrize("file_name", ["raw_SSTEMP.csv", "raw_HUM.csv"])
+def test_resumed_runs_match_one_run(workdir, data_dir, file_name):
+    lines = split_lines(os.path.join(data_dir, file_name))
+    data = workdir / "data"
+    full_path = data / "raw_full.csv"
+    full_path.write_text("".join(lines), newline='')
+    stream_to_csv(stream_csv(str(full_path), "AES_full", verbose=False), "clean", "full")
+
+    # the file grows between runs, including runs that find a single new row or none
+    part_path = data / "raw_part.csv"
+    counts = []
+    for end in (1, 8, 200, 201, 201, len(lines) // 2, len(lines)):
+        part_path.write_text("".join(lines[:end]), newline='')
+        run_counts = {}
+        clean_csv_incremental(str(part_path), "AES_part", "part", run_counts, verbose=False)
+        counts.append(run_counts.get("readings", 0))
+    close_all()
+
+    assert (data / "clean_part.csv").read_bytes() == (data / "clean_full.csv").read_bytes()
+    assert (data / "AES_part.csv").read_bytes() == (data / "AES_full.csv").read_bytes()
+    assert sum(counts) == len(lines) - 1
+    assert counts[4] == 0
+
+
+def test_rewritten_file_is_cleaned_again(workdir, data_dir):
+    lines = split_lines(os.path.join(data_dir, "raw_HUM.csv"))
+    data = workdir / "data"
+    part_path = data / "raw_part.csv"
+    part_path.write_text("".join(lines[:300]), newline='')
+    clean_csv_incremental(str(part_path), "AES_part", "part", verbose=False)
+    # a different file under the same name
+    part_path.write_text(lines[0] + "".join(lines[300:]), newline='')
+    counts = {}
+    clean_csv_incremental(str(part_path), "AES_rewritten", "part", counts, verbose=False)
+    assert counts["readings"] == len(lines) - 300
+
+
+def test_live_pipelines_resume_with_warm_state(workdir):
+    def run(pipeline, start, end):
+        # the pipeline cleans readings in place, so every run gets its own
+        readings = [DataPoint(20.0 + (i % 7) * 0.5 + (i > 150) * 4, 1726070400 + 60 * i, "SSTEMP_sensor", "C")
+                    for i in range(start, end)]
+        return [(pipeline.step(reading), pipeline.target) for reading in readings]
+
+    expected = run(SensorPipeline("temp"), 0, 300)
+
+    first = {"temp": SensorPipeline("temp")}
+    resumed = run(first["temp"], 0, 120)
+    checkpointer = LiveCheckpointer(str(workdir / "data" / "checkpoint_live.json"))
+    checkpointer.save(first)
+    restored = checkpointer.restore()
+    resumed += run(restored["temp"], 120, 300)
+
+    assert resumed == expected
@@ -0,0 +1,96 @@
+import json
+import pytest
+import sensor_limits
+from data_point import DataPoint
+from detectors import DetectorContext, make_engine
+from pipeline import SensorPipeline
+from sliding_window import NAT_EPOCH
+
+EPOCH = 1726070439
+
+
+def context(value, epoch=EPOCH, mean=20.0, std=1.0, LL=0.0, UL=50.0):
+    ctx = DetectorContext()
+    ctx.value = ctx.cleaned = value
+    ctx.epoch = epoch
+    ctx.mean, ctx.std = mean, std
+    ctx.LL, ctx.UL = LL, UL
+    return ctx
+
+
+def names(fired):
+    return [detector.name for detector in fired]
+
+
+def test_stuck_at_bound_fires_after_a_run_at_a_limit():
+    engine = make_engine({"stuck_at_bound": {"readings": 3}})
+    fired = [names(engine.evaluate(context(value))) for value in (50.0, 50.0, 20.0, 0.0, -1.0, 0.0, 20.0)]
+    assert fired == [[], [], [], [], [], ["stuck_at_bound"], []]
+    assert engine.summary()["stuck_at_bound"]["alarms"] == 1
+
+
+def test_spike_rate_counts_spikes_within_the_period():
+    engine = make_engine({"spike_rate": {"k": 3.0, "max_spikes": 2, "period": 60}})
+    readings = [(30.0, EPOCH), (30.0, EPOCH + 10), (30.0, EPOCH + 20), (20.0, EPOCH + 30),
+                (30.0, NAT_EPOCH), (20.0, EPOCH + 70), (20.0, EPOCH + 90)]
+    fired = [names(engine.evaluate(context(value, epoch))) for value, epoch in readings]
+    assert fired == [[], [], ["spike_rate"], ["spike_rate"], ["spike_rate"], [], []]
+
+
+def test_ewma_and_page_hinkley_fire_on_a_shift():
+    engine = make_engine({"ewma": {"lam": 0.2, "L": 3.0},
+                          "page_hinkley": {"delta": 0.5, "threshold": 10.0, "min_readings": 5}})
+    fired = [names(engine.evaluate(context(20.0))) for _ in range(10)]
+    assert fired == [[]] * 10
+    fired = [names(engine.evaluate(context(24.0))) for _ in range(10)]
+    assert "ewma" in fired[2] and "page_hinkley" not in fired[2]
+    assert any("page_hinkley" in detectors for detectors in fired)
+    assert engine.summary()["page_hinkley"]["alarms"] == 1
+
+
+def test_state_carries_on_where_it_left_off():
+    settings = {"ewma": {}, "page_hinkley": {"threshold": 5.0, "min_readings": 3},
+                "stuck_at_bound": {}, "spike_rate": {"k": 2.0, "max_spikes": 1}}
+    values = [20.0, 21.0, 50.0, 50.0, 19.0, 25.0, 26.0, 27.0, 0.0, 0.0, 0.0, 22.0]
+    whole = make_engine(settings)
+    expected = [names(whole.evaluate(context(value, EPOCH + i))) for i, value in enumerate(values)]
+
+    first = make_engine(settings)
+    fired = [names(first.evaluate(context(value, EPOCH + i))) for i, value in enumerate(values[:6])]
+    state = json.loads(json.dumps(first.get_state()))
+    second = make_engine(settings)
+    second.set_state(state)
+    fired += [names(second.evaluate(context(value, EPOCH + i))) for i, value in enumerate(values[6:], 6)]
+    assert fired == expected
+    assert any(expected)
+
+
+def test_invalid_settings_raise():
+    assert make_engine({}) is None
+    with pytest.raises(ValueError):
+        make_engine({"nope": {}})
+    with pytest.raises(ValueError):
+        make_engine({"ewma": {"lam": 2.0}})
+    with pytest.raises(ValueError):
+        make_engine({"stuck_at_bound": {"runs": 3}})
+
+
+def test_alarms_are_dropped_with_their_detectors(tmp_path, monkeypatch):
+    with open(sensor_limits.PROFILES_PATH) as f:
+        config = json.load(f)
+    path = tmp_path / "profiles.json"
+    config["sensors"]["SSTEMP_sensor"]["detectors"] = {"stuck_at_bound": {"readings": 1}}
+    path.write_text(json.dumps(config))
+    monkeypatch.setattr(sensor_limits, "_registry", sensor_limits.ProfileRegistry(str(path)))
+
+    pipeline = SensorPipeline("SSTEMP")
+    for i in range(12):
+        pipeline.step(DataPoint(50.0, EPOCH + 60 * i, "SSTEMP_sensor", "C"))
+    assert names(pipeline.alarms) == ["stuck_at_bound"]
+
+    del config["sensors"]["SSTEMP_sensor"]["detectors"]
+    path.write_text(json.dumps(config))
+    assert pipeline.registry.reload()
+    pipeline.step(DataPoint(20.0, EPOCH + 60 * 20, "SSTEMP_sensor", "C"))
+    assert pipeline.detectors is None
+    assert pipeline.alarms == []
@@ -0,0 +1,50 @@
+from statistics import median
+import numpy as np
+import pytest
+from data_point import DataPoint
+from pipeline import SensorPipeline
+from rolling_median import RollingMedian
+from sensor_limits import SensorProfile
+
+SETTINGS = {"UL": 45, "LL": -10, "max_time": 1800, "alpha": 0.4, "win_size": 15, "k": 0.5, "h": 5}
+
+
+def test_rolling_median_tracks_the_multiset():
+    rng = np.random.default_rng(18)
+    values = [float(v) for v in rng.integers(0, 20, 9)]
+    rolling = RollingMedian(values)
+    for _ in range(1000):
+        old = values.pop(int(rng.integers(len(values))))
+        new = float(rng.integers(0, 20))
+        values.append(new)
+        rolling.replace(old, new)
+        assert rolling.median() == median(values)
+    rolling.push(3.0)
+    values.append(3.0)
+    assert rolling.median() == median(values)
+    rolling.remove(3.0)
+    values.remove(3.0)
+    assert rolling.median() == median(values)
+
+
+@pytest.mark.parametrize("med_window", [3, 5, 9, 15])
+def test_rolling_and_legacy_filters_agree(med_window):
+    rng = np.random.default_rng(med_window)
+    values = np.concatenate([20 + rng.normal(0, 2, 200), np.full(20, 60.0), 25 + rng.normal(0, 2, 200)])
+    pipelines = {median_type: SensorPipeline(median_type, SensorProfile(
+        "SSTEMP_sensor", {**SETTINGS, "med_window": med_window, "median": median_type}))
+                 for median_type in ("rolling", "legacy")}
+
+    results = {}
+    for median_type, pipeline in pipelines.items():
+        verdicts, cleaned = [], []
+        for i, value in enumerate(values.round(2)):
+            reading = DataPoint(float(value), 1726070400 + 60 * i, "SSTEMP_sensor", "C")
+            left = pipeline.add_reading(reading)
+            if left is not None:
+                cleaned.append(left.value)
+            if pipeline.window.is_full():
+                verdicts.append((pipeline.process(), pipeline.target))
+        results[median_type] = (verdicts, cleaned, pipeline.window.get_win_vals().tolist())
+
+    assert results["rolling"] == results["legacy"]
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sliding_window import SlidingWindow
+
+
+def assert_stats(window):
+    vals = np.asarray(window.get_win_vals(), dtype=float)
+    stats = window.stats
+    assert stats.mean() == pytest.approx(vals.mean(), rel=1e-9)
+    assert stats.std() == pytest.approx(vals.std(), rel=1e-9)
+    assert stats.sum() == pytest.approx(vals.sum(), rel=1e-9)
+    assert stats.min() == vals.min()
+    assert stats.max() == vals.max()
+
+
+def test_stats_follow_slides_and_changes():
+    rng = np.random.default_rng(4)
+    window = SlidingWindow(10, stats=True)
+    for step in range(2000):
+        value = float(rng.choice([rng.normal(20, 5), 20.0, 1e6]))
+        if window.is_full():
+            window.slide_next(value)
+        else:
+            window.add_reading(value)
+        # the pipeline changes the newest and older values in place, as the range check, EMA and median do
+        if step % 3 == 0:
+            window.change_val(-1, float(rng.normal(20, 5)))
+        if step % 7 == 0 and window.length > 3:
+            window.change_val(int(rng.integers(window.length)), float(rng.normal(20, 5)))
+        if step % 101 == 0 and window.length > 1:
+            window.remove_idx(int(rng.integers(window.length)))
+        assert_stats(window)
+
+
+def test_large_value_leaving_equal_values():
+    window = SlidingWindow(5, stats=True)
+    for value in [1e12, 3.0, 3.0, 3.0, 3.0]:
+        window.add_reading(value)
+    window.slide_next(3.0)
+    assert window.stats.std() == 0.0
+    assert window.stats.sum() == 15.0
+    assert window.stats.mean() == pytest.approx(3.0)
+
+
+def test_all_zero_window_sums_to_zero():
+    window = SlidingWindow(4, stats=True)
+    for value in [1e-300, 5e300, 0.0, 0.0, 0.0, 0.0]:
+        if window.is_full():
+            window.slide_next(value)
+        else:
+            window.add_reading(value)
+    assert window.stats.sum() == 0.0
+    assert window.stats.std() == 0.0
+
+
+def test_empty_window():
+    window = SlidingWindow(3, stats=True)
+    assert np.isnan(window.stats.mean())
+    assert np.isnan(window.stats.std())
+    assert np.isnan(window.stats.min())
@@ -0,0 +1,77 @@
+import uuid
+from multiprocessing import resource_tracker
+import numpy as np
+import pytest
+from shared_ring import RingWriter, RingReader
+
+
+@pytest.fixture
+def writer():
+    ring = RingWriter("test_ring_" + uuid.uuid4().hex[:12], capacity=8)
+    yield ring
+    ring.close()
+
+
+def open_reader(writer, start="latest"):
+    reader = RingReader(writer.name, start)
+    # readers live in their own process; here the writer's registration has to be put back for its unlink
+    resource_tracker.register(reader.shm._name, "shared_memory")
+    return reader
+
+
+def publish(writer, count, sensor="temp"):
+    for _ in range(count):
+        seq = writer.seq
+        writer.publish(sensor, 1726070400 + seq, float(seq), 20.0, 0.0, 0.0, False, True)
+
+
+def test_reads_every_record_in_order(writer):
+    reader = open_reader(writer, "oldest")
+    publish(writer, 5)
+    records, missed = reader.read()
+    assert missed == 0
+    assert records["seq"].tolist() == [0, 1, 2, 3, 4]
+    assert records["value"].tolist() == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert reader.sensor_name(int(records["sensor"][0])) == "temp"
+    assert len(reader.read()[0]) == 0
+    reader.close()
+
+
+def test_counts_records_overwritten_before_they_were_read(writer):
+    reader = open_reader(writer, "oldest")
+    publish(writer, 5)
+    reader.read(max_records=2)
+    publish(writer, 20)
+    records, missed = reader.read()
+    # 25 published, 2 read, and only the newest 8 still held
+    assert missed == 25 - 8 - 2
+    assert records["seq"].tolist() == list(range(17, 25))
+    assert reader.missed == missed
+    publish(writer, 3)
+    records, missed = reader.read()
+    assert missed == 0
+    assert records["seq"].tolist() == [25, 26, 27]
+    reader.close()
+
+
+def test_drops_a_slot_overwritten_while_copied(writer):
+    publish(writer, 8)
+    reader = open_reader(writer, "oldest")
+    # the writer is part way through the oldest slot: marked -1 until it is stamped
+    reader.records["seq"][2] = -1
+    records, missed = reader.read()
+    assert missed == 3
+    assert records["seq"].tolist() == list(range(3, 8))
+    reader.close()
+
+
+def test_latest_starts_after_what_was_published(writer):
+    publish(writer, 4)
+    reader = open_reader(writer)
+    publish(writer, 2, sensor="humid")
+    records, missed = reader.read()
+    assert missed == 0
+    assert records["seq"].tolist() == [4, 5]
+    assert {reader.sensor_name(int(sensor)) for sensor in records["sensor"]} == {"humid"}
+    assert np.all(records["in_control"] == 1)
+    reader.close()
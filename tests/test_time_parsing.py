@@ -0,0 +1,52 @@
+import json
+import pandas as pd
+import pytest
+from data_point import DataPoint, to_epoch
+from format_time import TimeNormalizer
+from mqtt_client import decode_batch, parse_epoch
+from preprocessor import is_null
+
+EPOCH = 1726070439   # 2024-09-11 16:00:39 UTC
+
+
+@pytest.mark.parametrize("time_stamp", [
+    "2024-09-11T16:00:39+00:00",
+    "2024-09-11T16:00:39.123456+00:00",
+    "2024-09-11T18:00:39+02:00",
+    "2024-09-11T12:30:39-03:30",
+    "2024-09-11T16:00:39Z",
+    "2024-09-11T16:00:39",
+    "20240911T180039+0200",
+])
+def test_offsets_are_converted_to_utc(time_stamp):
+    assert parse_epoch(time_stamp) == EPOCH
+    assert to_epoch(time_stamp) == EPOCH
+    normalized = TimeNormalizer().to_datetimes(pd.Series([time_stamp], dtype=object))
+    assert int(normalized.iloc[0].timestamp()) == EPOCH
+
+
+def test_cached_results_are_reused():
+    assert parse_epoch("2024-09-11T18:00:39+02:00") == parse_epoch("2024-09-11T18:00:39+02:00") == EPOCH
+
+
+@pytest.mark.parametrize("time_stamp", ["yesterday", "2024-13-45T00:00:00"])
+def test_invalid_times_raise(time_stamp):
+    with pytest.raises(ValueError):
+        parse_epoch(time_stamp)
+
+
+def test_messages_without_a_time_are_dropped():
+    messages = [
+        ("t", json.dumps({"state": "20.5", "data": {"last_changed": "2024-09-11T18:00:39+02:00",
+                                                   "device_class": "temperature", "unit_of_measurement": "C"}})),
+        ("t", json.dumps({"state": "20.5", "data": {"device_class": "temperature"}})),
+        ("t", json.dumps({"state": "20.5", "data": {"last_changed": None}})),
+        ("t", json.dumps({"state": "unavailable", "data": {}})),
+    ]
+    readings, errors = decode_batch(messages)
+    assert len(errors) == 1
+    points = [DataPoint.from_epoch(value, epoch, device_class, unit) for value, epoch, device_class, unit, _ in readings]
+    assert points[0].time_stamp == "2024-09-11 16:00:39"
+    assert not is_null(points[0])
+    assert [point.time_stamp for point in points[1:]] == [None, None]
+    assert all(is_null(point) for point in points[1:])